@@ -7,6 +7,7 @@ Each setting controls different aspects of how the website works.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -79,6 +80,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.cart_context',
+                'store.context_processors.category_nav',
+                'store.context_processors.page_cache_csrf',
             ],
         },
     },
@@ -94,6 +97,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent checkouts queue for the write lock instead of failing
+        # with "database is locked". IMMEDIATE makes every atomic() block,
+        # read-only ones included, take the write lock when it starts, so
+        # such blocks serialize with writers. That is acceptable here: our
+        # transactions are short, and a deferred read that later upgrades
+        # to a write fails with SQLITE_BUSY at once instead of waiting for
+        # the timeout. Plain reads outside atomic() are not affected.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file (not shared in-memory) test database, so tests with
+        # parallel requests see the same locking as production. It lives
+        # in the temp dir to keep it out of the checkout.
+        'TEST': {
+            'NAME': Path(tempfile.gettempdir()) / 'jewelry_shop_test_db.sqlite3',
+        },
     }
 }
 
@@ -156,6 +176,18 @@ LOGOUT_REDIRECT_URL = 'home'
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')  # set in environment for production
+# Stripe client (see payments.gateway): pooled connections, (connect, read)
+# timeouts in seconds, bounded retries and a circuit breaker.
+# STRIPE_API_BASE points it elsewhere, e.g. `manage.py run_fake_stripe`.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+STRIPE_POOL_SIZE = int(os.getenv('STRIPE_POOL_SIZE', '10'))
+STRIPE_TIMEOUT = (float(os.getenv('STRIPE_CONNECT_TIMEOUT', '3')), float(os.getenv('STRIPE_READ_TIMEOUT', '10')))
+STRIPE_MAX_RETRIES = int(os.getenv('STRIPE_MAX_RETRIES', '2'))
+STRIPE_BREAKER_THRESHOLD = int(os.getenv('STRIPE_BREAKER_THRESHOLD', '5'))
+STRIPE_BREAKER_RESET_SECONDS = int(os.getenv('STRIPE_BREAKER_RESET_SECONDS', '30'))
+
+# Stripe event ids remembered per process to acknowledge webhook retries without a query
+WEBHOOK_EVENT_CACHE_SIZE = int(os.getenv('WEBHOOK_EVENT_CACHE_SIZE', '10000'))
 
 # Email Settings - Configuration for sending emails
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -166,9 +198,50 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Cache - local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) in production
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'kiraa-default'),
+    }
+}
+
+# The page cache, ETags and cart summaries are invalidated through counters
+# kept in that cache, so they only run when every process shares it (see
+# store.cache_utils.cache_is_shared). Unset: guessed from the backend, where
+# local memory counts as unshared. Set True when one process serves every
+# request with the local memory cache, False to switch them off.
+CACHE_IS_SHARED = {'true': True, 'false': False}.get(os.getenv('CACHE_IS_SHARED', '').lower())
+
+# Sessions live in a signed cookie by default, so guest carts (kept in the
+# session) cost no database writes. Use django.contrib.sessions.backends.cache
+# with a shared cache to keep them server-side instead.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.signed_cookies')
+
+# Anonymous full-page cache lifetime in seconds (catalog changes invalidate sooner)
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 300))
+
 # Inventory
 LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD', 5))
 
+# Order numbers: each process that places orders needs its own worker id
+# (0-1023); unset means "lease a free one from the database, renewed while
+# the process runs" (see store.order_ids)
+ORDER_ID_WORKER_ID = os.environ.get('ORDER_ID_WORKER_ID')
+ORDER_ID_LEASE_SECONDS = int(os.environ.get('ORDER_ID_LEASE_SECONDS', 600))
+
+# Outbox (emails/SMS sent by `manage.py run_outbox_worker`, see store.outbox)
+OUTBOX_WORKER_THREADS = int(os.environ.get('OUTBOX_WORKER_THREADS', 4))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', 30))
+OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get('OUTBOX_RETRY_MAX_SECONDS', 3600))
+
+# Order archive: delivered/cancelled orders untouched for this many days are
+# moved to the archive tables by `manage.py archive_orders` (see store.archive)
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.environ.get('ORDER_ARCHIVE_BATCH_SIZE', 500))
+
 # Twilio SMS settings
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
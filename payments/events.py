@@ -0,0 +1,72 @@
+"""
+Webhook deduplication.
+
+Stripe delivers events at least once and retries whenever we answer
+slowly, sometimes while the first delivery is still being handled. Each
+handled event id is stored in ProcessedWebhookEvent (unique), inserted
+in the same transaction as the event's side effects: of two concurrent
+deliveries only one insert succeeds, and if handling fails the insert
+rolls back with it so the retry runs again. Side effects therefore
+happen exactly once.
+
+Recently handled ids are also kept in a per-process LRU, so the usual
+retry of an event this process already handled is acknowledged without
+a query (WEBHOOK_EVENT_CACHE_SIZE ids).
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+
+class RecentEvents:
+    """Thread-safe LRU set of event ids."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, event_id):
+        with self._lock:
+            if event_id in self._ids:
+                self._ids.move_to_end(event_id)
+                return True
+            return False
+
+    def add(self, event_id):
+        with self._lock:
+            self._ids[event_id] = None
+            self._ids.move_to_end(event_id)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+recent_events = RecentEvents(getattr(settings, 'WEBHOOK_EVENT_CACHE_SIZE', 10000))
+
+
+def is_duplicate(event_id):
+    """True if this process has already handled `event_id` (no query)."""
+    return event_id in recent_events
+
+
+def claim_event(event_id, event_type):
+    """
+    Record `event_id` as handled. Call inside the transaction that applies
+    the event; returns False (and changes nothing) if it was handled before.
+    """
+    from store.models import ProcessedWebhookEvent
+
+    try:
+        with transaction.atomic():
+            ProcessedWebhookEvent.objects.create(event_id=event_id, event_type=event_type)
+    except IntegrityError:
+        recent_events.add(event_id)
+        return False
+    transaction.on_commit(lambda: recent_events.add(event_id))
+    return True
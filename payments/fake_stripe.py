@@ -0,0 +1,122 @@
+"""
+A local stand-in for the Stripe API, for load tests and offline development.
+
+It implements just what the shop calls (``POST /v1/checkout/sessions``)
+with Stripe's wire format: form-encoded requests, JSON responses, Stripe
+error bodies and ``Idempotency-Key`` replay (a key reused with different
+parameters is rejected, as Stripe does). Latency and a failure rate
+can be injected to exercise timeouts, retries and the circuit breaker.
+
+Point the gateway at it with STRIPE_API_BASE=http://127.0.0.1:12111 (see
+``manage.py run_fake_stripe`` and ``manage.py benchmark_checkout``).
+"""
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f'req_fake_{next(self.server.ids)}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_body(self, status, error_type, message):
+        self.send_json(status, {'error': {'type': error_type, 'message': message}})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        server.count_request()
+        if server.latency:
+            time.sleep(server.latency)
+        if self.path != '/v1/checkout/sessions':
+            return self.send_error_body(404, 'invalid_request_error', f'Unrecognized request URL (POST: {self.path})')
+        if server.failure_rate and server.random.random() < server.failure_rate:
+            return self.send_error_body(500, 'api_error', 'Injected failure')
+
+        key = self.headers.get('Idempotency-Key')
+        with server.lock:
+            if key and key in server.idempotent:
+                first_body, session = server.idempotent[key]
+                if first_body != body:
+                    return self.send_error_body(
+                        400, 'idempotency_error',
+                        'Keys for idempotent requests can only be used with the same parameters they were first used with.',
+                    )
+                return self.send_json(200, session)
+        params = dict(parse_qsl(body))
+        session_id = f'cs_test_fake{next(server.ids):08d}'
+        created = int(time.time())
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'created': created,
+            'expires_at': int(params.get('expires_at', created + 24 * 60 * 60)),
+            'mode': params.get('mode', 'payment'),
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+            'url': f'https://checkout.stripe.test/c/pay/{session_id}',
+            'metadata': {name[9:-1]: value for name, value in params.items() if name.startswith('metadata[')},
+            'amount_total': sum(
+                int(params.get(f'line_items[{i}][price_data][unit_amount]', 0))
+                * int(params.get(f'line_items[{i}][quantity]', 1))
+                for i in range(len([name for name in params if name.endswith('][quantity]')]))
+            ),
+        }
+        with server.lock:
+            if key:
+                server.idempotent[key] = (body, session)
+        self.send_json(200, session)
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """Threaded fake Stripe API; use as a context manager to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, failure_rate=0.0, seed=None):
+        super().__init__((host, port), FakeStripeHandler)
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.idempotent = {}
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-stripe', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,222 @@
+"""
+Stripe gateway: one place that talks to the Stripe API.
+
+* A process-wide ``StripeClient`` keeps a pooled ``requests`` session, so
+  calls reuse warm TLS connections (STRIPE_POOL_SIZE per host).
+* Every call is bounded by STRIPE_TIMEOUT (connect, read) seconds and
+  retried at most STRIPE_MAX_RETRIES times by the SDK, which backs off and
+  reuses the idempotency key, so a retried create never charges twice.
+  Checkout keys hash the request parameters, so a retry that changed them
+  (new amount, other host) gets a new session instead of an idempotency
+  error, and a replayed session that has expired is replaced.
+* A circuit breaker stops calling Stripe for STRIPE_BREAKER_RESET_SECONDS
+  after STRIPE_BREAKER_THRESHOLD consecutive outages (network errors, 429,
+  5xx), so checkout fails fast instead of tying up workers on timeouts.
+  Card and request errors do not count: Stripe is up, the call was wrong.
+
+STRIPE_API_BASE points the client somewhere else, e.g. at the local fake
+in payments.fake_stripe for load tests.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class PaymentGatewayError(Exception):
+    """A payment call that failed; the message is safe to show the shopper."""
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """Stripe is unreachable (or the circuit breaker is open); try again later."""
+
+
+# ===========================
+# CIRCUIT BREAKER
+# ===========================
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `threshold` consecutive failures it
+    opens and rejects calls for `reset_timeout` seconds, then lets one
+    trial call through (half-open): success closes it, failure re-opens it.
+    Thread-safe.
+    """
+
+    def __init__(self, threshold, reset_timeout, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise GatewayUnavailable unless a call may go through now."""
+        with self._lock:
+            state = self._state()
+            if state == 'open' or (state == 'half-open' and self._trial_running):
+                raise GatewayUnavailable('Payments are temporarily unavailable. Please try again in a minute.')
+            if state == 'half-open':
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+
+def is_outage(error):
+    """Errors that mean Stripe is unreachable or overloaded, not that the request was bad."""
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    return isinstance(error, stripe.APIError) and (error.http_status or 500) >= 500
+
+
+# ===========================
+# CLIENT
+# ===========================
+_client = {'instance': None, 'pid': None}
+_client_lock = threading.Lock()
+
+
+def build_breaker():
+    return CircuitBreaker(
+        threshold=getattr(settings, 'STRIPE_BREAKER_THRESHOLD', 5),
+        reset_timeout=getattr(settings, 'STRIPE_BREAKER_RESET_SECONDS', 30),
+    )
+
+
+breaker = build_breaker()
+
+
+def build_client():
+    pool_size = getattr(settings, 'STRIPE_POOL_SIZE', 10)
+    session = requests.Session()
+    # Retries are left to the SDK, which knows which calls are safe to repeat
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    api_base = getattr(settings, 'STRIPE_API_BASE', '')
+    return stripe.StripeClient(
+        getattr(settings, 'STRIPE_SECRET_KEY', ''),
+        http_client=stripe.RequestsClient(timeout=tuple(getattr(settings, 'STRIPE_TIMEOUT', (3, 10))),
+                                          session=session),
+        max_network_retries=getattr(settings, 'STRIPE_MAX_RETRIES', 2),
+        base_addresses={'api': api_base} if api_base else None,
+    )
+
+
+def get_client():
+    """The process-wide StripeClient (rebuilt after a fork, like the order id generator)."""
+    with _client_lock:
+        if _client['instance'] is None or _client['pid'] != os.getpid():
+            _client.update(instance=build_client(), pid=os.getpid())
+        return _client['instance']
+
+
+def reset_client():
+    """Forget the client and breaker state, e.g. after changing STRIPE_* settings."""
+    global breaker
+    with _client_lock:
+        _client['instance'] = None
+        breaker = build_breaker()
+
+
+def call(operation):
+    """Run `operation(client)` through the circuit breaker, translating Stripe errors."""
+    breaker.before_call()
+    try:
+        result = operation(get_client())
+    except stripe.StripeError as error:
+        if is_outage(error):
+            breaker.record_failure()
+            raise GatewayUnavailable('Payments are temporarily unavailable. Please try again in a minute.') from error
+        breaker.record_success()
+        raise PaymentGatewayError(error.user_message or 'The payment could not be started.') from error
+    except Exception:
+        breaker.record_failure()  # never leave a half-open trial hanging
+        raise
+    breaker.record_success()
+    return result
+
+
+# ===========================
+# CHECKOUT
+# ===========================
+def checkout_line_items(order, currency='usd'):
+    """Stripe line items for `order`, with the products loaded in the same query."""
+    return [
+        {
+            'price_data': {
+                'currency': currency,
+                'product_data': {'name': item.product.name if item.product else 'Discontinued item'},
+                'unit_amount': int(item.price * 100),
+            },
+            'quantity': int(item.quantity),
+        }
+        for item in order.items.select_related('product')
+    ]
+
+
+# Each replay of an expired session costs a request; Stripe forgets keys after 24h anyway
+MAX_SESSION_RENEWALS = 3
+
+
+def checkout_session_key(order, params):
+    """Idempotency key for these exact parameters: same order and params, same session."""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return f'checkout-session-{order.order_number}-{digest}'
+
+
+def create_checkout_session(order, success_url, cancel_url):
+    """
+    A Stripe Checkout session for `order`. Retries with the same parameters
+    (ours or the SDK's) return the same session; when that session has
+    expired, the next key is chained off its id so retries again agree.
+    """
+    params = {
+        'payment_method_types': ['card'],
+        'line_items': checkout_line_items(order),
+        'mode': 'payment',
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+        'metadata': {'order_id': str(order.id)},
+    }
+    base_key = key = checkout_session_key(order, params)
+    for _ in range(MAX_SESSION_RENEWALS + 1):
+        session = call(lambda client, key=key: client.v1.checkout.sessions.create(
+            params, {'idempotency_key': key}
+        ))
+        # A replay returns the session as first created, so judge expiry by expires_at, not status
+        expires_at = getattr(session, 'expires_at', None)
+        if expires_at is None or expires_at > time.time():
+            return session
+        key = f'{base_key}-after-{session.id}'
+    raise PaymentGatewayError('The payment could not be started. Please try again.')
@@ -0,0 +1,92 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from payments import gateway
+from payments.fake_stripe import FakeStripeServer
+from store.models import Category, Order, OrderItem, Product
+from store.order_ids import next_order_number
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout session throughput against the local fake Stripe API (synthetic orders are deleted afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Checkout sessions to create (one order each)')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent checkouts')
+        parser.add_argument('--items', type=int, default=3, help='Line items per order')
+        parser.add_argument('--latency-ms', type=float, default=20, help='Fake Stripe response time')
+        parser.add_argument('--failure-rate', type=float, default=0, help='Share of fake Stripe calls that fail with a 500')
+        parser.add_argument('--api-base', default='', help='Use an already running fake (run_fake_stripe) instead')
+
+    def handle(self, *args, **options):
+        fake = nullcontext() if options['api_base'] else FakeStripeServer(
+            latency_ms=options['latency_ms'], failure_rate=options['failure_rate'], seed=42,
+        )
+        category = Category.objects.create(name='Benchmark checkout', slug='benchmark-checkout')
+        try:
+            orders = self.seed(category, options['requests'], options['items'])
+            with fake as server:
+                api_base = options['api_base'] or server.url
+                with override_settings(STRIPE_API_BASE=api_base, STRIPE_SECRET_KEY='sk_test_fake'):
+                    gateway.reset_client()
+                    self.run(orders, options['threads'])
+        finally:
+            gateway.reset_client()
+            Order.objects.filter(order_number__startswith='BENCH-').delete()
+            category.delete()
+
+    def seed(self, category, count, items):
+        products = Product.objects.bulk_create([
+            Product(name=f'Benchmark item {i}', slug=f'benchmark-checkout-{i}', description='Benchmark',
+                    category=category, price=Decimal('49.99') + i, image='products/benchmark.jpg')
+            for i in range(items)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(order_number=f'BENCH-{next_order_number()}', first_name='Load', last_name='Test',
+                  email='load@example.com', phone='', address='1 Street', city='City', state='State',
+                  postal_code='12345', country='IN', total_price=sum(p.price for p in products),
+                  payment_method='stripe')
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders for product in products
+        ], batch_size=2000)
+        return orders
+
+    def checkout(self, order):
+        start = time.perf_counter()
+        try:
+            gateway.create_checkout_session(order, 'http://testserver/success/', 'http://testserver/cart/')
+            return (time.perf_counter() - start) * 1000, None
+        except gateway.PaymentGatewayError as error:
+            return (time.perf_counter() - start) * 1000, type(error).__name__
+        finally:
+            connection.close()
+
+    def run(self, orders, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(self.checkout, orders))
+        elapsed = time.perf_counter() - start
+
+        timings = sorted(ms for ms, error in results if error is None)
+        errors = [error for _ms, error in results if error is not None]
+        self.stdout.write(f'Checkouts: {len(results)} with {threads} thread(s) in {elapsed:.2f}s '
+                          f'({len(results) / elapsed:.1f}/s)')
+        if timings:
+            quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+            self.stdout.write(f'Latency ms: p50 {quantiles[49]:.1f}  p95 {quantiles[94]:.1f}  '
+                              f'p99 {quantiles[98]:.1f}  max {timings[-1]:.1f}')
+        if errors:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {len(errors)} failed ({", ".join(sorted(set(errors)))}); circuit breaker is {gateway.breaker.state}'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(timings)} checkout session(s) created.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from payments.fake_stripe import FakeStripeServer
+
+
+class Command(BaseCommand):
+    help = 'Serve a local fake Stripe API (set STRIPE_API_BASE to its URL to load-test checkout offline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+        parser.add_argument('--failure-rate', type=float, default=0, help='Share of requests answered with a 500')
+
+    def handle(self, *args, **options):
+        server = FakeStripeServer(options['host'], options['port'], options['latency_ms'], options['failure_rate'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Fake Stripe API listening on {server.url}'))
+        self.stdout.write(f'Run the site with STRIPE_API_BASE={server.url} STRIPE_SECRET_KEY=sk_test_fake')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(f'Stopping after {server.requests} request(s)...')
+        finally:
+            server.server_close()
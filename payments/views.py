@@ -1,34 +1,32 @@
 
 import json
+import logging
+
 import stripe
 from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
-from store.models import Order, OrderItem
-from store.email_utils import send_order_confirmation_email, send_low_stock_alert
-from store.sms_utils import send_sms
+from store import outbox, sales
+from store.models import Order, Product
+
+from . import events, gateway
 
-stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+logger = logging.getLogger(__name__)
 
 
+@login_required(login_url='login')
 def create_checkout_session(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
-
-    # Build line items from order items
-    line_items = []
-    currency = 'usd'
-
-    for item in order.items.all():
-        line_items.append({
-            'price_data': {
-                'currency': currency,
-                'product_data': {'name': item.product.name},
-                'unit_amount': int(item.price * 100),
-            },
-            'quantity': int(item.quantity),
-        })
+    order = get_object_or_404(Order, id=order_id, user=request.user)
+    # Only an unpaid, pending order can be paid: a cancelled order's stock was released
+    if order.status != 'pending' or order.paid:
+        messages.error(request, f'Order #{order.order_number} cannot be paid. Current status: {order.get_status_display()}')
+        return redirect('order_confirmation', order_id=order.id)
 
     success_url = request.build_absolute_uri(
         f"/store/order_confirmation/{order.id}/?session_id={{CHECKOUT_SESSION_ID}}"
@@ -36,21 +34,14 @@ def create_checkout_session(request, order_id):
     cancel_url = request.build_absolute_uri('/cart/')
 
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={'order_id': str(order.id)}
-        )
-    except Exception as e:
+        session = gateway.create_checkout_session(order, success_url, cancel_url)
+    except gateway.GatewayUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    except gateway.PaymentGatewayError as e:
         return JsonResponse({'error': str(e)}, status=400)
 
-    # Mark order payment method and keep pending until webhook confirms
-    order.payment_method = 'stripe'
-    order.status = 'pending'
-    order.save()
+    # Mark order payment method; it stays pending until the webhook confirms
+    Order.objects.filter(pk=order.pk, status='pending').update(payment_method='stripe', updated_at=timezone.now())
 
     return redirect(session.url)
 
@@ -73,47 +64,55 @@ def stripe_webhook(request):
     except Exception:
         return HttpResponse(status=400)
 
-    # Handle the checkout.session.completed event
-    if event and event.get('type') == 'checkout.session.completed':
-        data = event['data']['object']
-        metadata = data.get('metadata', {})
-        order_id = metadata.get('order_id') or data.get('client_reference_id')
-        if order_id:
-            try:
-                order = Order.objects.get(id=int(order_id))
-                order.paid = True
-                order.transaction_id = data.get('payment_intent') or data.get('id')
-                order.status = 'confirmed'
-                order.save()
-
-                # Decrement stock for each order item and send low-stock alerts
-                threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
-                for item in order.items.all():
-                    product = item.product
-                    if product:
-                        try:
-                            product.stock = max(0, int(product.stock) - int(item.quantity))
-                            product.save()
-                            if product.stock <= int(threshold):
-                                admin_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
-                                send_low_stock_alert(product, product.stock, admin_email=admin_email)
-                        except Exception:
-                            pass
-
-                # Send order confirmation email after successful payment
-                try:
-                    send_order_confirmation_email(order)
-                except Exception:
-                    pass
-
-                # Send SMS notification to customer (if phone available)
-                try:
-                    if order.phone:
-                        msg = f'Your order {order.order_number} has been confirmed. Total: {order.total_price}'
-                        send_sms(order.phone, msg)
-                except Exception:
-                    pass
-            except Order.DoesNotExist:
-                pass
+    if not event or event.get('type') != 'checkout.session.completed':
+        return HttpResponse(status=200)
+    event_id = event.get('id')
+    if not event_id:
+        return HttpResponse(status=400)
+
+    # A retry of an event this process already handled: acknowledge without a query
+    if events.is_duplicate(event_id):
+        return HttpResponse(status=200)
+
+    with transaction.atomic():
+        # Only the first delivery of the event gets past this (see payments.events)
+        if events.claim_event(event_id, event['type']):
+            confirm_payment(event['data']['object'])
 
     return HttpResponse(status=200)
+
+
+def confirm_payment(data):
+    """Mark the order of a completed checkout session paid and queue its notifications."""
+    metadata = data.get('metadata', {})
+    order_id = metadata.get('order_id') or data.get('client_reference_id')
+    if not order_id:
+        return
+    transaction_id = data.get('payment_intent') or data.get('id')
+    # Only a pending order is confirmed: stock is reserved at checkout (see
+    # store.views.place_order) and released again when an order is cancelled
+    confirmed = Order.objects.filter(id=int(order_id), status='pending', paid=False).update(
+        paid=True, transaction_id=transaction_id, status='confirmed', updated_at=timezone.now(),
+    )
+    if not confirmed:
+        order = Order.objects.filter(id=int(order_id)).only('status', 'paid').first()
+        if order is not None and not order.paid:
+            # Paid after it was cancelled: nothing is reserved, so it needs a refund
+            logger.warning('Payment %s received for order %s in status %s; refund it manually',
+                           transaction_id, order_id, order.status)
+        return
+    order = Order.objects.get(id=int(order_id))
+
+    # Count the sale towards the popularity ranking
+    quantities = {}
+    for product_id, quantity in order.items.filter(product__isnull=False).values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    Product.record_sales(quantities)
+    # and towards the dashboard's daily totals
+    sales.record_order(order)
+
+    # Confirmation email and SMS go out through the outbox worker,
+    # committed together with the order update
+    outbox.enqueue('order_confirmation', order_id=order.pk)
+    if order.phone:
+        outbox.enqueue('order_confirmed_sms', order_id=order.pk)
@@ -7,7 +7,11 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize all features
     initializeCartButtons();
+    initializeCartPage();
     initializeWishlistButtons();
+    initializeSearchSuggestions();
+    initializeInfiniteScroll();
+    initializeOrderItems();
     initializeInteractiveBackground();
     initializeScrollAnimations();
     
@@ -159,6 +163,168 @@ function initializeScrollAnimations() {
     });
 }
 
+/**
+ * Debounce helper - runs fn once calls stop for `wait` ms
+ */
+function debounce(fn, wait) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), wait);
+    };
+}
+
+/**
+ * Initialize Search Typeahead (navbar search box)
+ */
+function initializeSearchSuggestions() {
+    const input = document.querySelector('.search-bar input[name="q"]');
+    if (!input) return;
+
+    const box = document.createElement('div');
+    box.className = 'search-suggestions';
+    input.closest('.search-bar').appendChild(box);
+    input.setAttribute('autocomplete', 'off');
+
+    let lastQuery = '';
+    let controller = null;
+    let activeIndex = -1;
+
+    function close() {
+        box.classList.remove('open');
+        box.innerHTML = '';
+        activeIndex = -1;
+    }
+
+    function render(suggestions) {
+        box.innerHTML = '';
+        suggestions.forEach(item => {
+            const link = document.createElement('a');
+            link.href = item.url;
+            const label = document.createElement('span');
+            label.textContent = item.label;
+            const type = document.createElement('span');
+            type.className = 'suggestion-type';
+            type.textContent = item.type;
+            link.append(label, type);
+            box.appendChild(link);
+        });
+        box.classList.toggle('open', suggestions.length > 0);
+        activeIndex = -1;
+    }
+
+    const fetchSuggestions = debounce(function() {
+        const query = input.value.trim();
+        if (query === lastQuery) return;
+        lastQuery = query;
+        if (!query) {
+            close();
+            return;
+        }
+        // Drop any response still in flight for an older prefix
+        if (controller) controller.abort();
+        controller = new AbortController();
+        fetch(`/api/suggest/?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+            .then(response => response.json())
+            .then(data => {
+                if (data.query === input.value.trim()) {
+                    render(data.suggestions || []);
+                }
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.error('Error:', error);
+            });
+    }, 150);
+
+    input.addEventListener('input', fetchSuggestions);
+
+    input.addEventListener('keydown', function(e) {
+        const links = box.querySelectorAll('a');
+        if (e.key === 'Escape') {
+            close();
+        } else if ((e.key === 'ArrowDown' || e.key === 'ArrowUp') && links.length) {
+            e.preventDefault();
+            activeIndex = (activeIndex + (e.key === 'ArrowDown' ? 1 : -1) + links.length) % links.length;
+            links.forEach((link, index) => link.classList.toggle('active', index === activeIndex));
+        } else if (e.key === 'Enter' && activeIndex >= 0 && links[activeIndex]) {
+            e.preventDefault();
+            window.location.href = links[activeIndex].href;
+        }
+    });
+
+    document.addEventListener('click', function(e) {
+        if (!box.contains(e.target) && e.target !== input) close();
+    });
+}
+
+/**
+ * Initialize Infinite Scroll (product listings with a next page)
+ */
+function initializeInfiniteScroll() {
+    const grid = document.querySelector('.product-grid[data-next-url]');
+    if (!grid || !('IntersectionObserver' in window)) return;
+
+    // The Next link is the no-JS fallback; scrolling takes over from here
+    const nextLink = document.querySelector('.pagination a[rel="next"]');
+    if (nextLink) nextLink.remove();
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'infinite-scroll-sentinel';
+    grid.after(sentinel);
+
+    let nextUrl = grid.dataset.nextUrl;
+    let loading = false;
+
+    function loadMore() {
+        if (loading || !nextUrl) return;
+        loading = true;
+        const url = new URL(nextUrl, window.location.href);
+        url.searchParams.set('format', 'json');
+        fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => response.json())
+            .then(data => {
+                grid.insertAdjacentHTML('beforeend', data.html);
+                grid.querySelectorAll('.product-card:not(.animate-in)').forEach(card => card.classList.add('animate-in'));
+                nextUrl = data.next_url;
+                if (!nextUrl) {
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            })
+            .catch(error => console.error('Error:', error))
+            .finally(() => { loading = false; });
+    }
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadMore();
+    }, { rootMargin: '0px 0px 400px 0px' });
+    observer.observe(sentinel);
+}
+
+/**
+ * Initialize "Show items" on My Orders (the item list is fetched on first open)
+ */
+function initializeOrderItems() {
+    document.querySelectorAll('details[data-order-items-url]').forEach(details => {
+        let loaded = false;
+        details.addEventListener('toggle', function() {
+            if (!details.open || loaded) return;
+            loaded = true;
+            const container = details.querySelector('[data-order-items]');
+            fetch(details.dataset.orderItemsUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    return response.text();
+                })
+                .then(html => { container.innerHTML = html; })
+                .catch(error => {
+                    loaded = false;
+                    console.error('Error:', error);
+                });
+        });
+    });
+}
+
 /**
  * Initialize Add to Cart Buttons
  */
@@ -264,16 +430,35 @@ function formatPrice(price) {
 }
 
 /**
- * Update Cart Total (AJAX)
+ * Batched Cart Updates
+ * Quantity changes and removals are queued per product and sent together
+ * to /api/cart/batch/ once the shopper pauses, so rapid clicks on a
+ * quantity spinner cost one request instead of one per click.
  */
-function updateCart(itemId, quantity) {
-    const form = new FormData();
-    form.append('quantity', quantity);
-    
-    fetch(`/cart/update/${itemId}/`, {
+const CART_BATCH_DELAY = 400;
+let pendingCartOperations = new Map();
+let cartBatchTimer = null;
+
+function queueCartOperation(op, productId, quantity) {
+    const previous = pendingCartOperations.get(productId);
+    if (op === 'add' && previous && previous.op === 'add') {
+        quantity += previous.quantity;
+    }
+    pendingCartOperations.set(productId, { op: op, product_id: productId, quantity: quantity });
+    clearTimeout(cartBatchTimer);
+    cartBatchTimer = setTimeout(flushCartOperations, CART_BATCH_DELAY);
+}
+
+function flushCartOperations() {
+    if (pendingCartOperations.size === 0) return;
+    const operations = Array.from(pendingCartOperations.values());
+    pendingCartOperations = new Map();
+
+    fetch('/api/cart/batch/', {
         method: 'POST',
-        body: form,
+        body: JSON.stringify({ operations: operations }),
         headers: {
+            'Content-Type': 'application/json',
             'X-Requested-With': 'XMLHttpRequest',
             'X-CSRFToken': getCookie('csrftoken')
         }
@@ -281,39 +466,88 @@ function updateCart(itemId, quantity) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            // Update UI
-            const cartTotal = document.querySelector('[data-cart-total]');
-            if (cartTotal) {
-                cartTotal.textContent = formatPrice(data.cart_total);
-            }
-            showNotification('Cart updated', 'success');
+            renderCartTotals(data);
+        } else {
+            showNotification(data.error || 'Error updating cart', 'danger');
         }
     })
     .catch(error => console.error('Error:', error));
 }
 
+function formatRupees(amount) {
+    return '₹' + Math.round(amount);
+}
+
+function renderCartTotals(data) {
+    const quantities = new Map(data.items.map(item => [String(item.product_id), item]));
+    document.querySelectorAll('[data-cart-line]').forEach(row => {
+        const item = quantities.get(row.dataset.cartLine);
+        if (!item) {
+            row.remove();
+            return;
+        }
+        const input = row.querySelector('.quantity-input');
+        if (input && document.activeElement !== input) input.value = item.quantity;
+        const subtotal = row.querySelector('[data-line-subtotal]');
+        if (subtotal) subtotal.textContent = formatRupees(item.subtotal);
+    });
+    const fields = { '[data-cart-subtotal]': data.subtotal, '[data-cart-tax]': data.tax_amount, '[data-cart-total]': data.cart_total };
+    Object.entries(fields).forEach(([selector, value]) => {
+        const element = document.querySelector(selector);
+        if (element) element.textContent = formatRupees(value);
+    });
+    const badge = document.querySelector('[data-cart-count]');
+    if (badge) badge.textContent = data.cart_count;
+    if (data.items.length === 0) location.reload();  // show the empty cart page
+}
+
 /**
- * Remove from Cart
+ * Update Cart Quantity (batched)
  */
-function removeFromCart(itemId) {
+function updateCart(productId, quantity) {
+    queueCartOperation('update', productId, quantity);
+}
+
+/**
+ * Remove from Cart (batched)
+ */
+function removeFromCart(productId) {
     if (confirm('Remove this item from cart?')) {
-        fetch(`/cart/remove/${itemId}/`, {
-            method: 'POST',
-            headers: {
-                'X-Requested-With': 'XMLHttpRequest',
-                'X-CSRFToken': getCookie('csrftoken')
-            }
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                location.reload();
-            }
-        })
-        .catch(error => console.error('Error:', error));
+        queueCartOperation('remove', productId, 0);
+        const row = document.querySelector(`[data-cart-line="${productId}"]`);
+        if (row) row.style.opacity = '0.4';
     }
 }
 
+/**
+ * Initialize Cart Page
+ * The update/remove forms still work without JavaScript; with it they
+ * go through the batched API instead of reloading the page.
+ */
+function initializeCartPage() {
+    document.querySelectorAll('[data-cart-line]').forEach(row => {
+        const productId = Number(row.dataset.cartLine);
+        const input = row.querySelector('.quantity-input');
+        if (input) {
+            input.addEventListener('change', function() {
+                const quantity = parseInt(input.value, 10);
+                if (quantity >= 1) updateCart(productId, quantity);
+            });
+            input.form.addEventListener('submit', function(e) {
+                e.preventDefault();
+                input.dispatchEvent(new Event('change'));
+            });
+        }
+        const removeForm = row.querySelector('form[action*="/cart/remove/"]');
+        if (removeForm) {
+            removeForm.addEventListener('submit', function(e) {
+                e.preventDefault();
+                removeFromCart(productId);
+            });
+        }
+    });
+}
+
 /**
  * Change Product Image
  */
@@ -1,9 +1,13 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
 from .models import (
     Category, Product, Review, Wishlist, 
     Coupon,
-    CartItem, Order, OrderItem, UserProfile, ContactQuery
+    CartItem, Order, OrderItem, UserProfile, ContactQuery, InventoryMovement, OutboxMessage,
+    ProcessedWebhookEvent, ArchivedOrder, ArchivedOrderItem
 )
+from . import inventory, outbox, sales
 
 # ===========================
 # CATEGORY ADMIN
@@ -19,14 +23,58 @@ class CategoryAdmin(admin.ModelAdmin):
 # ===========================
 # PRODUCT ADMIN
 # ===========================
+# Product columns maintained by signals and services, never written from admin forms
+DERIVED_PRODUCT_FIELDS = {
+    'stock',  # store.inventory
+    'rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',  # review signals
+    'sales_score',  # Product.record_sales
+}
+
+
+class ProductAdminForm(forms.ModelForm):
+    """
+    Product form that also posts the stock it was rendered with, so an edit
+    can be applied as a difference to the live stock (see stock_delta).
+    """
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'stock' in self.fields:
+            self.fields['stock'].show_hidden_initial = True
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.stock_delta = 0
+        if 'stock' in self.fields and self.instance.pk and 'stock' in self.changed_data:
+            field = self.fields['stock']
+            shown = field.hidden_widget().value_from_datadict(self.data, self.files, self.add_initial_prefix('stock'))
+            try:
+                shown = field.to_python(shown)
+            except forms.ValidationError:
+                shown = None
+            if shown is None:
+                self.add_error('stock', 'Reload the page and enter the stock again.')
+            elif cleaned_data.get('stock') is not None:
+                self.stock_delta = cleaned_data['stock'] - shown
+        return cleaned_data
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = ProductAdminForm
     list_display = ('name', 'category', 'price', 'stock', 'is_featured', 'is_new', 'created_at')
     prepopulated_fields = {'slug': ('name',)}
     list_filter = ('category', 'is_featured', 'is_new', 'created_at')
     search_fields = ('name', 'description')
     list_editable = ('price', 'stock', 'is_featured', 'is_new')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'created_at', 'updated_at',
+        'rating_avg', 'rating_count', 'rating_5', 'rating_4', 'rating_3', 'rating_2', 'rating_1',
+    )
     fieldsets = (
         ('Product Information', {
             'fields': ('name', 'slug', 'category', 'description')
@@ -40,12 +88,58 @@ class ProductAdmin(admin.ModelAdmin):
         ('Stock & Status', {
             'fields': ('stock', 'is_featured', 'is_new')
         }),
+        ('Ratings', {
+            'fields': ('rating_avg', 'rating_count', 'rating_5', 'rating_4', 'rating_3', 'rating_2', 'rating_1'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
+    def get_changelist_form(self, request, **kwargs):
+        # Stock is list_editable: the changelist needs the rendered stock too
+        kwargs.setdefault('form', ProductAdminForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)  # opening balance via signal
+            return
+        # Never write stock, ratings or sales score from the form: save the
+        # other fields, then apply the change to the stock the admin saw as a
+        # ledger adjustment, so orders placed while the page was open stand.
+        with transaction.atomic():
+            obj.save(update_fields=[
+                field.name for field in obj._meta.concrete_fields
+                if not field.primary_key and field.name not in DERIVED_PRODUCT_FIELDS
+            ])
+            inventory.adjust(obj.pk, form.stock_delta, note=f'Admin edit by {request.user}')
+        obj.refresh_from_db(fields=DERIVED_PRODUCT_FIELDS)
+
+
+# ===========================
+# INVENTORY LEDGER ADMIN
+# ===========================
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('product', 'delta', 'reason', 'order', 'created_at')
+    list_filter = ('reason', 'created_at')
+    search_fields = ('product__name', 'order__order_number', 'note')
+    list_select_related = ('product', 'order')
+    raw_id_fields = ('product', 'order')
+
+    # The ledger is append-only; corrections are new adjustment movements
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 # ===========================
 # REVIEW ADMIN
@@ -59,7 +153,16 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews']
 
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(approved=True)
+        # queryset.update() skips the Review signals, so apply the
+        # rating aggregate changes for the newly approved rows ourselves.
+        pending = queryset.filter(approved=False)
+        deltas = {}
+        with transaction.atomic():
+            for product_id, rating in pending.values_list('product_id', 'rating'):
+                stars = deltas.setdefault(product_id, {})
+                stars[rating] = stars.get(rating, 0) + 1
+            updated = pending.update(approved=True)
+            Product.apply_rating_deltas(deltas)
         self.message_user(request, f'{updated} review(s) approved.')
     approve_reviews.short_description = 'Approve selected reviews'
 
@@ -98,9 +201,32 @@ class OrderItemInline(admin.TabularInline):
 # ===========================
 # ORDER ADMIN
 # ===========================
+class OrderAdminForm(forms.ModelForm):
+    """
+    Order form that only lets an order be cancelled the way customers can
+    (see Order.cancel), and never reopened: its stock has been released.
+    """
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        if not self.instance.pk or 'status' not in self.changed_data:
+            return status
+        previous = self.initial['status']
+        if previous == 'cancelled':
+            raise forms.ValidationError('A cancelled order cannot be reopened: its stock has been released.')
+        if status == 'cancelled' and previous not in ('pending', 'confirmed'):
+            raise forms.ValidationError('Only pending or confirmed orders can be cancelled.')
+        return status
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('order_number', 'user', 'total_price', 'status', 'payment_method', 'paid', 'created_at')
+    form = OrderAdminForm
+    list_display = ('order_number', 'user', 'item_count', 'total_price', 'status', 'payment_method', 'paid', 'created_at')
     list_filter = ('status', 'payment_method', 'paid', 'created_at')
     search_fields = ('order_number', 'user__username', 'email')
     readonly_fields = ('order_number', 'created_at', 'updated_at', 'user')
@@ -116,7 +242,71 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('total_price', 'payment_method', 'status', 'paid', 'transaction_id')
         }),
     )
-    list_editable = ('status', 'paid')
+    # Status changes go through the change form or the cancel action, so a
+    # cancellation always releases the stock reserved at checkout
+    list_editable = ('paid',)
+    actions = ['cancel_orders']
+
+    def save_model(self, request, obj, form, change):
+        # Daily sales rollups: the stored order is taken out here and the
+        # edited one added back in save_related, so paid, status, total or
+        # currency edits move the figures with them
+        cancelling = change and 'status' in form.changed_data and obj.status == 'cancelled'
+        with transaction.atomic():
+            previous = Order.objects.get(pk=obj.pk) if change else None
+            if cancelling:
+                if previous.cancel():  # releases the stock and takes a paid order out of the rollups
+                    obj.save(update_fields=[
+                        field.name for field in obj._meta.concrete_fields
+                        if not field.primary_key and field.name != 'status'
+                    ])
+                    return
+                # Shipped since the form was rendered: keep its current status
+                obj.status = Order.objects.values_list('status', flat=True).get(pk=obj.pk)
+                self.message_user(request, f'Order {obj.order_number} can no longer be cancelled.', messages.ERROR)
+            if previous is not None and sales.is_counted(previous):
+                sales.remove_order(previous)
+            super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if sales.is_counted(form.instance):
+            sales.record_order(form.instance)
+
+    def cancel_orders(self, request, queryset):
+        orders = list(queryset)
+        cancelled = sum(1 for order in orders if order.cancel())
+        skipped = len(orders) - cancelled
+        self.message_user(request, f'{cancelled} order(s) cancelled and their stock released.')
+        if skipped:
+            self.message_user(request, f'{skipped} order(s) were not pending or confirmed and were left as they are.',
+                              messages.WARNING)
+    cancel_orders.short_description = 'Cancel selected orders (releases stock)'
+
+
+# ===========================
+# ARCHIVED ORDER ADMIN
+# ===========================
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    readonly_fields = ('product', 'quantity', 'price')
+    can_delete = False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Archived orders are history: read-only."""
+    list_display = ('order_number', 'user', 'item_count', 'total_price', 'status', 'paid', 'created_at', 'archived_at')
+    list_filter = ('status', 'payment_method', 'paid', 'created_at')
+    search_fields = ('order_number', 'user__username', 'email')
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # ===========================
@@ -161,3 +351,37 @@ class CouponAdmin(admin.ModelAdmin):
     list_display = ('code', 'discount_percent', 'active', 'used_count', 'usage_limit', 'expiry_date')
     list_filter = ('active', 'expiry_date')
     search_fields = ('code', 'description')
+
+
+# ===========================
+# OUTBOX ADMIN
+# ===========================
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'attempts', 'available_at', 'created_at', 'processed_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('kind', 'last_error')
+    readonly_fields = (
+        'kind', 'payload', 'status', 'attempts', 'available_at', 'locked_by', 'locked_until',
+        'last_error', 'created_at', 'processed_at',
+    )
+    actions = ['requeue_messages']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Requeue selected dead letters')
+    def requeue_messages(self, request, queryset):
+        count = outbox.requeue(queryset)
+        self.message_user(request, f'{count} message(s) requeued.')
+
+
+@admin.register(ProcessedWebhookEvent)
+class ProcessedWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'processed_at')
+    list_filter = ('event_type',)
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'event_type', 'processed_at')
+
+    def has_add_permission(self, request):
+        return False
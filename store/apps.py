@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StoreConfig(AppConfig):
     name = 'store'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
@@ -0,0 +1,113 @@
+"""
+Order archive.
+
+Delivered and cancelled orders stop changing once they are old, but they
+stay in the hot Order/OrderItem tables that checkout writes to and every
+order list reads. ``archive_orders`` moves them into ArchivedOrder and
+ArchivedOrderItem (same columns, same ids) in small batches: each batch is
+its own short transaction that copies at most `batch_size` orders with
+their items and deletes the originals, so no write lock is held for longer
+than one batch and checkout can run in between.
+
+Readers go through this module rather than Order directly when an order
+may be old: ``get_order`` finds an order in either table, and
+``user_orders_querysets`` gives both tables for MergedKeysetPaginator.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+# Orders that will not change again
+FINAL_STATUSES = ('delivered', 'cancelled')
+
+
+def archive_cutoff(days=None):
+    """Orders last updated before this are archived."""
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def _copy_values(source, target_model, **extra):
+    """Field values of `source` rows (a values() queryset) as unsaved `target_model` instances."""
+    return [target_model(**row, **extra) for row in source]
+
+
+def archive_batch(before, batch_size):
+    """
+    Move up to `batch_size` final orders last updated before `before` (and
+    their items) into the archive tables in one transaction. Returns the
+    number of orders moved.
+    """
+    from .models import ArchivedOrder, ArchivedOrderItem, InventoryMovement, Order, OrderItem
+
+    order_fields = [field.attname for field in Order._meta.concrete_fields]
+    item_fields = [field.attname for field in OrderItem._meta.concrete_fields]
+
+    with transaction.atomic():
+        ids = list(
+            Order.objects.select_for_update()
+            .filter(status__in=FINAL_STATUSES, updated_at__lt=before)
+            .order_by().values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create(_copy_values(
+            Order.objects.filter(id__in=ids).values(*order_fields).order_by(), ArchivedOrder, archived_at=now,
+        ))
+        ArchivedOrderItem.objects.bulk_create(_copy_values(
+            OrderItem.objects.filter(order_id__in=ids).values(*item_fields).order_by(), ArchivedOrderItem,
+        ), batch_size=1000)
+
+        # The ledger keeps its rows; the order reference becomes a note before it is nulled
+        InventoryMovement.objects.filter(order_id__in=ids, note='').update(note=Concat(
+            Value('Order #'), Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('order_number')[:1]),
+        ))
+
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before=None, batch_size=None, pause=0.0):
+    """
+    Archive every final order last updated before `before` (default:
+    ORDER_ARCHIVE_AFTER_DAYS ago), `batch_size` orders per transaction,
+    sleeping `pause` seconds between batches. Returns the number moved.
+    """
+    before = before or archive_cutoff()
+    batch_size = batch_size or getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 500)
+    archived = 0
+    while True:
+        moved = archive_batch(before, batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+        if pause:
+            time.sleep(pause)
+
+
+# ===========================
+# READING
+# ===========================
+def get_order(order_id):
+    """The Order or ArchivedOrder with this id, or None."""
+    from .models import ArchivedOrder, Order
+
+    return Order.objects.filter(id=order_id).first() or ArchivedOrder.objects.filter(id=order_id).first()
+
+
+def user_orders_querysets(user):
+    """Live and archived orders of `user`, newest first, for MergedKeysetPaginator."""
+    from .models import ArchivedOrder, Order
+
+    return [
+        Order.objects.filter(user=user).order_by('-created_at', '-id'),
+        ArchivedOrder.objects.filter(user=user).order_by('-created_at', '-id'),
+    ]
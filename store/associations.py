@@ -0,0 +1,122 @@
+"""
+"Frequently bought together" recommendations.
+
+The item-item co-occurrence matrix (how many orders contain both product A
+and product B) is sparse, so it is counted in the database with a single
+self-join of OrderItem grouped by product pair - one set-based pass per
+batch of orders instead of a Python loop per order.
+
+Only each product's ``ASSOCIATIONS_KEEP`` strongest neighbours are stored in
+ProductAssociation. Refreshes are incremental: a JobCheckpoint remembers the
+last order id counted, and each run adds the pair counts of newer orders to
+the stored ones. Pairs that fell out of a product's top list start again
+from zero if they come back, so scores are a (very close) lower bound;
+``refresh_associations(full=True)`` recounts all history exactly.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+CHECKPOINT_NAME = 'product_associations'
+
+# Neighbours kept per product (more than are shown, so rankings stay stable)
+ASSOCIATIONS_KEEP = 20
+
+# Orders counted per SQL statement
+ORDER_BATCH_SIZE = 5000
+
+PAIR_COUNTS_SQL = """
+    SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id)
+    FROM store_orderitem a
+    JOIN store_orderitem b ON b.order_id = a.order_id AND b.product_id <> a.product_id
+    JOIN store_order o ON o.id = a.order_id
+    WHERE a.order_id > %s AND a.order_id <= %s
+      AND o.status <> 'cancelled'
+    GROUP BY a.product_id, b.product_id
+"""
+
+
+def count_pairs(after_order_id, up_to_order_id, batch_size=ORDER_BATCH_SIZE):
+    """{(product_id, related_id): orders containing both} for orders in (after, up_to]."""
+    counts = defaultdict(int)
+    start = after_order_id
+    with connection.cursor() as cursor:
+        while start < up_to_order_id:
+            end = min(start + batch_size, up_to_order_id)
+            cursor.execute(PAIR_COUNTS_SQL, [start, end])
+            for product_id, related_id, together in cursor.fetchall():
+                counts[product_id, related_id] += together
+            start = end
+    return counts
+
+
+def merge_pair_counts(counts, keep=ASSOCIATIONS_KEEP):
+    """Add `counts` to the stored associations and trim each product to its top `keep`."""
+    from .models import ProductAssociation
+
+    by_product = defaultdict(dict)
+    for (product_id, related_id), together in counts.items():
+        by_product[product_id][related_id] = together
+
+    stored = defaultdict(dict)
+    for row in ProductAssociation.objects.filter(product_id__in=list(by_product)):
+        stored[row.product_id][row.related_id] = row
+
+    to_create, to_update, to_delete = [], [], []
+    for product_id, deltas in by_product.items():
+        rows = stored[product_id]
+        scores = {related_id: row.score for related_id, row in rows.items()}
+        for related_id, together in deltas.items():
+            scores[related_id] = scores.get(related_id, 0) + together
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        kept = dict(ranked[:keep])
+        for related_id, score in scores.items():
+            row = rows.get(related_id)
+            if related_id not in kept:
+                if row is not None:
+                    to_delete.append(row.pk)
+            elif row is None:
+                to_create.append(ProductAssociation(product_id=product_id, related_id=related_id, score=score))
+            elif row.score != score:
+                row.score = score
+                to_update.append(row)
+
+    ProductAssociation.objects.filter(pk__in=to_delete).delete()
+    ProductAssociation.objects.bulk_update(to_update, ['score'], batch_size=1000)
+    ProductAssociation.objects.bulk_create(to_create, batch_size=1000)
+    return len(to_create), len(to_update), len(to_delete)
+
+
+def refresh_associations(full=False, keep=ASSOCIATIONS_KEEP, batch_size=ORDER_BATCH_SIZE):
+    """
+    Count orders placed since the last run into ProductAssociation.
+    Returns (orders after id, up to id, created, updated, deleted).
+    """
+    from .models import JobCheckpoint, Order, ProductAssociation
+
+    with transaction.atomic():
+        checkpoint, _created = JobCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+        if full:
+            ProductAssociation.objects.all().delete()
+            checkpoint.position = 0
+        start = checkpoint.position
+        end = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        created = updated = deleted = 0
+        if end > start:
+            counts = count_pairs(start, end, batch_size)
+            created, updated, deleted = merge_pair_counts(counts, keep)
+            checkpoint.position = end
+            checkpoint.save()
+    return start, end, created, updated, deleted
+
+
+def frequently_bought_with(product, limit=4):
+    """Products most often ordered together with `product` (one indexed lookup)."""
+    from .models import Product
+
+    return (
+        Product.objects.for_cards()
+        .filter(associated_from__product=product)
+        .order_by('-associated_from__score', 'associated_from__id')[:limit]
+    )
@@ -0,0 +1,236 @@
+"""
+Cache helpers: generation counters, an anonymous full-page cache and
+conditional GET (ETag / Last-Modified) support.
+
+A generation counter is a number stored in the cache under a name such as
+``'catalog'``. Cache keys embed the current generation, so bumping the
+counter (from model signals) makes every older entry unreachable at once,
+without having to know or delete the keys. That only reaches every web
+process when they all share the cache: with a process-local backend
+(LocMemCache, the default) ``cache_is_shared()`` is False and the page
+cache is switched off rather than serving pages another process already
+invalidated (the ``store.W001`` system check says so).
+
+``cache_anonymous_page`` caches whole responses for anonymous GETs. Pages
+are rendered with a placeholder instead of the visitor's CSRF token (see
+``store.context_processors.page_cache_csrf``) and each hit gets a fresh
+token. Visitors whose page is personal - logged in, a session cart, pending
+messages - always bypass the cache.
+
+``anonymous_condition`` wraps Django's ``condition`` decorator for the same
+visitors, so a browser or CDN revalidating an unchanged page gets a 304
+before the view renders anything. Its ETags embed the catalog generation,
+so like the page cache it is only active while the cache is shared.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+
+GENERATION_KEY = 'generation:{}'
+GENERATION_CHANGED_KEY = 'generation_changed:{}'
+PAGE_KEY = 'page:{generations}:{path}'
+STATS_KEY = 'page_cache:{}'
+
+
+# Backends whose entries live in one process's memory
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def cache_is_shared():
+    """
+    True when every process serving requests sees the same default cache.
+    CACHE_IS_SHARED overrides the guess made from the backend, e.g. for a
+    single process using LocMemCache.
+    """
+    shared = getattr(settings, 'CACHE_IS_SHARED', None)
+    if shared is not None:
+        return shared
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+# ===========================
+# GENERATION COUNTERS
+# ===========================
+def new_generation():
+    # Time-based start, so a counter recreated after a cache flush never
+    # repeats a number that older pages or ETags were built with
+    return time.time_ns() // 1000
+
+
+def get_generation(name):
+    """Current generation number for `name`."""
+    return cache.get_or_set(GENERATION_KEY.format(name), new_generation, None)
+
+
+def bump_generation(name):
+    """Invalidate everything cached under the `name` generation."""
+    key = GENERATION_KEY.format(name)
+    cache.set(GENERATION_CHANGED_KEY.format(name), datetime.now(dt_timezone.utc).replace(microsecond=0), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key evicted or never set: a fresh value outdates the old keys
+        generation = new_generation()
+        cache.set(key, generation, None)
+        return generation
+
+
+def generation_changed_at(name):
+    """When `name` was last bumped (None if unknown, e.g. after a cache flush)."""
+    return cache.get(GENERATION_CHANGED_KEY.format(name))
+
+
+# ===========================
+# PAGE CACHE STATS
+# ===========================
+def count(event):
+    key = STATS_KEY.format(event)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def page_cache_stats():
+    """Hit/miss/bypass counters since the cache was last cleared."""
+    events = ('hit', 'miss', 'bypass')
+    values = cache.get_many([STATS_KEY.format(event) for event in events])
+    stats = {event: values.get(STATS_KEY.format(event), 0) for event in events}
+    lookups = stats['hit'] + stats['miss']
+    stats['hit_rate'] = round(stats['hit'] / lookups, 3) if lookups else None
+    return stats
+
+
+# ===========================
+# ANONYMOUS PAGE CACHE
+# ===========================
+def is_cacheable_request(request, with_query_string=True):
+    """True when the response would be the same for every anonymous visitor."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if not with_query_string and request.GET:
+        return False
+    if request.user.is_authenticated:
+        return False
+    if request.session.get('cart'):
+        return False  # cart badge is per visitor
+    if len(get_messages(request)):
+        return False
+    return True
+
+
+def page_cache_key(request, generations):
+    versions = '.'.join(f'{name}{get_generation(name)}' for name in generations)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(generations=versions, path=path)
+
+
+def with_csrf_token(request, content):
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def cache_anonymous_page(generations=('catalog',), timeout=None, with_query_string=True):
+    """
+    Cache a view's whole response for anonymous visitors.
+    Entries expire after `timeout` seconds (PAGE_CACHE_TIMEOUT by default)
+    or as soon as one of the named generations is bumped. With
+    `with_query_string=False` only the bare URL is cached. Nothing is
+    cached unless the cache is shared by all processes.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not cache_is_shared():
+                return view_func(request, *args, **kwargs)
+            if not is_cacheable_request(request, with_query_string):
+                count('bypass')
+                return view_func(request, *args, **kwargs)
+
+            key = page_cache_key(request, generations)
+            cached = cache.get(key)
+            if cached is not None:
+                count('hit')
+                content, content_type = cached
+                response = HttpResponse(with_csrf_token(request, content), content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            count('miss')
+            request.page_cache_csrf_placeholder = True
+            response = view_func(request, *args, **kwargs)
+            request.page_cache_csrf_placeholder = False
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not len(get_messages(request))
+            ):
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    timeout if timeout is not None else getattr(settings, 'PAGE_CACHE_TIMEOUT', 300),
+                )
+            response.content = with_csrf_token(request, response.content)
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+# ===========================
+# CONDITIONAL GET
+# ===========================
+def catalog_etag(request, *args, **kwargs):
+    """ETag for pages that depend on nothing but the catalog (and the URL)."""
+    return f'catalog-{get_generation("catalog")}'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return generation_changed_at('catalog')
+
+
+def shared_condition(etag_func=None, last_modified_func=None):
+    """
+    Django's ``condition`` decorator, applied only while the cache is shared:
+    a generation bumped in one process would not change the validators
+    another process sends, which would then answer 304 with stale content.
+    """
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if cache_is_shared():
+                return conditional_view(request, *args, **kwargs)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def anonymous_condition(etag_func=None, last_modified_func=None):
+    """
+    shared_condition, applied only to requests whose page is the same for
+    every visitor (see is_cacheable_request). Personal pages are always
+    rendered in full and carry no validators.
+    """
+    def decorator(view_func):
+        conditional_view = shared_condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if is_cacheable_request(request):
+                return conditional_view(request, *args, **kwargs)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,252 @@
+"""
+Cart helpers: the cached cart summary and the guest (session) cart.
+
+The summary (item count and total) feeds the header badge for logged-in
+users. It is computed with one aggregate query and cached per user. Its
+key embeds two generation counters (see store.cache_utils): the user's
+``cart:<id>`` generation, which the cart views bump after changing the
+cart, and ``catalog``, because the total depends on product prices. The
+cart generation doubles as the summary's version, so clients can tell
+whether the cart changed since they last looked. Those counters only reach
+every process through a shared cache, so with a per-process one (see
+cache_utils.cache_is_shared) the summary is queried on every request and
+has no version.
+
+Guests keep their cart in the session as {product_id: quantity}, so
+browsing and filling a cart never writes to the database. It is merged
+into CartItem when the visitor logs in (see the user_logged_in receiver
+in store.models).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .cache_utils import bump_generation, cache_is_shared, get_generation
+
+SUMMARY_KEY = 'cart_summary:{user_id}:{version}:{catalog}'
+
+
+def cart_generation_name(user_id):
+    return f'cart:{user_id}'
+
+
+def compute_cart_summary(user, version=None):
+    """The summary straight from the database (one aggregate query)."""
+    from .models import CartItem
+
+    totals = CartItem.objects.filter(user=user).aggregate(
+        count=Sum('quantity'),
+        total=Sum(F('quantity') * F('product__price'), output_field=DecimalField()),
+    )
+    return {
+        'count': totals['count'] or 0,
+        'total': totals['total'] or Decimal(0),
+        'version': version,
+    }
+
+
+def get_cart_summary(user):
+    """{'count', 'total', 'version'} for `user`'s cart, from the cache when it is shared."""
+    if not cache_is_shared():
+        return compute_cart_summary(user)
+    version = get_generation(cart_generation_name(user.pk))
+    key = SUMMARY_KEY.format(user_id=user.pk, version=version, catalog=get_generation('catalog'))
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_cart_summary(user, version)
+        cache.set(key, summary, getattr(settings, 'CART_SUMMARY_TIMEOUT', 3600))
+    return summary
+
+
+def invalidate_cart_summary(user):
+    """Call after changing `user`'s cart; the next summary is recomputed."""
+    bump_generation(cart_generation_name(user.pk))
+
+
+# ===========================
+# GUEST (SESSION) CART
+# ===========================
+SESSION_CART_KEY = 'cart'
+
+
+class SessionCartItem:
+    """A guest cart line, shaped like CartItem for the cart templates."""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        # Guest lines are addressed by product id in the update/remove URLs
+        self.id = product.id
+
+    def get_subtotal(self):
+        return self.product.price * self.quantity
+
+
+def get_session_cart(request):
+    """{product_id: quantity} for the visitor's guest cart."""
+    return {int(product_id): quantity for product_id, quantity in request.session.get(SESSION_CART_KEY, {}).items()}
+
+
+def save_session_cart(request, cart):
+    if cart:
+        request.session[SESSION_CART_KEY] = {str(product_id): quantity for product_id, quantity in cart.items()}
+    else:
+        request.session.pop(SESSION_CART_KEY, None)
+
+
+def session_cart_items(request):
+    """SessionCartItem list for the guest cart, with all products in one query."""
+    from .models import Product
+
+    cart = get_session_cart(request)
+    products = Product.objects.select_related('category').in_bulk(list(cart))
+    return [SessionCartItem(products[product_id], quantity)
+            for product_id, quantity in cart.items() if product_id in products]
+
+
+def merge_session_cart(request, user):
+    """
+    Move the guest cart into `user`'s CartItems: one query for the products,
+    one for the existing lines, then one bulk update and one bulk insert.
+    Quantities add up and are capped at the stock, as in add_to_cart.
+    """
+    from .models import CartItem, Product
+
+    cart = get_session_cart(request)
+    if not cart:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        stock = dict(Product.objects.filter(pk__in=list(cart)).values_list('id', 'stock'))
+        existing = {item.product_id: item for item in
+                    CartItem.objects.select_for_update().filter(user=user, product_id__in=list(stock))}
+        to_update, to_create = [], []
+        for product_id, quantity in cart.items():
+            if not stock.get(product_id):
+                continue  # deleted or sold out since it was added
+            item = existing.get(product_id)
+            if item is None:
+                to_create.append(CartItem(user=user, product_id=product_id,
+                                          quantity=min(quantity, stock[product_id])))
+            else:
+                item.quantity = min(item.quantity + quantity, stock[product_id])
+                item.updated_at = now
+                to_update.append(item)
+        CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create(to_create)
+    save_session_cart(request, {})
+    invalidate_cart_summary(user)
+
+
+# ===========================
+# BATCHED CART OPERATIONS
+# ===========================
+CART_OPERATIONS = ('add', 'update', 'remove')
+
+# Most operations accepted in one batch request
+MAX_BATCH_OPERATIONS = 50
+
+
+def parse_cart_operations(raw):
+    """
+    Validate [{'op', 'product_id', 'quantity'}, ...] from a batch request.
+    Returns a list of (op, product_id, quantity); raises ValueError.
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('operations must be a non-empty list')
+    if len(raw) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f'at most {MAX_BATCH_OPERATIONS} operations per batch')
+    operations = []
+    for entry in raw:
+        if not isinstance(entry, dict) or entry.get('op') not in CART_OPERATIONS:
+            raise ValueError(f'op must be one of {", ".join(CART_OPERATIONS)}')
+        try:
+            product_id = int(entry['product_id'])
+            quantity = int(entry.get('quantity', 1 if entry['op'] == 'add' else 0))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('product_id and quantity must be integers')
+        if entry['op'] != 'remove' and quantity < 1:
+            raise ValueError('quantity must be at least 1')
+        operations.append((entry['op'], product_id, quantity))
+    return operations
+
+
+def fold_cart_operations(current, operations, stock):
+    """
+    Apply operations in order to {product_id: quantity} and return the new
+    quantities of the products they touch (0 = remove). Unknown products
+    are skipped and quantities are capped at the stock, as in add_to_cart.
+    """
+    quantities = {}
+    for op, product_id, quantity in operations:
+        if product_id not in stock:
+            continue
+        existing = quantities.get(product_id, current.get(product_id, 0))
+        if op == 'add':
+            quantity = existing + quantity
+        elif op == 'remove':
+            quantity = 0
+        quantities[product_id] = min(quantity, stock[product_id])
+    return quantities
+
+
+def apply_cart_operations(request, operations):
+    """
+    Apply parsed operations to the visitor's cart in one transaction, reading
+    stock with one query. Returns the cart lines as
+    [{'product_id', 'quantity', 'subtotal'}] plus the item count and total.
+    """
+    from .models import CartItem, Product
+
+    product_ids = {product_id for _op, product_id, _quantity in operations}
+    user = request.user
+    if not user.is_authenticated:
+        cart = get_session_cart(request)
+        stock = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'stock'))
+        for product_id, quantity in fold_cart_operations(cart, operations, stock).items():
+            if quantity > 0:
+                cart[product_id] = quantity
+            else:
+                cart.pop(product_id, None)
+        save_session_cart(request, cart)
+        prices = dict(Product.objects.filter(pk__in=list(cart)).values_list('id', 'price'))
+        lines = [{'product_id': product_id, 'quantity': quantity, 'subtotal': prices[product_id] * quantity}
+                 for product_id, quantity in cart.items() if product_id in prices]
+        return lines, sum(line['quantity'] for line in lines), sum((line['subtotal'] for line in lines), Decimal(0))
+
+    now = timezone.now()
+    with transaction.atomic():
+        stock = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'stock'))
+        existing = {item.product_id: item for item in
+                    CartItem.objects.select_for_update().filter(user=user, product_id__in=product_ids)}
+        current = {product_id: item.quantity for product_id, item in existing.items()}
+        to_update, to_create, to_delete = [], [], []
+        for product_id, quantity in fold_cart_operations(current, operations, stock).items():
+            item = existing.get(product_id)
+            if quantity <= 0:
+                if item is not None:
+                    to_delete.append(item.pk)
+            elif item is None:
+                to_create.append(CartItem(user=user, product_id=product_id, quantity=quantity))
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                item.updated_at = now
+                to_update.append(item)
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+        CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create(to_create)
+    invalidate_cart_summary(user)
+
+    lines = list(
+        CartItem.objects.filter(user=user)
+        .annotate(subtotal=ExpressionWrapper(F('quantity') * F('product__price'), output_field=DecimalField()))
+        .values('product_id', 'quantity', 'subtotal')
+        .order_by('added_at', 'id')
+    )
+    summary = get_cart_summary(user)
+    return lines, summary['count'], summary['total']
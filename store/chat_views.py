@@ -8,6 +8,9 @@ from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from store.models import Product
+from store.search import search_products
+from store import suggest
+from store.cache_utils import catalog_etag, catalog_last_modified, shared_condition
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -112,6 +115,7 @@ def chat_api(request: HttpRequest) -> JsonResponse:
         }, status=500)
 
 @csrf_exempt
+@shared_condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def product_search_api(request: HttpRequest) -> JsonResponse:
     """
     API endpoint to search products
@@ -129,12 +133,8 @@ def product_search_api(request: HttpRequest) -> JsonResponse:
                 'error': 'Search query too long'
             }, status=400)
         
-        # Search products with case-insensitive matching
-        products = Product.objects.filter(
-            name__icontains=query
-        ) | Product.objects.filter(
-            description__icontains=query
-        )
+        # Search products using the ranked full-text index
+        products = search_products(Product.objects.for_cards(), query)
         
         # Limit results and add error handling
         products = products[:5]
@@ -167,3 +167,18 @@ def product_search_api(request: HttpRequest) -> JsonResponse:
             'products': [],
             'error': 'Search temporarily unavailable'
         }, status=500)
+
+
+def suggest_api(request: HttpRequest) -> JsonResponse:
+    """
+    Typeahead suggestions for the navbar search box and the chatbot.
+    Answered from the in-process prefix trie, so it is cheap enough to call
+    on every (debounced) keystroke.
+    """
+    query = request.GET.get('q', '').strip()[:100]
+    response = JsonResponse({
+        'query': query,
+        'suggestions': suggest.suggest(query),
+    })
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
@@ -0,0 +1,20 @@
+"""
+System checks for the store app.
+"""
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """The page cache, conditional GETs and cart summary cache are off while the cache is per process."""
+    from .cache_utils import cache_is_shared
+
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'The default cache is local to each process, so the anonymous page cache, '
+        'conditional GETs and cached cart summaries are disabled.',
+        hint='Point CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. Redis), or set '
+             'CACHE_IS_SHARED=True if a single process serves every request.',
+        id='store.W001',
+    )]
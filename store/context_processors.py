@@ -1,29 +1,77 @@
+import threading
+import time
+
 from django.contrib.auth.models import AnonymousUser
 from django.conf import settings
-from store.models import CartItem
+from store.models import CartItem, Category
+from store.cache_utils import get_generation
+from store.cart_utils import get_cart_summary, get_session_cart
 
 
 def cart_context(request):
     """
     Context processor to provide cart information to all templates.
     Handles both session-based cart (anonymous) and database cart (authenticated).
+    Count and total come from the cached summary; `cart_items` is an
+    unevaluated queryset, so only templates that loop over it query the items.
     """
     cart_count = 0
     cart_total = 0
     cart_items = []
     
     if request.user.is_authenticated:
-        # Get cart items from database for authenticated users
-        cart_items = CartItem.objects.filter(user=request.user)
-        cart_count = sum([item.quantity for item in cart_items])
-        cart_total = sum([item.get_subtotal() for item in cart_items])
+        summary = get_cart_summary(request.user)
+        cart_count = summary['count']
+        cart_total = summary['total']
+        cart_items = CartItem.objects.filter(user=request.user).select_related('product')
     else:
         # Get cart from session for anonymous users
-        cart = request.session.get('cart', {})
-        cart_count = len(cart)
+        cart_count = sum(get_session_cart(request).values())
     
     return {
         'cart_count': cart_count,
         'cart_total': cart_total,
         'cart_items': cart_items,
     }
+
+
+def page_cache_csrf(request):
+    """
+    While a page is being rendered for the anonymous page cache, render a
+    placeholder instead of this visitor's CSRF token (see store.cache_utils).
+    """
+    if getattr(request, 'page_cache_csrf_placeholder', False):
+        from store.cache_utils import CSRF_PLACEHOLDER
+        return {'csrf_token': CSRF_PLACEHOLDER}
+    return {}
+
+
+# Navigation categories, cached per process. Category signals clear it here
+# and bump the 'categories' generation so other processes rebuild too.
+_nav_categories = {'categories': None, 'generation': None, 'built_at': 0.0}
+_nav_lock = threading.Lock()
+
+
+def get_nav_categories():
+    """Categories for the navigation menu (id, name, slug), ordered by name."""
+    generation = get_generation('categories')
+    max_age = getattr(settings, 'CATEGORY_NAV_MAX_AGE', 300)
+    with _nav_lock:
+        expired = time.monotonic() - _nav_categories['built_at'] > max_age
+        if _nav_categories['categories'] is None or _nav_categories['generation'] != generation or expired:
+            _nav_categories.update(
+                categories=tuple(Category.objects.values('id', 'name', 'slug')),
+                generation=generation,
+                built_at=time.monotonic(),
+            )
+        return _nav_categories['categories']
+
+
+def clear_nav_categories():
+    with _nav_lock:
+        _nav_categories['categories'] = None
+
+
+def category_nav(request):
+    """Context processor for the Collections menu in base.html."""
+    return {'categories': get_nav_categories()}
@@ -0,0 +1,95 @@
+"""
+Coupon lookup and redemption.
+
+Codes are matched case-insensitively through ``Coupon.code_normalized``
+(stripped, upper-case, unique), so a lookup is one unique-index probe.
+Active coupons are also cached in process memory: checkout and the
+``/api/coupon/validate/`` preview normally need no query at all. Coupon
+saves/deletes clear the cache here and bump the ``'coupons'`` generation
+so other processes reload too; COUPON_CACHE_MAX_AGE bounds staleness.
+
+The cached ``used_count`` is only good for previews. Redemption is a
+single conditional UPDATE, so concurrent checkouts can never push a code
+past its usage limit.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from .cache_utils import get_generation
+
+
+class CouponError(Exception):
+    """A code that cannot be applied; the message is shown to the shopper."""
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+# ===========================
+# ACTIVE COUPON CACHE
+# ===========================
+_active_coupons = {'coupons': None, 'generation': None, 'built_at': 0.0}
+_coupons_lock = threading.Lock()
+
+
+def get_active_coupons():
+    """{normalized code: Coupon} for every active coupon."""
+    from .models import Coupon
+
+    generation = get_generation('coupons')
+    max_age = getattr(settings, 'COUPON_CACHE_MAX_AGE', 300)
+    with _coupons_lock:
+        expired = time.monotonic() - _active_coupons['built_at'] > max_age
+        if _active_coupons['coupons'] is None or _active_coupons['generation'] != generation or expired:
+            _active_coupons.update(
+                coupons={coupon.code_normalized: coupon for coupon in Coupon.objects.filter(active=True)},
+                generation=generation,
+                built_at=time.monotonic(),
+            )
+        return _active_coupons['coupons']
+
+
+def clear_coupon_cache():
+    with _coupons_lock:
+        _active_coupons['coupons'] = None
+
+
+# ===========================
+# PREVIEW AND REDEMPTION
+# ===========================
+def quote_coupon(code, amount):
+    """
+    (coupon, discount amount) for applying `code` to an order of `amount`.
+    Raises CouponError with a message for the shopper.
+    """
+    coupon = get_active_coupons().get(normalize_code(code))
+    if coupon is None:
+        raise CouponError('Coupon code not found.')
+    if not coupon.is_valid():
+        raise CouponError('Coupon is invalid or has expired.')
+    if coupon.min_order_amount and amount < coupon.min_order_amount:
+        raise CouponError(f'This coupon needs an order of at least ₹{coupon.min_order_amount:.0f}.')
+    discount = (amount * (coupon.discount_percent / Decimal('100'))).quantize(Decimal('0.01'))
+    return coupon, discount
+
+
+def redeem_coupon(coupon):
+    """
+    Count one use of `coupon`:
+    UPDATE ... SET used_count = used_count + 1 WHERE used_count < usage_limit.
+    Raises CouponError if the limit was reached meanwhile.
+    """
+    from .models import Coupon
+
+    redeemed = (
+        Coupon.objects.filter(pk=coupon.pk, active=True)
+        .filter(Q(usage_limit__isnull=True) | Q(usage_limit=0) | Q(used_count__lt=F('usage_limit')))
+        .update(used_count=F('used_count') + 1)
+    )
+    if not redeemed:
+        raise CouponError('This coupon has reached its usage limit.')
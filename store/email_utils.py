@@ -1,9 +1,10 @@
 from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.utils.html import strip_tags
 from django.conf import settings
 
 
-def send_html_email(subject, to_email, template_name, context):
+def send_html_email(subject, to_email, template_name, context, fail_silently=True):
     """Render templates (text and html) and send an EmailMultiAlternatives."""
     text_body = render_to_string(f'emails/{template_name}.txt', context)
     html_body = render_to_string(f'emails/{template_name}.html', context)
@@ -15,30 +16,30 @@ def send_html_email(subject, to_email, template_name, context):
         to=[to_email],
     )
     msg.attach_alternative(html_body, 'text/html')
-    msg.send(fail_silently=True)
+    msg.send(fail_silently=fail_silently)
 
 
-def send_order_confirmation_email(order):
+def send_order_confirmation_email(order, fail_silently=True):
     subject = f'Order Confirmation - {order.order_number}'
     to_email = order.email
     context = {'order': order}
-    send_html_email(subject, to_email, 'order_confirmation', context)
+    send_html_email(subject, to_email, 'order_confirmation', context, fail_silently=fail_silently)
 
 
-def send_contact_receipt_email(contact):
+def send_contact_receipt_email(contact, fail_silently=True):
     subject = f'We received your inquiry: {contact.subject}'
     to_email = contact.email
     context = {'contact': contact}
-    send_html_email(subject, to_email, 'contact_receipt', context)
+    send_html_email(subject, to_email, 'contact_receipt', context, fail_silently=fail_silently)
 
 
-def notify_admin_new_contact(contact, admin_email):
+def notify_admin_new_contact(contact, admin_email, fail_silently=True):
     subject = f'New contact query: {contact.subject}'
     context = {'contact': contact}
-    send_html_email(subject, admin_email, 'new_contact_admin', context)
+    send_html_email(subject, admin_email, 'new_contact_admin', context, fail_silently=fail_silently)
 
 
-def send_low_stock_alert(product, current_stock, admin_email=None):
+def send_low_stock_alert(product, current_stock, admin_email=None, fail_silently=True):
     """Notify admin when a product reaches low stock."""
     subject = f'Low stock alert: {product.name}'
     context = {
@@ -49,18 +50,31 @@ def send_low_stock_alert(product, current_stock, admin_email=None):
         from django.conf import settings as _settings
         admin_email = getattr(_settings, 'DEFAULT_FROM_EMAIL', None)
     if admin_email:
-        send_html_email(subject, admin_email, 'low_stock_alert', context)
+        send_html_email(subject, admin_email, 'low_stock_alert', context, fail_silently=fail_silently)
 
 
-def notify_moderator_review(review, admin_email):
+def notify_moderator_review(review, admin_email, fail_silently=True):
     subject = f'New review for moderation: {review.product.name}'
     context = {'review': review}
-    send_html_email(subject, admin_email, 'new_review_moderation', context)
+    send_html_email(subject, admin_email, 'new_review_moderation', context, fail_silently=fail_silently)
 
 
-def send_order_cancellation_email(order):
+def send_order_cancellation_email(order, fail_silently=True):
     """Send order cancellation confirmation email."""
     subject = f'Order Cancelled - {order.order_number}'
     to_email = order.email
     context = {'order': order}
-    send_html_email(subject, to_email, 'order_cancellation', context)
+    send_html_email(subject, to_email, 'order_cancellation', context, fail_silently=fail_silently)
+
+
+def send_welcome_email(user, fail_silently=True):
+    """Welcome a newly registered user (HTML template, plain text derived from it)."""
+    html_body = render_to_string('emails/welcome_email.html', {'user': user})
+    send_mail(
+        'Welcome to KIRAA!',
+        strip_tags(html_body),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        html_message=html_body,
+        fail_silently=fail_silently,
+    )
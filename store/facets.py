@@ -0,0 +1,226 @@
+"""
+Facet counts for the shop sidebar.
+
+Every product gets a bit position; each category and each price bucket
+keeps a bitset (a plain Python int) of the products it contains. Counting
+"how many products would this filter return" is then a bitwise AND plus
+``int.bit_count()`` - no COUNT query per facet value.
+
+Counts are disjunctive, as shoppers expect: category counts respect the
+active price/search filters but not the category filter itself, and price
+counts respect category/search but not the price filter.
+
+The index lives in process memory. Product saves/deletes update it
+incrementally through signals once their transaction commits, so a
+rolled-back save leaves it alone; category changes and SHOP_FACETS_MAX_AGE
+expiry trigger a full rebuild (two small queries).
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+# (min, max, label) - max is exclusive, None means open-ended. Bucket links
+# pass it on as ?price_below= so the shop applies the same bounds it counts.
+PRICE_BUCKETS = (
+    (Decimal('0'), Decimal('1000'), 'Under ₹1,000'),
+    (Decimal('1000'), Decimal('5000'), '₹1,000 - ₹5,000'),
+    (Decimal('5000'), Decimal('20000'), '₹5,000 - ₹20,000'),
+    (Decimal('20000'), Decimal('50000'), '₹20,000 - ₹50,000'),
+    (Decimal('50000'), None, '₹50,000+'),
+)
+
+
+def price_bucket(price):
+    """Index of the PRICE_BUCKETS entry containing `price`."""
+    for index, (low, high, _label) in enumerate(PRICE_BUCKETS):
+        if price >= low and (high is None or price < high):
+            return index
+    return 0
+
+
+def iter_bits(bits):
+    """Yield the positions of the set bits in `bits`."""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+class FacetIndex:
+    """Bitset index of products by category and price bucket."""
+
+    def __init__(self, categories=()):
+        self.categories = {category['id']: category for category in categories}
+        self.positions = {}       # product id -> bit position
+        self.memberships = {}     # product id -> (category id, price bucket)
+        self.product_ids = []     # bit position -> product id (None when free)
+        self.prices = []          # bit position -> price
+        self.free_positions = []
+        self.all_bits = 0
+        self.category_bits = {}
+        self.price_bits = [0] * len(PRICE_BUCKETS)
+        self.lock = threading.RLock()
+        self.built_at = time.monotonic()
+
+    # ---- maintenance -------------------------------------------------
+    def add(self, product_id, category_id, price):
+        """Insert or move a product (incremental update on save)."""
+        with self.lock:
+            self.remove(product_id)
+            if self.free_positions:
+                position = self.free_positions.pop()
+                self.product_ids[position] = product_id
+                self.prices[position] = price
+            else:
+                position = len(self.product_ids)
+                self.product_ids.append(product_id)
+                self.prices.append(price)
+            bit = 1 << position
+            bucket = price_bucket(price)
+            self.positions[product_id] = position
+            self.memberships[product_id] = (category_id, bucket)
+            self.all_bits |= bit
+            self.category_bits[category_id] = self.category_bits.get(category_id, 0) | bit
+            self.price_bits[bucket] |= bit
+
+    def remove(self, product_id):
+        with self.lock:
+            position = self.positions.pop(product_id, None)
+            if position is None:
+                return
+            category_id, bucket = self.memberships.pop(product_id)
+            mask = ~(1 << position)
+            self.all_bits &= mask
+            self.category_bits[category_id] &= mask
+            self.price_bits[bucket] &= mask
+            self.product_ids[position] = None
+            self.free_positions.append(position)
+
+    # ---- queries -----------------------------------------------------
+    def category_id_for_slug(self, slug):
+        for pk, category in self.categories.items():
+            if category['slug'] == slug:
+                return pk
+        return None
+
+    def bits_for_ids(self, product_ids):
+        """Bitset of the given product ids (e.g. full-text search results)."""
+        bits = 0
+        for product_id in product_ids:
+            position = self.positions.get(product_id)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def price_range_bits(self, price_min=None, price_max=None, price_below=None):
+        """
+        Bitset of products priced within [price_min, price_max] and below
+        price_below (exclusive, as used by the bucket links). Buckets fully
+        inside the range are OR-ed in directly; only the (at most two) buckets
+        straddling a bound have their members checked one by one.
+        """
+        if price_min is None and price_max is None and price_below is None:
+            return self.all_bits
+        bits = 0
+        for index, (low, high, _label) in enumerate(PRICE_BUCKETS):
+            above_min = price_min is None or low >= price_min
+            below_max = price_max is None or (high is not None and high <= price_max)
+            below_limit = price_below is None or (high is not None and high <= price_below)
+            if above_min and below_max and below_limit:
+                bits |= self.price_bits[index]
+                continue
+            if (price_max is not None and low > price_max) or (price_below is not None and low >= price_below) or (
+                price_min is not None and high is not None and high <= price_min
+            ):
+                continue
+            for position in iter_bits(self.price_bits[index]):
+                price = self.prices[position]
+                if ((price_min is None or price >= price_min) and (price_max is None or price <= price_max)
+                        and (price_below is None or price < price_below)):
+                    bits |= 1 << position
+        return bits
+
+    def counts(self, category_id=None, price_min=None, price_max=None, price_below=None, within=None):
+        """Facet counts for the active filter combination."""
+        with self.lock:
+            base = self.all_bits if within is None else self.all_bits & within
+            category_filter = self.category_bits.get(category_id, 0) if category_id else self.all_bits
+            price_filter = self.price_range_bits(price_min, price_max, price_below)
+
+            with_price = base & price_filter
+            with_category = base & category_filter
+            categories = [
+                dict(category, count=(self.category_bits.get(pk, 0) & with_price).bit_count())
+                for pk, category in self.categories.items()
+            ]
+            prices = [
+                {
+                    'min': low,
+                    'max': high,
+                    'label': label,
+                    'count': (self.price_bits[index] & with_category).bit_count(),
+                }
+                for index, (low, high, label) in enumerate(PRICE_BUCKETS)
+            ]
+            return {
+                'total': (with_price & category_filter).bit_count(),
+                'all_categories': with_price.bit_count(),
+                'categories': categories,
+                'price_ranges': prices,
+            }
+
+
+# ===========================
+# PROCESS-WIDE INDEX
+# ===========================
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_index():
+    from .models import Category, Product
+
+    categories = Category.objects.order_by('name').values('id', 'name', 'slug')
+    index = FacetIndex(categories)
+    for product_id, category_id, price in Product.objects.values_list('id', 'category_id', 'price').iterator():
+        index.add(product_id, category_id, price)
+    return index
+
+
+def get_index():
+    """The current facet index, (re)built when missing or expired."""
+    global _index
+    max_age = getattr(settings, 'SHOP_FACETS_MAX_AGE', 600)
+    with _index_lock:
+        if _index is None or time.monotonic() - _index.built_at > max_age:
+            _index = build_index()
+        return _index
+
+
+def invalidate():
+    """Drop the index; the next request rebuilds it."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def product_saved(product):
+    """Incrementally update the index once the product save commits (if it is built)."""
+    product_id, category_id, price = product.pk, product.category_id, Decimal(product.price)
+
+    def apply():
+        index = _index
+        if index is not None:
+            index.add(product_id, category_id, price)
+    transaction.on_commit(apply)
+
+
+def product_deleted(product_id):
+    def apply():
+        index = _index
+        if index is not None:
+            index.remove(product_id)
+    transaction.on_commit(apply)
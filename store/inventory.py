@@ -0,0 +1,164 @@
+"""
+Inventory ledger.
+
+Every stock change is recorded as an InventoryMovement (product, delta,
+reason, optional order) and applied to ``Product.stock`` in the same
+transaction with one set-based ``UPDATE`` per order::
+
+    UPDATE store_product
+    SET stock = stock - CASE id WHEN 1 THEN 2 WHEN 7 THEN 1 END
+    WHERE id IN (1, 7) AND stock >= CASE id WHEN 1 THEN 2 WHEN 7 THEN 1 END
+
+Nothing reads a product, changes it in Python and saves it back, so
+concurrent checkouts, cancellations and admin edits never overwrite each
+other. ``Product.stock`` stays the live balance (checkout needs it to
+refuse overselling); the ledger explains how it got there, so for every
+product stock == sum of its movements. ``reconcile_inventory`` checks
+exactly that and ``compact_inventory`` periodically folds old movements
+into one row per product to keep the ledger small.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Sum, Value, When
+
+OPENING = 'opening'
+CHECKOUT = 'checkout'
+CANCELLATION = 'cancellation'
+ADJUSTMENT = 'adjustment'
+COMPACTION = 'compaction'
+
+
+def _by_product(quantities):
+    """CASE id WHEN ... THEN quantity END for a {product_id: quantity} map."""
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _record(quantities, sign, reason, order=None, note=''):
+    from .models import InventoryMovement
+
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_id, delta=sign * quantity, reason=reason, order=order, note=note)
+        for product_id, quantity in quantities.items() if quantity
+    ])
+    transaction.on_commit(_stock_changed)
+
+
+def _stock_changed():
+    # Product pages show the stock
+    from .cache_utils import bump_generation
+    bump_generation('catalog')
+
+
+def reserve(quantities, order=None):
+    """
+    Take {product_id: units} out of stock for `order`, all or nothing, in one
+    conditional UPDATE. Raises InsufficientStock naming the first product
+    that cannot cover its quantity.
+    """
+    from .models import InsufficientStock, Product
+
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    requested = _by_product(quantities)
+    with transaction.atomic():
+        savepoint = transaction.savepoint()
+        reserved = Product.objects.filter(pk__in=list(quantities), stock__gte=requested).update(
+            stock=F('stock') - requested
+        )
+        if reserved < len(quantities):
+            transaction.savepoint_rollback(savepoint)
+            # Name a product that is short now. Stock may have changed since
+            # the UPDATE (a restock, or a new snapshot under READ COMMITTED),
+            # but nothing was reserved, so this always raises.
+            products = Product.objects.only('name', 'stock').in_bulk(list(quantities))
+            short = next(
+                (product_id for product_id in sorted(quantities)
+                 if product_id not in products or products[product_id].stock < quantities[product_id]),
+                min(quantities),
+            )
+            raise InsufficientStock(products.get(short), quantities[short])
+        transaction.savepoint_commit(savepoint)
+        _record(quantities, -1, CHECKOUT, order)
+
+
+def release(quantities, order=None):
+    """Put {product_id: units} back in stock (e.g. order cancelled)."""
+    from .models import Product
+
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    with transaction.atomic():
+        Product.objects.filter(pk__in=list(quantities)).update(stock=F('stock') + _by_product(quantities))
+        _record(quantities, 1, CANCELLATION, order)
+
+
+def adjust(product_id, delta, note=''):
+    """Manual correction (admin edit, stock take) of `delta` units."""
+    from .models import Product
+
+    if not delta:
+        return
+    with transaction.atomic():
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + delta)
+        _record({product_id: abs(delta)}, 1 if delta > 0 else -1, ADJUSTMENT, note=note)
+
+
+def record_opening_balance(product):
+    """Ledger entry for a product created with stock already on hand."""
+    if product.stock:
+        _record({product.pk: product.stock}, 1, OPENING, note='Initial stock')
+
+
+# ===========================
+# COMPACTION AND RECONCILIATION
+# ===========================
+def compact(before):
+    """
+    Fold every movement recorded before `before` into one COMPACTION row per
+    product (sums are unchanged). Returns (movements folded, rows written).
+    """
+    from .models import InventoryMovement
+
+    with transaction.atomic():
+        old = InventoryMovement.objects.filter(created_at__lt=before)
+        last_id = old.aggregate(last=Max('id'))['last']
+        if last_id is None:
+            return 0, 0
+        old = old.filter(id__lte=last_id)
+        totals = list(old.values('product_id').annotate(total=Sum('delta')).order_by('product_id'))
+        folded, _ = old.delete()
+        InventoryMovement.objects.bulk_create([
+            InventoryMovement(product_id=row['product_id'], delta=row['total'], reason=COMPACTION,
+                              note=f'Movements up to #{last_id}')
+            for row in totals if row['total']
+        ], batch_size=1000)
+    return folded, sum(1 for row in totals if row['total'])
+
+
+def discrepancies():
+    """[(product_id, stock, ledger total)] for products whose stock disagrees with the ledger."""
+    from .models import InventoryMovement, Product
+
+    ledger = dict(
+        InventoryMovement.objects.values('product_id').annotate(total=Sum('delta'))
+        .values_list('product_id', 'total').order_by()
+    )
+    return [
+        (product_id, stock, ledger.get(product_id, 0))
+        for product_id, stock in Product.objects.values_list('id', 'stock').order_by('id').iterator()
+        if stock != ledger.get(product_id, 0)
+    ]
+
+
+def record_corrections(mismatches):
+    """Ledger-only ADJUSTMENT rows making the ledger agree with the stock (stock is trusted)."""
+    from .models import InventoryMovement
+
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_id, delta=stock - ledger, reason=ADJUSTMENT, note='Reconciliation')
+        for product_id, stock, ledger in mismatches
+    ], batch_size=1000)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old delivered and cancelled orders into the archive tables, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180),
+                            help='Archive orders not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 500),
+                            help='Orders moved per transaction')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to sleep between batches so checkout writes get the lock')
+
+    def handle(self, *args, **options):
+        archived = archive.archive_orders(
+            before=archive.archive_cutoff(options['days']),
+            batch_size=max(1, options['batch_size']),
+            pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Archived {archived} order(s) not updated in {options["days"]} days.'
+        ))
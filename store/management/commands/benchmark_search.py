@@ -0,0 +1,99 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from store import search
+from store.models import Category, Product
+
+WORDS = (
+    'gold silver platinum diamond sapphire emerald ruby pearl crystal rose '
+    'vintage classic modern elegant delicate bold handcrafted polished '
+    'ring necklace earring bracelet pendant bangle chain charm anklet brooch '
+    'wedding engagement anniversary gift everyday statement layered minimal'
+).split()
+
+DEFAULT_QUERIES = ['diamond', 'gold ring', 'sapphire necklace', 'vintage pearl earrings', 'handcrafted']
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text index search against LIKE matching on a synthetic catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Number of synthetic products to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--query', action='append', dest='queries', help='Query to time (repeatable)')
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('Full-text index is not available on this database.')
+
+        count = options['products']
+        repeat = options['repeat']
+        queries = options['queries'] or DEFAULT_QUERIES
+
+        with transaction.atomic():
+            self.seed(count)
+            self.stdout.write(f'Catalog size: {Product.objects.count()} products\n')
+            # LIKE matches the whole query as a substring, FTS every (stemmed) word: "both" shows the overlap
+            self.stdout.write(
+                f'{"query":<28}{"LIKE ms":>10}{"FTS ms":>10}{"LIKE n":>10}{"FTS n":>10}{"both":>10}'
+            )
+            for query in queries:
+                like_ms, like_total = self.time_path(repeat, lambda: self.like_page(query))
+                fts_ms, fts_total = self.time_path(repeat, lambda: self.fts_page(query))
+                both = self.like_matches(query).filter(
+                    id__in=search.search_products(Product.objects.all(), query, ranked=False).values('id')
+                ).count()
+                self.stdout.write(
+                    f'{query:<28}{like_ms:>10.2f}{fts_ms:>10.2f}{like_total:>10}{fts_total:>10}{both:>10}'
+                )
+            # Never keep the synthetic catalog
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        rng = random.Random(42)
+        category = Category.objects.create(name='Benchmark', slug='benchmark-search')
+        batch = []
+        for i in range(count):
+            words = rng.sample(WORDS, 12)
+            batch.append(Product(
+                name=' '.join(words[:3]).title(),
+                slug=f'benchmark-search-{i}',
+                description=' '.join(words) + '.',
+                category=category,
+                price=Decimal(rng.randint(50, 5000)),
+                image='products/benchmark.jpg',
+            ))
+            if len(batch) == 2000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        # bulk_create skips signals, so index everything in one statement
+        search.rebuild_index()
+
+    def like_matches(self, query, products=None):
+        products = Product.objects.all() if products is None else products
+        return products.filter(
+            Q(name__icontains=query) | Q(description__icontains=query) | Q(category__name__icontains=query)
+        )
+
+    def like_page(self, query):
+        products = self.like_matches(query, Product.objects.for_cards())
+        return products.count(), list(products[:12])
+
+    def fts_page(self, query):
+        products = search.search_products(Product.objects.for_cards(), query)
+        return products.count(), list(products[:12])
+
+    def time_path(self, repeat, run):
+        timings = []
+        total = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            total, _page = run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), total
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.associations import ASSOCIATIONS_KEEP, ORDER_BATCH_SIZE, refresh_associations
+
+
+class Command(BaseCommand):
+    help = 'Count "frequently bought together" product pairs from orders placed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Forget stored counts and recount every order')
+        parser.add_argument('--keep', type=int, default=ASSOCIATIONS_KEEP, help='Neighbours kept per product')
+        parser.add_argument('--batch-size', type=int, default=ORDER_BATCH_SIZE, help='Orders counted per query')
+
+    def handle(self, *args, **options):
+        start, end, created, updated, deleted = refresh_associations(
+            full=options['full'], keep=options['keep'], batch_size=options['batch_size'],
+        )
+        if end <= start:
+            self.stdout.write(self.style.SUCCESS('✅ No new orders since the last run.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Counted orders {start + 1}-{end}: {created} new, {updated} updated, {deleted} dropped association(s).'
+        ))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = 'Fold old inventory movements into one row per product (stock totals are unchanged)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Keep movements from the last N days as they are')
+
+    def handle(self, *args, **options):
+        folded, written = inventory.compact(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Compacted {folded} movement(s) older than {options["days"]} days into {written} row(s).'
+        ))
@@ -0,0 +1,209 @@
+import random
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from store import sales, search
+from store.associations import frequently_bought_with
+from store.archive import FINAL_STATUSES
+from store.models import ArchivedOrder, CartItem, Category, Coupon, Order, OrderItem, Product, Review, Wishlist
+from store.pagination import KeysetPaginator, encode_cursor, NEXT
+from store.views import SORT_OPTIONS
+
+# Plan lines that mean "this query reads the whole table" or "sorts in a temp structure"
+PROBLEM_PATTERNS = {
+    'sqlite': {
+        'full scan': re.compile(r'^SCAN (\w+)$'),
+        'temp b-tree': re.compile(r'USE TEMP B-TREE'),
+    },
+    'postgresql': {
+        'full scan': re.compile(r'Seq Scan on (\w+)'),
+        'temp b-tree': re.compile(r'^\s*(->\s*)?Sort\b'),
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Run the listing, detail, cart, checkout and analytics queries through EXPLAIN and flag full scans and temp sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=2000,
+                            help='Synthetic products to create first, rolled back afterwards (0 = use the data as is)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query, not only flagged ones')
+
+    def handle(self, *args, **options):
+        patterns = PROBLEM_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(f'No plan checks for the {connection.vendor} database backend.')
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            flagged = self.audit(patterns, options['verbose_plans'])
+            # Never keep the synthetic data
+            transaction.set_rollback(True)
+
+        if flagged:
+            raise CommandError(f'{flagged} hot path(s) need an index.')
+        self.stdout.write(self.style.SUCCESS('✅ All hot paths use indexes'))
+
+    # ---- audit ---------------------------------------------------------
+    def audit(self, patterns, verbose):
+        flagged = 0
+        for label, queryset, allowed in self.hot_paths():
+            plan = queryset.explain()
+            problems = []
+            for line in plan.splitlines():
+                detail = line.split(' ', 3)[-1] if connection.vendor == 'sqlite' else line
+                for problem, pattern in patterns.items():
+                    if pattern.search(detail.strip()) and problem not in allowed:
+                        problems.append(f'{problem}: {detail.strip()}')
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'⚠️  {label}'))
+                for problem in problems:
+                    self.stdout.write(f'      {problem}')
+            else:
+                self.stdout.write(f'✅ {label}')
+            if verbose or problems:
+                for line in plan.splitlines():
+                    self.stdout.write(f'      | {line}')
+        return flagged
+
+    def hot_paths(self):
+        """(label, queryset, allowed problems) for every query a hot view runs."""
+        product = Product.objects.order_by('id').first()
+        user = User.objects.filter(orders__isnull=False).order_by('id').first() or User.objects.order_by('id').first()
+        if product is None or user is None:
+            raise CommandError('Need at least one product and one user; run with --seed.')
+        category_id = product.category_id
+        user_id = user.pk
+        order_id = Order.objects.filter(user_id=user_id).values_list('id', flat=True).first() or 0
+        month_ago = timezone.now() - timedelta(days=30)
+        today = timezone.localdate()
+        year_ago = today - timedelta(days=364)
+        cards = Product.objects.for_cards()
+
+        paths = [
+            ('home: featured products', cards.filter(is_featured=True)[:8], ()),
+            ('home: new arrivals', cards.filter(is_new=True).order_by('-created_at')[:8], ()),
+            ('home: category showcase', Category.objects.annotate(product_count=Count('products'))[:5],
+             ('full scan',)),  # a handful of categories
+        ]
+        for sort, ordering in SORT_OPTIONS.items():
+            listing = cards.order_by(*ordering)
+            paths.append((f'shop: first page ({sort})', self.page(listing), ()))
+            paths.append((f'shop: next page ({sort})', self.page(listing, after=product), ()))
+        in_category = cards.filter(category_id=category_id).order_by('-created_at', '-id')
+        paths += [
+            ('category: first page', self.page(in_category), ()),
+            ('category: next page', self.page(in_category, after=product), ()),
+        ]
+        if search.fts_enabled():
+            # Ranking needs every match's bm25 score before the first row is known
+            paths.append(('search: ranked results', self.page(search.search_products(cards, 'gold ring')),
+                          ('temp b-tree',)))
+
+        paths += [
+            ('product detail: product', Product.objects.filter(slug=product.slug), ()),
+            ('product detail: approved reviews', product.reviews.filter(approved=True), ()),
+            ('product detail: bought together', frequently_bought_with(product), ()),
+            ('product detail: related products',
+             cards.filter(category_id=category_id).exclude(id=product.id)[:4], ()),
+            ('wishlist: product ids',
+             Wishlist.products.through.objects.filter(wishlist__user_id=user_id).values_list('product_id', flat=True), ()),
+            ('cart: items', CartItem.objects.filter(user_id=user_id), ()),
+            ('checkout: coupon lookup', Coupon.objects.filter(code_normalized='WELCOME10'), ()),
+            ('checkout: active coupons', Coupon.objects.filter(active=True), ('full scan',)),  # cached per process
+            ('order history: first page', self.page(Order.objects.filter(user_id=user_id).order_by('-created_at', '-id')), ()),
+            ('order history: archived orders',
+             self.page(ArchivedOrder.objects.filter(user_id=user_id).order_by('-created_at', '-id')), ()),
+            ('archive: next batch',
+             Order.objects.filter(status__in=FINAL_STATUSES, updated_at__lt=month_ago).order_by().values('id')[:500],
+             ()),
+            ('order history: items on demand',
+             OrderItem.objects.filter(order_id=order_id).select_related('product').order_by('id'), ()),
+            ('analytics: daily totals', sales.daily_rows(year_ago, today), ()),
+            ('analytics: category daily totals', sales.daily_rows(year_ago, today, category=category_id), ()),
+            ('analytics: top products', sales.top_products(year_ago, today),
+             ('temp b-tree',)),  # grouping by product and ranking by revenue is inherent
+            ('analytics: category top products', sales.top_products(year_ago, today, category=category_id),
+             ('temp b-tree',)),
+        ]
+        return paths
+
+    def page(self, queryset, after=None):
+        """The query KeysetPaginator runs for the first page, or the page after `after`."""
+        paginator = KeysetPaginator(queryset, 12)
+        cursor = encode_cursor(paginator.key_values(after), NEXT) if after is not None else None
+        return paginator.page_queryset(cursor)[0]
+
+    # ---- seeding -------------------------------------------------------
+    def seed(self, count):
+        rng = random.Random(7)
+        now = timezone.now()
+        categories = Category.objects.bulk_create([
+            Category(name=f'Audit Category {i}', slug=f'audit-category-{i}') for i in range(8)
+        ])
+        users = User.objects.bulk_create([User(username=f'audit-user-{i}') for i in range(50)])
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Audit Gold Ring {i}',
+                slug=f'audit-gold-ring-{i}',
+                description='Audit product',
+                category=rng.choice(categories),
+                price=Decimal(rng.randint(100, 90000)),
+                image='products/audit.jpg',
+                stock=rng.randint(0, 20),
+                is_featured=rng.random() < 0.05,
+                is_new=rng.random() < 0.2,
+                rating_avg=round(rng.uniform(0, 5), 1),
+                rating_count=rng.randint(0, 40),
+                sales_score=rng.expovariate(0.5),
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        # Reviews cluster on the popular products, as they do in production
+        popular = products[:100]
+        Review.objects.bulk_create([
+            Review(product=product, user=user, rating=rng.randint(1, 5), comment='ok',
+                   approved=rng.random() < 0.8)
+            for user in users for product in rng.sample(popular, 40)
+        ], batch_size=1000)
+        orders = Order.objects.bulk_create([
+            Order(
+                user=rng.choice(users), order_number=f'AUDIT-{i}', first_name='A', last_name='B',
+                email='audit@example.com', phone='1', address='x', city='x', state='x', postal_code='1',
+                country='x', total_price=Decimal(rng.randint(100, 50000)), payment_method='cod',
+                paid=rng.random() < 0.8,
+            )
+            for i in range(count // 2)
+        ], batch_size=1000)
+        # Spread orders over the last year
+        for order in orders:
+            order.created_at = now - timedelta(minutes=rng.randint(0, 525600))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=rng.choice(products), quantity=rng.randint(1, 3), price=Decimal(500))
+            for order in orders for _ in range(2)
+        ], batch_size=1000)
+        sales.rebuild()
+        Coupon.objects.bulk_create([
+            Coupon(code=f'AUDIT{i}', code_normalized=f'AUDIT{i}', discount_percent=10) for i in range(200)
+        ])
+        for user in users:
+            Wishlist.objects.create(user=user).products.add(*rng.sample(products, 5))
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=product) for user in users for product in rng.sample(products, 3)
+        ])
+        search.rebuild_index()
+        if connection.vendor == 'sqlite':
+            # Give the planner table statistics, as a long-running database would have
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store import sales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups behind the analytics dashboard from paid orders (live and archived)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only rebuild the last N days (default: all history)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders read per query')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'] - 1)
+        counted = sales.rebuild(since=since, batch_size=max(1, options['batch_size']))
+        scope = f'the last {options["days"]} days' if since else 'all history'
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt daily sales for {scope} from {counted} paid order(s).'))
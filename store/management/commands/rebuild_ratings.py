@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from store.models import Product, Review, rating_avg_expression
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stored product rating aggregates from approved reviews'
+
+    def handle(self, *args, **options):
+        star_counts = {
+            f'rating_{star}': Count('id', filter=Q(rating=star))
+            for star in range(1, 6)
+        }
+        rows = (
+            Review.objects.filter(approved=True)
+            .values('product_id')
+            .annotate(rating_count=Count('id'), **star_counts)
+        )
+
+        with transaction.atomic():
+            # Reset everything first so products whose reviews were all
+            # removed or unapproved drop back to zero.
+            Product.objects.update(
+                rating_avg=0, rating_count=0,
+                rating_1=0, rating_2=0, rating_3=0, rating_4=0, rating_5=0,
+            )
+            products = []
+            for row in rows:
+                product = Product(pk=row.pop('product_id'))
+                for field, value in row.items():
+                    setattr(product, field, value)
+                products.append(product)
+            Product.objects.bulk_update(
+                products,
+                ['rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5'],
+                batch_size=500,
+            )
+            Product.objects.filter(rating_count__gt=0).update(rating_avg=rating_avg_expression())
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Rebuilt rating aggregates for {len(products)} reviewed product(s).')
+        )
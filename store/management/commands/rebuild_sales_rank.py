@@ -0,0 +1,28 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import OrderItem, Product, sales_weight
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed sales ranking (sort=popular) from all paid orders'
+
+    def handle(self, *args, **options):
+        scores = defaultdict(float)
+        items = (
+            OrderItem.objects.filter(order__paid=True, product__isnull=False)
+            .values_list('product_id', 'quantity', 'order__created_at')
+        )
+        for product_id, quantity, ordered_at in items.iterator():
+            scores[product_id] += quantity * sales_weight(ordered_at)
+
+        with transaction.atomic():
+            Product.objects.update(sales_score=0)
+            products = [Product(pk=product_id, sales_score=score) for product_id, score in scores.items()]
+            Product.objects.bulk_update(products, ['sales_score'], batch_size=500)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Rebuilt sales ranking for {len(products)} product(s).')
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write(
+                self.style.WARNING('Full-text index is not available on this database; search uses LIKE matching.')
+            )
+            return
+
+        indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {indexed} product(s).'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = 'Check that every product\'s stock equals the sum of its inventory movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Record adjustment movements so the ledger matches the current stock')
+
+    def handle(self, *args, **options):
+        mismatches = inventory.discrepancies()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('✅ Inventory ledger matches stock for every product.'))
+            return
+
+        for product_id, stock, ledger in mismatches:
+            self.stdout.write(f'⚠️  Product {product_id}: stock {stock}, ledger {ledger} ({stock - ledger:+d})')
+        if not options['fix']:
+            raise CommandError(f'{len(mismatches)} product(s) disagree with the inventory ledger.')
+
+        inventory.record_corrections(mismatches)
+        self.stdout.write(self.style.SUCCESS(f'✅ Recorded corrections for {len(mismatches)} product(s).'))
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails and SMS from the outbox (retries with backoff, dead-letters after too many failures)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'OUTBOX_WORKER_THREADS', 4),
+                            help='Messages delivered in parallel')
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages claimed per query')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='outbox') if threads > 1 else None
+        self.stdout.write(f'Outbox worker started with {threads} thread(s).')
+        total_delivered = total_failed = 0
+        try:
+            while True:
+                delivered, failed = outbox.drain(batch_size=options['batch_size'], executor=executor)
+                total_delivered += delivered
+                total_failed += failed
+                if delivered or failed:
+                    self.stdout.write(f'Delivered {delivered}, failed {failed}.')
+                if options['once']:
+                    break
+                # Drop a stale or broken connection between rounds, as request handling does
+                close_old_connections()
+                if not (delivered or failed):
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping outbox worker...')
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        if total_failed:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {total_failed} message(s) failed; they are retried later or dead-lettered (see the admin).'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'✅ Delivered {total_delivered} outbox message(s).'))
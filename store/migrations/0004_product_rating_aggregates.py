@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:32
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    star_counts = {f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    rows = (
+        Review.objects.filter(approved=True)
+        .values('product_id')
+        .annotate(rating_count=Count('id'), **star_counts)
+    )
+    for row in rows:
+        total = sum(row[f'rating_{star}'] * star for star in range(1, 6))
+        Product.objects.filter(pk=row.pop('product_id')).update(
+            rating_avg=total / row['rating_count'], **row
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_coupon_order_currency_review_approved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-16 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_associations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sales_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sales_score'], name='product_sales_score_idx'),
+        ),
+    ]
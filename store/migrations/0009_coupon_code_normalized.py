@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-16 12:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_code_normalized(apps, schema_editor):
+    Coupon = apps.get_model('store', 'Coupon')
+    coupons = defaultdict(list)
+    for pk, code in Coupon.objects.values_list('id', 'code').order_by('id'):
+        coupons[code.strip().upper()].append((pk, code))
+
+    # code_normalized becomes unique next: refuse to guess which of two codes that only
+    # differ in case or surrounding spaces should survive
+    collisions = [group for group in coupons.values() if len(group) > 1]
+    if collisions:
+        raise RuntimeError(
+            'Coupon codes that differ only in case or surrounding spaces cannot be kept apart: '
+            + '; '.join(', '.join(repr(code) for _pk, code in group) for group in collisions)
+            + '. Rename or delete all but one coupon of each group, then run migrate again.'
+        )
+
+    for code_normalized, [(pk, _code)] in coupons.items():
+        Coupon.objects.filter(pk=pk).update(code_normalized=code_normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_sales_score'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='coupon',
+            name='coupon_code_upper_idx',
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='code_normalized',
+            field=models.CharField(default='', editable=False, max_length=50),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_code_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coupon',
+            name='code_normalized',
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+    ]
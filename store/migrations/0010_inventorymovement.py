@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-16 13:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    InventoryMovement = apps.get_model('store', 'InventoryMovement')
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_id, delta=stock, reason='opening', note='Stock before the ledger')
+        for product_id, stock in Product.objects.exclude(stock=0).values_list('id', 'stock')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_coupon_code_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('checkout', 'Checkout'), ('cancellation', 'Order cancelled'), ('adjustment', 'Manual adjustment'), ('compaction', 'Compacted history')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to='store.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='store.product')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['product', 'id'], name='inventory_product_idx'), models.Index(fields=['created_at'], name='inventory_created_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
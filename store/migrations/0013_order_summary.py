@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-16 15:20
+
+from django.db import migrations, models
+
+
+def fill_order_summaries(apps, schema_editor):
+    # Same rules as Order.set_summary (historical models have no methods)
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    lines = {}
+    for order_id, name, image, quantity in (
+        OrderItem.objects.order_by('order_id', 'id')
+        .values_list('order_id', 'product__name', 'product__image', 'quantity').iterator()
+    ):
+        lines.setdefault(order_id, []).append((name, image, quantity))
+    orders = []
+    for order in Order.objects.filter(pk__in=list(lines)).only('id').iterator():
+        order_lines = lines[order.pk]
+        names = [(name or 'Discontinued item') + (f' × {quantity}' if quantity > 1 else '')
+                 for name, _image, quantity in order_lines[:3]]
+        if len(order_lines) > 3:
+            names.append(f'+{len(order_lines) - 3} more')
+        digest = ', '.join(names)
+        order.item_count = len(order_lines)
+        order.thumbnail = next((image for name, image, _quantity in order_lines if name is not None), '') or ''
+        order.items_digest = digest if len(digest) <= 255 else digest[:254] + '…'
+        orders.append(order)
+    Order.objects.bulk_update(orders, ['item_count', 'thumbnail', 'items_digest'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_processedwebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_digest',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='products/'),
+        ),
+        migrations.RunPython(fill_order_summaries, migrations.RunPython.noop),
+    ]
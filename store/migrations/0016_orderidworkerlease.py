@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_daily_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIdWorkerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.PositiveSmallIntegerField(unique=True)),
+                ('holder', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
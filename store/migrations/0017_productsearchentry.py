@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_orderidworkerlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='store.product')),
+            ],
+            options={
+                'db_table': 'store_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
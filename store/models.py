@@ -1,6 +1,20 @@
-from django.db import models
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    F, Q, Case, When, Value, FloatField, IntegerField, BooleanField, ExpressionWrapper
+)
+from django.db.models.functions import Cast
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.core.exceptions import ValidationError
+from django.core.signals import request_started
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 # ===========================
 # CATEGORY MODEL
@@ -24,6 +38,50 @@ class Category(models.Model):
 # ===========================
 # PRODUCT MODEL
 # ===========================
+class ProductQuerySet(models.QuerySet):
+    """Product queries shared by the listing pages."""
+
+    # Columns rendered by a product card; everything else stays deferred.
+    CARD_FIELDS = (
+        'id', 'name', 'slug', 'price', 'original_price', 'image', 'stock',
+        'is_featured', 'is_new', 'created_at', 'rating_avg', 'rating_count', 'sales_score',
+        'category__id', 'category__name', 'category__slug',
+    )
+
+    def for_cards(self):
+        """
+        Fetch everything a product card needs in a single query: the card
+        columns, the category (joined), the discount percentage and an
+        in-stock flag. Ratings come from the stored aggregates on Product.
+        """
+        return (
+            self.select_related('category')
+            .only(*self.CARD_FIELDS)
+            .annotate(
+                discount_pct=Case(
+                    When(original_price__gt=0, then=Cast(
+                        (F('original_price') - F('price')) * 100 / F('original_price'),
+                        output_field=IntegerField(),
+                    )),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+                in_stock=ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+            )
+        )
+
+
+class InsufficientStock(Exception):
+    """Raised by inventory.reserve when a product cannot cover an order."""
+
+    def __init__(self, product, requested):
+        self.product = product  # None if the product was deleted
+        self.requested = requested
+        self.available = product.stock if product is not None else 0
+        name = product.name if product is not None else 'A product'
+        super().__init__(f'{name}: {self.available} in stock, {requested} requested')
+
+
 class Product(models.Model):
     """Product catalog for jewelry items."""
     name = models.CharField(max_length=200)
@@ -41,18 +99,82 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Rating aggregates over approved reviews (kept in sync by Review signals)
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    # Time-decayed units sold (see sales_weight); kept up to date from paid orders
+    sales_score = models.FloatField(default=0)
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listing pages (see `manage.py explain_hot_paths`)
+            models.Index(fields=['created_at'], name='product_created_idx'),
+            models.Index(fields=['is_featured', 'created_at'], name='product_featured_idx'),
+            models.Index(fields=['is_new', 'created_at'], name='product_new_idx'),
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['rating_avg', 'rating_count'], name='product_rating_idx'),
+            models.Index(fields=['sales_score'], name='product_sales_score_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def average_rating(self):
-        """Calculate average product rating."""
-        ratings = self.reviews.all()
-        if ratings.exists():
-            return sum([r.rating for r in ratings]) / ratings.count()
-        return 0
+        """Average rating of approved reviews (stored, no extra query)."""
+        return self.rating_avg
+
+    def rating_histogram(self):
+        """Approved review counts per star, from 5 stars down to 1."""
+        return [(star, getattr(self, f'rating_{star}')) for star in range(5, 0, -1)]
+
+    @classmethod
+    def apply_rating_deltas(cls, deltas):
+        """
+        Apply approved-review changes to the stored rating aggregates.
+        `deltas` maps product_id -> {star: +n / -n}. Runs one pair of
+        UPDATE statements per product using F() expressions, so concurrent
+        reviews never overwrite each other's counts.
+        """
+        with transaction.atomic():
+            for product_id, stars in deltas.items():
+                changes = {
+                    f'rating_{star}': F(f'rating_{star}') + delta
+                    for star, delta in stars.items() if delta
+                }
+                if not changes:
+                    continue
+                changes['rating_count'] = F('rating_count') + sum(stars.values())
+                products = cls.objects.filter(pk=product_id)
+                products.update(**changes)
+                products.update(rating_avg=rating_avg_expression())
+        # Queryset updates send no signals, so invalidate cached pages here
+        from .cache_utils import bump_generation
+        bump_generation('catalog')
+
+    @classmethod
+    def record_sales(cls, quantities, when=None):
+        """
+        Add paid quantities to the popularity ranking.
+        `quantities` maps product_id -> units sold. One F() update per product,
+        so concurrent webhooks never lose each other's sales.
+        """
+        weight = sales_weight(when)
+        with transaction.atomic():
+            for product_id, quantity in quantities.items():
+                if quantity:
+                    cls.objects.filter(pk=product_id).update(sales_score=F('sales_score') + quantity * weight)
+        from .cache_utils import bump_generation
+        bump_generation('catalog')
 
     def get_discount_percentage(self):
         """Calculate discount percentage if original price exists."""
@@ -62,6 +184,50 @@ class Product(models.Model):
         return 0
 
 
+# Forward decay epoch: every sale is weighted by exp(lambda * (t - epoch)), so a
+# sale today outweighs one a half-life ago 2:1 while stored scores never need
+# to be decayed in place. Ordering by the score is ordering by decayed sales.
+SALES_DECAY_EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def sales_weight(when=None):
+    """Forward-decay weight of a sale made at `when` (default: now)."""
+    when = when or datetime.now(dt_timezone.utc)
+    half_life_days = getattr(settings, 'SALES_HALF_LIFE_DAYS', 30)
+    age_days = (when - SALES_DECAY_EPOCH).total_seconds() / 86400
+    return math.exp(math.log(2) * age_days / half_life_days)
+
+
+def rating_avg_expression():
+    """SQL expression computing the average from the stored histogram."""
+    total = sum((F(f'rating_{star}') * star for star in range(2, 6)), F('rating_1'))
+    return Case(
+        When(rating_count__gt=0, then=ExpressionWrapper(
+            total * 1.0 / F('rating_count'), output_field=FloatField()
+        )),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+# ===========================
+# PRODUCT SEARCH INDEX
+# ===========================
+class ProductSearchEntry(models.Model):
+    """
+    A row of the FTS5 product index (created by migration 0005 on SQLite and
+    written by store.search), mapped only so searches can join it.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'store_product_fts'
+
+
 # ===========================
 # REVIEW MODEL
 # ===========================
@@ -80,6 +246,10 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ('product', 'user')
+        indexes = [
+            # Approved reviews on the product page; partial because the filter is a bare boolean
+            models.Index(fields=['product', 'created_at'], condition=Q(approved=True), name='review_approved_product_idx'),
+        ]
 
     def __str__(self):
         return f'{self.product.name} - {self.rating} stars'
@@ -88,6 +258,8 @@ class Review(models.Model):
 class Coupon(models.Model):
     """Coupon codes for discounts applied to orders."""
     code = models.CharField(max_length=50, unique=True)
+    # Trimmed, upper-case copy of `code` for case-insensitive lookups (set on save)
+    code_normalized = models.CharField(max_length=50, unique=True, editable=False)
     description = models.CharField(max_length=200, blank=True)
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     active = models.BooleanField(default=True)
@@ -102,8 +274,19 @@ class Coupon(models.Model):
     def __str__(self):
         return self.code
 
+    def clean(self):
+        # code_normalized is not a form field, so form validation never checks its uniqueness
+        from .coupons import normalize_code
+        clash = Coupon.objects.filter(code_normalized=normalize_code(self.code)).exclude(pk=self.pk).first()
+        if clash is not None:
+            raise ValidationError({'code': f'Coupon "{clash.code}" already uses this code (codes ignore case and spaces).'})
+
+    def save(self, *args, **kwargs):
+        from .coupons import normalize_code
+        self.code_normalized = normalize_code(self.code)
+        super().save(*args, **kwargs)
+
     def is_valid(self):
-        from django.utils import timezone
         today = timezone.now().date()
         if not self.active:
             return False
@@ -151,8 +334,8 @@ class CartItem(models.Model):
 # ===========================
 # ORDER MODEL
 # ===========================
-class Order(models.Model):
-    """Customer orders."""
+class BaseOrder(models.Model):
+    """Fields shared by live orders and their archived copies (see store.archive)."""
     ORDER_STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -167,7 +350,6 @@ class Order(models.Model):
         ('stripe', 'Stripe'),
     )
 
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='orders')
     order_number = models.CharField(max_length=50, unique=True)
     currency = models.CharField(max_length=10, default='USD')
     
@@ -187,52 +369,114 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
     
-    # Tracking
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    
     # Payment
     paid = models.BooleanField(default=False)
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
 
+    # Summary of the items for order lists (see set_summary), so "My Orders"
+    # never has to load OrderItems or products
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    thumbnail = models.ImageField(upload_to='products/', blank=True, editable=False)
+    items_digest = models.CharField(max_length=255, blank=True, editable=False)
+
+    # Line items named in the digest before it says "+N more"
+    DIGEST_ITEMS = 3
+
     class Meta:
-        ordering = ['-created_at']
+        abstract = True
 
     def __str__(self):
         return f'Order #{self.order_number}'
-    
+
     def can_be_cancelled(self):
         """Check if order can be cancelled"""
         # Can only cancel pending or confirmed orders
         return self.status in ['pending', 'confirmed']
-    
+
+
+class Order(BaseOrder):
+    """Customer orders."""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='orders')
+
+    # Tracking
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Archival candidates (see store.archive)
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ]
+
+    def set_summary(self, lines):
+        """
+        Fill item_count, thumbnail and items_digest from [(product, quantity)]
+        (product may be None if it was deleted). Does not save.
+        """
+        lines = list(lines)
+        names = [
+            (product.name if product is not None else 'Discontinued item') + (f' × {quantity}' if quantity > 1 else '')
+            for product, quantity in lines[:self.DIGEST_ITEMS]
+        ]
+        if len(lines) > self.DIGEST_ITEMS:
+            names.append(f'+{len(lines) - self.DIGEST_ITEMS} more')
+        digest = ', '.join(names)
+        self.item_count = len(lines)
+        self.thumbnail = next((product.image.name for product, _quantity in lines if product is not None), '')
+        self.items_digest = digest if len(digest) <= 255 else digest[:254] + '…'
+
+    def refresh_summary(self):
+        """Recompute the summary from the stored items (one query) and save it."""
+        self.set_summary(
+            (item.product, item.quantity) for item in self.items.select_related('product').order_by('id')
+        )
+        Order.objects.filter(pk=self.pk).update(
+            item_count=self.item_count, thumbnail=self.thumbnail.name, items_digest=self.items_digest,
+        )
+
     def cancel(self):
         """Cancel the order and restore product stock"""
         if not self.can_be_cancelled():
             return False
         
-        # Restore stock for all items in order
-        for item in self.items.all():
-            if item.product:
-                item.product.stock += item.quantity
-                item.product.save()
-        
-        # Mark order as cancelled
-        self.status = 'cancelled'
-        self.save()
+        with transaction.atomic():
+            # Mark order as cancelled (conditionally, so stock is restored only once)
+            cancelled = Order.objects.filter(
+                pk=self.pk, status__in=['pending', 'confirmed']
+            ).update(status='cancelled', updated_at=timezone.now())
+            if not cancelled:
+                return False
+            self.status = 'cancelled'
+            
+            # Restore the stock reserved at checkout
+            from . import inventory
+            quantities = {}
+            for product_id, quantity in self.items.filter(product__isnull=False).values_list('product_id', 'quantity'):
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            inventory.release(quantities, order=self)
+
+            # A paid order no longer counts towards the daily sales
+            if self.paid:
+                from . import sales
+                sales.remove_order(self)
         return True
 
 
 # ===========================
 # ORDER ITEM MODEL
 # ===========================
-class OrderItem(models.Model):
-    """Items in an order."""
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+class BaseOrderItem(models.Model):
+    """Fields shared by live order items and their archived copies."""
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        abstract = True
+
     def __str__(self):
         return f'{self.order.order_number} - {self.product.name}'
 
@@ -240,6 +484,69 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class OrderItem(BaseOrderItem):
+    """Items in an order."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+
+
+# ===========================
+# ORDER ARCHIVE MODELS
+# ===========================
+class ArchivedOrder(BaseOrder):
+    """
+    A delivered or cancelled order moved out of the live tables by
+    `manage.py archive_orders`. Keeps the original id and timestamps.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_orders')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'),
+        ]
+
+
+class ArchivedOrderItem(BaseOrderItem):
+    """An item of an ArchivedOrder (original id kept)."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+
+
+# ===========================
+# INVENTORY LEDGER
+# ===========================
+class InventoryMovement(models.Model):
+    """One change to a product's stock; stock == sum of its movements (see store.inventory)."""
+    REASON_CHOICES = (
+        ('opening', 'Opening balance'),
+        ('checkout', 'Checkout'),
+        ('cancellation', 'Order cancelled'),
+        ('adjustment', 'Manual adjustment'),
+        ('compaction', 'Compacted history'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_movements')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_movements')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['product', 'id'], name='inventory_product_idx'),
+            models.Index(fields=['created_at'], name='inventory_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.delta:+d} ({self.reason})'
+
+
 # ===========================
 # USER PROFILE MODEL
 # ===========================
@@ -307,3 +614,327 @@ class ContactQuery(models.Model):
     
     def __str__(self):
         return f'{self.name} - {self.subject} ({self.status})'
+
+
+# ===========================
+# PRODUCT ASSOCIATION MODEL
+# ===========================
+class ProductAssociation(models.Model):
+    """
+    "Frequently bought together": how many orders contained both products.
+    Only each product's strongest neighbours are kept (see store.associations).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associated_from')
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='association_product_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} ({self.score})'
+
+
+# ===========================
+# BATCH JOB CHECKPOINT MODEL
+# ===========================
+class JobCheckpoint(models.Model):
+    """Where an incremental batch job stopped last time (e.g. the last order id it processed)."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.position}'
+
+
+# ===========================
+# ORDER ID WORKER LEASES
+# ===========================
+class OrderIdWorkerLease(models.Model):
+    """A worker id (0-1023) of store.order_ids held by one process until expires_at."""
+    worker_id = models.PositiveSmallIntegerField(unique=True)
+    holder = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.worker_id} -> {self.holder}'
+
+
+# ===========================
+# OUTBOX MODEL
+# ===========================
+class OutboxMessage(models.Model):
+    """A side effect (email, SMS) queued in the same transaction as the change that caused it (see store.outbox)."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('dead', 'Dead letter'),
+    )
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_due_idx'),
+            models.Index(fields=['locked_by'], name='outbox_locked_by_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+# ===========================
+# WEBHOOK EVENT MODEL
+# ===========================
+class ProcessedWebhookEvent(models.Model):
+    """A payment provider event that was handled; its id is unique, so a retried event is recognised (see payments.events)."""
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.event_type} {self.event_id}'
+
+
+# ===========================
+# SALES ROLLUP MODELS
+# ===========================
+class DailySales(models.Model):
+    """
+    Paid, uncancelled orders per day (of created_at, local time) and currency,
+    kept up to date as orders are paid or cancelled (see store.sales).
+    """
+    date = models.DateField()
+    currency = models.CharField(max_length=10)
+    orders = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'currency'], name='daily_sales_date_currency_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.currency}: {self.orders} orders, {self.gross}'
+
+
+class DailyCategorySales(models.Model):
+    """Per-category daily sales: orders with items from the category and those items' revenue."""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    orders = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'date'], name='daily_category_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.category_id}: {self.orders} orders, {self.gross}'
+
+
+class DailyProductSales(models.Model):
+    """Units and revenue of one product per day; category is the product's category when it sold."""
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date'], name='daily_product_category_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.product_id}: {self.units} units, {self.revenue}'
+
+
+# ===========================
+# RATING AGGREGATE SIGNALS
+# ===========================
+@receiver(pre_save, sender=Review)
+def remember_review_state(sender, instance, raw=False, **kwargs):
+    """Remember the stored approval/rating so post_save can apply the difference."""
+    instance._previous_rating_state = None
+    if instance.pk and not raw:
+        instance._previous_rating_state = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list('product_id', 'approved', 'rating')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, raw=False, **kwargs):
+    """Keep Product rating aggregates in step with approved reviews."""
+    if raw:
+        return
+    deltas = {}
+    previous = getattr(instance, '_previous_rating_state', None)
+    if previous and previous[1]:
+        product_id, _, rating = previous
+        deltas.setdefault(product_id, {})
+        deltas[product_id][rating] = deltas[product_id].get(rating, 0) - 1
+    if instance.approved:
+        rating = int(instance.rating)
+        deltas.setdefault(instance.product_id, {})
+        deltas[instance.product_id][rating] = deltas[instance.product_id].get(rating, 0) + 1
+    Product.apply_rating_deltas(deltas)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """Remove a deleted approved review from its product's aggregates."""
+    if instance.approved:
+        Product.apply_rating_deltas({instance.product_id: {int(instance.rating): -1}})
+
+
+# ===========================
+# SEARCH INDEX SIGNALS
+# ===========================
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Refresh the product's full-text index row when indexed fields change."""
+    from . import search
+    if raw or (update_fields and not search.INDEXED_FIELDS.intersection(update_fields)):
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    from . import search
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    """Category names are indexed with each product, so reindex its products."""
+    from . import search
+    if raw or created:
+        return
+    search.index_products(instance.products.select_related('category'))
+
+
+# ===========================
+# TYPEAHEAD SIGNALS
+# ===========================
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def refresh_suggestions(sender, **kwargs):
+    """Catalog names changed: let the typeahead trie rebuild in the background."""
+    from . import suggest
+    suggest.mark_stale()
+
+
+# ===========================
+# FACET INDEX SIGNALS
+# ===========================
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, raw=False, **kwargs):
+    from . import facets
+    if not raw:
+        facets.product_saved(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_facets(sender, instance, **kwargs):
+    from . import facets
+    facets.product_deleted(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def reset_category_facets(sender, **kwargs):
+    """The category list itself changed, so rebuild the facet index once that commits."""
+    from . import facets
+    transaction.on_commit(facets.invalidate)
+
+
+# ===========================
+# PAGE CACHE SIGNALS
+# ===========================
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Review)
+def bump_catalog_generation(sender, **kwargs):
+    """Cached anonymous pages show products, categories and ratings."""
+    from .cache_utils import bump_generation
+    bump_generation('catalog')
+
+
+# ===========================
+# NAVIGATION MENU SIGNALS
+# ===========================
+@receiver([post_save, post_delete], sender=Category)
+def refresh_nav_categories(sender, **kwargs):
+    from .cache_utils import bump_generation
+    from .context_processors import clear_nav_categories
+    clear_nav_categories()
+    bump_generation('categories')
+
+
+# ===========================
+# GUEST CART SIGNALS
+# ===========================
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    """Carry the cart a visitor filled before logging in over to their account."""
+    from .cart_utils import merge_session_cart
+    if request is not None:
+        merge_session_cart(request, user)
+
+
+# ===========================
+# COUPON CACHE SIGNALS
+# ===========================
+@receiver([post_save, post_delete], sender=Coupon)
+def refresh_coupon_cache(sender, **kwargs):
+    from .cache_utils import bump_generation
+    from .coupons import clear_coupon_cache
+    clear_coupon_cache()
+    bump_generation('coupons')
+
+
+# ===========================
+# INVENTORY LEDGER SIGNALS
+# ===========================
+@receiver(post_save, sender=Product)
+def record_opening_stock(sender, instance, created, raw=False, **kwargs):
+    """New products start the ledger with the stock they were created with."""
+    from . import inventory
+    if created and not raw:
+        inventory.record_opening_balance(instance)
+
+
+# ===========================
+# ORDER ID WORKER SIGNALS
+# ===========================
+@receiver(request_started)
+def lease_order_id_worker(sender, **kwargs):
+    """Lease (or renew) this process's order id worker id before any view opens a transaction."""
+    from . import order_ids
+    order_ids.ensure_worker()
@@ -0,0 +1,217 @@
+"""
+Order numbers that are unique, time-ordered and need no database round trip.
+
+Ids are Snowflake-style 64-bit integers::
+
+    | 41 bits: ms since ORDER_ID_EPOCH | 10 bits: worker id | 12 bits: sequence |
+
+Each worker (process) owns one worker id, so two workers can never mint the
+same id and no coordination is needed. Within a worker the sequence
+numbers ids minted in the same millisecond; if it runs out (4096 ids in one
+ms) or the clock steps backwards, the generator borrows the next
+millisecond instead of waiting, so ids stay strictly increasing.
+
+Order numbers render the id as fixed-width Crockford base32 after the
+usual prefix and date, e.g. ``ORD-20261016-0DKS8Q3V1T2C4``, so they sort
+in creation order and new rows always land at the end of the unique index.
+
+Every process that creates orders needs a distinct worker id (0-1023).
+A process started with ORDER_ID_WORKER_ID (or that calls
+``configure_worker()``, e.g. from a gunicorn ``post_fork`` hook) uses
+that. Otherwise it leases a free id from OrderIdWorkerLease at the start
+of a request (see ``ensure_worker``) and renews the lease while it runs;
+a lease that is not renewed expires after ORDER_ID_LEASE_SECONDS and the
+id can go to another process. Minting without a valid worker id raises
+ImproperlyConfigured instead of guessing one.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+ORDER_ID_EPOCH_MS = int(datetime(2026, 1, 1, tzinfo=dt_timezone.utc).timestamp() * 1000)
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ENCODED_LENGTH = 13  # 64 bits in base32
+
+
+class OrderIdGenerator:
+    """Mints increasing ids for one worker id. Thread-safe."""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id must be between 0 and {MAX_WORKER_ID}')
+        self.worker_id = worker_id
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000 - ORDER_ID_EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms, self._sequence = now_ms, 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                # Sequence exhausted (or clock went back): borrow the next ms
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_order_number(self):
+        return format_order_number(self.next_id())
+
+
+def encode_id(value):
+    """Fixed-width Crockford base32, so string order matches numeric order."""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(CROCKFORD_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def id_timestamp(value):
+    """UTC datetime an id was minted at."""
+    ms = (value >> (WORKER_BITS + SEQUENCE_BITS)) + ORDER_ID_EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def format_order_number(value):
+    return f'ORD-{id_timestamp(value):%Y%m%d}-{encode_id(value)}'
+
+
+# ===========================
+# PROCESS-WIDE GENERATOR
+# ===========================
+_generator = {'instance': None, 'pid': None, 'leased': False, 'renew_at': 0.0, 'expires_at': 0.0}
+_generator_lock = threading.Lock()
+
+# Identifies this process in OrderIdWorkerLease (a pid alone is reused)
+_holder = {'name': None, 'pid': None}
+
+
+def configured_worker_id():
+    worker_id = getattr(settings, 'ORDER_ID_WORKER_ID', None)
+    return None if worker_id in (None, '') else int(worker_id)
+
+
+def lease_seconds():
+    return getattr(settings, 'ORDER_ID_LEASE_SECONDS', 600)
+
+
+def holder_name():
+    if _holder['pid'] != os.getpid():
+        _holder.update(name=f'{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}', pid=os.getpid())
+    return _holder['name']
+
+
+def lease_worker_id(holder, seconds):
+    """
+    Claim a free worker id for `holder` for `seconds`: an expired lease
+    (compare-and-set on its expiry) or an id never leased (unique insert).
+    Raises ImproperlyConfigured if all 1024 are held.
+    """
+    from .models import OrderIdWorkerLease
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=seconds)
+    expired = OrderIdWorkerLease.objects.filter(expires_at__lte=now)
+    for lease in expired.only('worker_id', 'expires_at')[:10]:
+        if OrderIdWorkerLease.objects.filter(pk=lease.pk, expires_at=lease.expires_at).update(
+            holder=holder, expires_at=expires_at,
+        ):
+            return lease.worker_id
+    used = set(OrderIdWorkerLease.objects.values_list('worker_id', flat=True))
+    for worker_id in range(MAX_WORKER_ID + 1):
+        if worker_id in used:
+            continue
+        try:
+            with transaction.atomic():
+                OrderIdWorkerLease.objects.create(worker_id=worker_id, holder=holder, expires_at=expires_at)
+        except IntegrityError:
+            continue  # taken by another process just now
+        return worker_id
+    raise ImproperlyConfigured(
+        'Every order id worker id is leased; set ORDER_ID_WORKER_ID per process or wait for leases to expire.'
+    )
+
+
+def renew_lease(worker_id, holder, seconds):
+    """Extend `holder`'s lease on `worker_id`; False if it expired and went to another process."""
+    from .models import OrderIdWorkerLease
+
+    return bool(OrderIdWorkerLease.objects.filter(worker_id=worker_id, holder=holder).update(
+        expires_at=timezone.now() + timedelta(seconds=seconds),
+    ))
+
+
+def configure_worker(worker_id):
+    """Give this process its own worker id (call once after forking)."""
+    with _generator_lock:
+        _generator.update(instance=OrderIdGenerator(worker_id), pid=os.getpid(), leased=False)
+
+
+def ensure_worker():
+    """
+    Make sure this process holds a worker id, leasing or renewing one when
+    due. Writes in autocommit, so it does nothing inside a transaction (a
+    lease rolled back with it would be held by nobody); call it where no
+    transaction is open, e.g. when a request starts.
+    """
+    if configured_worker_id() is not None or connection.in_atomic_block:
+        return
+    with _generator_lock:
+        current = _generator['instance'] if _generator['pid'] == os.getpid() else None
+        if current is not None and (not _generator['leased'] or time.monotonic() < _generator['renew_at']):
+            return
+        seconds = lease_seconds()
+        started = time.monotonic()
+        holder = holder_name()
+        if current is None or not renew_lease(current.worker_id, holder, seconds):
+            # Lost (or never had) a lease: any ids minted from now on use the new worker id
+            current = OrderIdGenerator(lease_worker_id(holder, seconds))
+        _generator.update(
+            instance=current, pid=os.getpid(), leased=True,
+            renew_at=started + seconds / 2, expires_at=started + seconds,
+        )
+
+
+def _current_generator():
+    with _generator_lock:
+        if _generator['pid'] == os.getpid() and _generator['instance'] is not None and (
+            not _generator['leased'] or time.monotonic() < _generator['expires_at']
+        ):
+            return _generator['instance']
+        worker_id = configured_worker_id()
+        if worker_id is not None:
+            # First use, or a forked child that must not reuse the parent's state
+            _generator.update(instance=OrderIdGenerator(worker_id), pid=os.getpid(), leased=False)
+            return _generator['instance']
+    return None
+
+
+def next_order_number():
+    """A new unique, time-ordered order number."""
+    generator = _current_generator()
+    if generator is None:
+        ensure_worker()
+        generator = _current_generator()
+    if generator is None:
+        raise ImproperlyConfigured(
+            'No order id worker id: set ORDER_ID_WORKER_ID, call order_ids.configure_worker() '
+            'or order_ids.ensure_worker() outside a transaction before placing orders.'
+        )
+    return generator.next_order_number()
@@ -0,0 +1,233 @@
+"""
+Transactional outbox for side effects (emails, SMS).
+
+Views never talk to SMTP or Twilio directly. They call ``enqueue(kind,
+**payload)`` inside the transaction that makes the change, so the message
+row commits (or rolls back) together with it, and return straight away.
+``manage.py run_outbox_worker`` drains the table with a thread pool:
+
+* a batch is claimed with one conditional UPDATE that stamps a lease
+  (``locked_by``/``locked_until``), so several workers never send the same
+  message and a crashed worker's claims expire after OUTBOX_LEASE_SECONDS;
+* a failed message is retried with exponential backoff
+  (OUTBOX_RETRY_BASE_SECONDS doubling up to OUTBOX_RETRY_MAX_SECONDS) and
+  dead-lettered after OUTBOX_MAX_ATTEMPTS, keeping its last error for the
+  admin, where it can be requeued.
+
+Delivery is at least once: a message can be sent twice if a worker dies
+between sending and marking it done. Payloads hold ids, not objects;
+handlers load what they need and skip rows deleted meanwhile.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+DEAD = 'dead'
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the function that delivers messages of `kind` (called with the payload)."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, **payload):
+    """Queue a message; call inside the transaction that makes it necessary."""
+    from .models import OutboxMessage
+
+    if kind not in HANDLERS:
+        raise ValueError(f'No outbox handler for {kind!r}')
+    return OutboxMessage.objects.create(kind=kind, payload=payload)
+
+
+def retry_delay(attempts):
+    """Backoff before retry number `attempts` (1 = first retry)."""
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+    ceiling = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+# ===========================
+# WORKER
+# ===========================
+def claim_batch(limit):
+    """
+    Lease up to `limit` due messages under a fresh token with one UPDATE and
+    return them. Expired leases are claimable again.
+    """
+    from .models import OutboxMessage
+
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE_SECONDS', 300))
+    due = (
+        OutboxMessage.objects.filter(status=PENDING, available_at__lte=now)
+        .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+    )
+    ids = list(due.order_by('available_at', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    # Re-check the conditions so a message another worker just leased is skipped
+    due.filter(pk__in=ids).update(locked_by=token, locked_until=now + lease)
+    return list(OutboxMessage.objects.filter(locked_by=token))
+
+
+def deliver(message):
+    """Run one message's handler and record the outcome. Returns True if it was delivered."""
+    from .models import OutboxMessage
+
+    now = timezone.now()
+    mine = OutboxMessage.objects.filter(pk=message.pk, locked_by=message.locked_by)
+    try:
+        HANDLERS[message.kind](**message.payload)
+    except Exception as error:
+        attempts = message.attempts + 1
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+        dead = attempts >= max_attempts
+        logger.warning('Outbox %s #%s failed (attempt %s/%s): %s',
+                       message.kind, message.pk, attempts, max_attempts, error)
+        mine.update(
+            status=DEAD if dead else PENDING,
+            attempts=attempts,
+            available_at=now if dead else now + retry_delay(attempts),
+            last_error=f'{type(error).__name__}: {error}'[:2000],
+            locked_by='', locked_until=None,
+        )
+        return False
+    mine.update(status=DONE, attempts=message.attempts + 1, processed_at=now,
+                last_error='', locked_by='', locked_until=None)
+    return True
+
+
+def _deliver_in_thread(message):
+    try:
+        return deliver(message)
+    finally:
+        connection.close()  # each pool thread has its own connection
+
+
+def drain(batch_size=50, executor=None):
+    """
+    Deliver every due message, `batch_size` at a time, on `executor` (a
+    thread pool) if given, else in this thread. Returns (delivered, failed).
+    """
+    delivered = failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return delivered, failed
+        if executor is not None:
+            results = list(executor.map(_deliver_in_thread, batch))
+        else:
+            results = [deliver(message) for message in batch]
+        delivered += results.count(True)
+        failed += results.count(False)
+
+
+def requeue(queryset):
+    """Give dead-lettered messages a fresh set of attempts."""
+    return queryset.filter(status=DEAD).update(
+        status=PENDING, attempts=0, available_at=timezone.now(), locked_by='', locked_until=None,
+    )
+
+
+# ===========================
+# HANDLERS
+# ===========================
+@handler('order_confirmation')
+def order_confirmation(order_id):
+    from .email_utils import send_order_confirmation_email
+    from .models import Order
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        send_order_confirmation_email(order, fail_silently=False)
+
+
+@handler('order_confirmed_sms')
+def order_confirmed_sms(order_id):
+    from .models import Order
+    from .sms_utils import send_sms
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None and order.phone:
+        send_sms(order.phone, f'Your order {order.order_number} has been confirmed. Total: {order.total_price}',
+                 fail_silently=False)
+
+
+@handler('order_cancellation')
+def order_cancellation(order_id):
+    from .email_utils import send_order_cancellation_email
+    from .models import Order
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        send_order_cancellation_email(order, fail_silently=False)
+
+
+@handler('low_stock_alert')
+def low_stock_alert(product_ids):
+    """Email the admin about products at or below LOW_STOCK_THRESHOLD (stock as of sending)."""
+    from .email_utils import send_low_stock_alert
+    from .models import Product
+
+    threshold = int(getattr(settings, 'LOW_STOCK_THRESHOLD', 5))
+    admin_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    for product in Product.objects.filter(pk__in=product_ids, stock__lte=threshold):
+        send_low_stock_alert(product, product.stock, admin_email=admin_email, fail_silently=False)
+
+
+@handler('contact_receipt')
+def contact_receipt(contact_id):
+    from .email_utils import send_contact_receipt_email
+    from .models import ContactQuery
+
+    contact = ContactQuery.objects.filter(pk=contact_id).first()
+    if contact is not None:
+        send_contact_receipt_email(contact, fail_silently=False)
+
+
+@handler('contact_admin_notice')
+def contact_admin_notice(contact_id):
+    from .email_utils import notify_admin_new_contact
+    from .models import ContactQuery
+
+    admin_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    contact = ContactQuery.objects.filter(pk=contact_id).first()
+    if contact is not None and admin_email:
+        notify_admin_new_contact(contact, admin_email, fail_silently=False)
+
+
+@handler('review_moderation')
+def review_moderation(review_id):
+    from .email_utils import notify_moderator_review
+    from .models import Review
+
+    admin_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    review = Review.objects.select_related('product', 'user').filter(pk=review_id).first()
+    if review is not None and admin_email:
+        notify_moderator_review(review, admin_email, fail_silently=False)
+
+
+@handler('welcome_email')
+def welcome_email(user_id):
+    from django.contrib.auth.models import User
+
+    from .email_utils import send_welcome_email
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None and user.email:
+        send_welcome_email(user, fail_silently=False)
@@ -0,0 +1,271 @@
+"""
+Keyset (cursor) pagination.
+
+Offset pagination runs a COUNT(*) and an ever-growing OFFSET on every page,
+so deep pages get slower as the tables grow. Keyset pagination remembers
+the sort key of the last row it showed and asks for rows *after* it::
+
+    WHERE (price > 120) OR (price = 120 AND id > 57) ORDER BY price, id LIMIT 13
+
+which an index on the sort columns answers in constant time for any page.
+
+The sort key is taken from the queryset's ``order_by()`` (or the model's
+default ordering) with the primary key appended as a tie-breaker, and is
+sent to the browser as an opaque, URL-safe cursor. Sort columns must be
+NOT NULL; annotations (e.g. the search rank) may be used as keys.
+
+No COUNT query is made unless the request asks for one with ``?count=1``.
+"""
+import base64
+import binascii
+import datetime
+import functools
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(values, direction):
+    """Pack sort key values into an opaque URL-safe string."""
+    payload = json.dumps({'k': [_jsonable(value) for value in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); returns (values, direction) or None if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['k'], payload['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return values, direction
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage:
+    """One page of results plus the cursors to reach its neighbours."""
+
+    def __init__(self, object_list, has_next, has_previous, paginator, request=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.paginator = paginator
+        self.request = request
+        self._count = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[-1]), NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        return encode_cursor(self.paginator.key_values(self.object_list[0]), PREVIOUS)
+
+    @property
+    def first_url(self):
+        if self.request is None:
+            return None
+        params = self.request.GET.copy()
+        params.pop('format', None)
+        params.pop('cursor', None)
+        return f'?{params.urlencode()}'
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor)
+
+    @property
+    def count(self):
+        """Total matching rows, only when the request asked for it (``?count=1``)."""
+        if self._count is None and self.request is not None and self.request.GET.get('count'):
+            self._count = self.paginator.count
+        return self._count
+
+    def _url(self, cursor):
+        if cursor is None or self.request is None:
+            return None
+        params = self.request.GET.copy()
+        params.pop('format', None)
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+
+class KeysetPaginator:
+    """Paginate an ordered queryset with cursors instead of page numbers."""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = self._sort_keys(queryset)
+
+    @staticmethod
+    def _sort_keys(queryset):
+        """[(name, descending), ...] for the queryset ordering, ending with the pk."""
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        keys = []
+        for term in ordering:
+            if not isinstance(term, str):
+                raise ValueError('Keyset pagination only supports ordering by field names.')
+            descending = term.startswith('-')
+            name = term.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            keys.append((name, descending))
+            if name == 'id':
+                break
+        else:
+            keys.append(('id', keys[0][1] if keys else True))
+        return keys
+
+    @property
+    def count(self):
+        return self.queryset.count()
+
+    def key_values(self, obj):
+        return [getattr(obj, name) for name, _descending in self.keys]
+
+    def _key_field(self, name):
+        """Model field, or annotation output field (e.g. the search rank), of a sort key."""
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return self.queryset.query.annotations[name].output_field
+
+    def _parse_values(self, raw_values):
+        """Convert JSON cursor values back to Python (None if any is missing or not of its key's type)."""
+        if len(raw_values) != len(self.keys):
+            return None
+        values = []
+        for (name, _descending), raw in zip(self.keys, raw_values):
+            try:
+                value = self._key_field(name).to_python(raw)
+            except (ValidationError, TypeError, ValueError):
+                return None
+            if value is None or isinstance(value, (list, dict)):
+                return None  # sort keys are NOT NULL scalars
+            values.append(value)
+        return values
+
+    def _seek(self, values, forward):
+        """Rows strictly after (forward) or before the given key values."""
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        # Redundant bound on the leading key gives the planner an index range
+        name, descending = self.keys[0]
+        return Q(**{f'{name}__{"lte" if descending == forward else "gte"}': values[0]}) & condition
+
+    def page_queryset(self, cursor=None):
+        """(queryset for the page after/before `cursor`, direction, has cursor)."""
+        decoded = decode_cursor(cursor) if cursor else None
+        values = self._parse_values(decoded[0]) if decoded else None
+        direction = decoded[1] if values is not None else NEXT
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward=direction == NEXT))
+        if direction == PREVIOUS:
+            queryset = queryset.order_by(*[
+                name if descending else f'-{name}' for name, descending in self.keys
+            ])
+        else:
+            queryset = queryset.order_by(*[
+                f'-{name}' if descending else name for name, descending in self.keys
+            ])
+        return queryset[:self.per_page + 1], direction, values is not None
+
+    def get_page(self, cursor=None, request=None):
+        """The page after/before `cursor` (the first page when missing or invalid)."""
+        queryset, direction, has_cursor = self.page_queryset(cursor)
+        return self._build_page(list(queryset), direction, has_cursor, request)
+
+    def _build_page(self, rows, direction, has_cursor, request):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == PREVIOUS:
+            rows.reverse()
+            return KeysetPage(rows, has_next=True, has_previous=has_more, paginator=self, request=request)
+        return KeysetPage(rows, has_next=has_more, has_previous=has_cursor, paginator=self, request=request)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """
+    Keyset pagination over several querysets sharing the same sort key and
+    unique ids (e.g. live and archived orders). Each page reads at most
+    per_page + 1 rows from every queryset and merges them in Python.
+    """
+
+    def __init__(self, querysets, per_page):
+        self.querysets = querysets
+        self.paginators = [KeysetPaginator(queryset, per_page) for queryset in querysets]
+        super().__init__(querysets[0], per_page)
+
+    @property
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def _compare(self, a, b):
+        for (name, descending), x, y in zip(self.keys, self.key_values(a), self.key_values(b)):
+            if x != y:
+                return (1 if x > y else -1) * (-1 if descending else 1)
+        return 0
+
+    def get_page(self, cursor=None, request=None):
+        rows = []
+        for paginator in self.paginators:
+            queryset, direction, has_cursor = paginator.page_queryset(cursor)
+            rows.extend(queryset)
+        rows.sort(key=functools.cmp_to_key(self._compare), reverse=direction == PREVIOUS)
+        return self._build_page(rows, direction, has_cursor, request)
+
+
+def paginate(request, queryset, per_page):
+    """Keyset page for the request's ``?cursor=`` parameter."""
+    return KeysetPaginator(queryset, per_page).get_page(request.GET.get('cursor'), request=request)
+
+
+def paginate_merged(request, querysets, per_page):
+    """Keyset page over several querysets read as one (see MergedKeysetPaginator)."""
+    return MergedKeysetPaginator(querysets, per_page).get_page(request.GET.get('cursor'), request=request)
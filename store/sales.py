@@ -0,0 +1,214 @@
+"""
+Daily sales rollups for the analytics dashboard.
+
+A paid order is added to three small tables when its payment is
+confirmed and taken out again if it is cancelled afterwards:
+
+* DailySales: orders, gross (order totals) and units per day and currency
+* DailyCategorySales: the same per category (gross = its items' revenue)
+* DailyProductSales: units and revenue per product, for "top products"
+
+Days are the local date of the order's created_at, so a cancellation
+always lands on the day the sale was counted. Each change is an INSERT of
+any missing zero rows followed by ``UPDATE ... SET n = n + delta`` per row,
+so concurrent payments never overwrite each other.
+
+The dashboard then reads one row per day (and currency) whatever the
+range, instead of scanning orders. Order edits in the admin take the
+stored order out and add the edited one back (see OrderAdmin.save_model).
+``rebuild_daily_sales`` recomputes the tables from the orders (live and
+archived) to backfill history or repair drift from changes made outside
+these paths, e.g. queryset updates in a shell.
+
+Amounts are in the base currency (order totals are never converted);
+`currency` records what the shopper was shown.
+"""
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+def sales_date(order):
+    """The day `order` counts towards."""
+    return timezone.localdate(order.created_at)
+
+
+def is_counted(order):
+    """True when the rollups include `order` (paid and not cancelled, as in counted_orders)."""
+    return order.paid and order.status != 'cancelled'
+
+
+def rollups():
+    """[(model, key fields)] of the rollup tables."""
+    from .models import DailyCategorySales, DailyProductSales, DailySales
+
+    return [
+        (DailySales, ('date', 'currency')),
+        (DailyCategorySales, ('date', 'category_id')),
+        (DailyProductSales, ('date', 'product_id')),
+    ]
+
+
+def order_items(order_ids, model):
+    """{order_id: [(product_id, category_id, quantity, price)]} for the items of `order_ids` (one query)."""
+    items = defaultdict(list)
+    rows = model.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'product_id', 'product__category_id', 'quantity', 'price',
+    ).order_by('id')
+    for order_id, *item in rows:
+        items[order_id].append(item)
+    return items
+
+
+def order_contributions(order, items):
+    """
+    {model: {key: {field: amount}}} that `order`, with `items` as returned
+    by order_items, adds to the rollups. Items whose product was deleted
+    count only towards the daily totals.
+    """
+    daily_sales, category_sales, product_sales = [model for model, _key in rollups()]
+    day = sales_date(order)
+    daily = {'orders': 1, 'gross': order.total_price, 'units': 0}
+    categories = {}
+    products = {}
+    for product_id, category_id, quantity, price in items:
+        daily['units'] += quantity
+        if product_id is None:
+            continue
+        revenue = price * quantity
+        product = products.setdefault((day, product_id), {'units': 0, 'revenue': Decimal(0), 'category_id': category_id})
+        product['units'] += quantity
+        product['revenue'] += revenue
+        if category_id is not None:
+            category = categories.setdefault((day, category_id), {'orders': 1, 'gross': Decimal(0), 'units': 0})
+            category['gross'] += revenue
+            category['units'] += quantity
+    return {
+        daily_sales: {(day, order.currency): daily},
+        category_sales: categories,
+        product_sales: products,
+    }
+
+
+# Copied onto a new row but never added up
+ATTRIBUTES = ('category_id',)
+
+
+def _apply(order, sign):
+    item_model = order._meta.get_field('items').related_model
+    contributions = order_contributions(order, order_items([order.pk], item_model)[order.pk])
+    with transaction.atomic():
+        for model, key_fields in rollups():
+            rows = contributions[model]
+            if not rows:
+                continue
+            model.objects.bulk_create([
+                model(**dict(zip(key_fields, key)),
+                      **{name: value for name, value in amounts.items() if name in ATTRIBUTES})
+                for key, amounts in rows.items()
+            ], ignore_conflicts=True)
+            for key, amounts in rows.items():
+                model.objects.filter(**dict(zip(key_fields, key))).update(**{
+                    name: F(name) + sign * value for name, value in amounts.items() if name not in ATTRIBUTES
+                })
+
+
+def record_order(order):
+    """Add a newly paid order to the rollups (call once, in the transaction that marks it paid)."""
+    _apply(order, 1)
+
+
+def remove_order(order):
+    """Take a paid order that was cancelled back out of the rollups."""
+    _apply(order, -1)
+
+
+# ===========================
+# BACKFILL
+# ===========================
+def counted_orders():
+    """[(orders, item model)]: the paid, uncancelled orders the rollups count, live and archived."""
+    from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+    return [
+        (model.objects.filter(paid=True).exclude(status='cancelled'), item_model)
+        for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+    ]
+
+
+def rebuild(since=None, batch_size=500):
+    """
+    Recompute the rollups from the orders, for every day from `since` (a
+    date; default: all history), reading `batch_size` orders and their
+    items per pair of queries. Returns the number of orders counted.
+    Payments confirmed while it runs may be missed; run it off-peak.
+    """
+    totals = {model: defaultdict(lambda: defaultdict(int)) for model, _key in rollups()}
+    counted = 0
+    for orders, item_model in counted_orders():
+        orders = orders.only('id', 'created_at', 'currency', 'total_price').order_by('id')
+        if since is not None:
+            orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        last_id = 0
+        while True:
+            batch = list(orders.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            items = order_items([order.id for order in batch], item_model)
+            for order in batch:
+                counted += 1
+                for model, rows in order_contributions(order, items[order.id]).items():
+                    for key, amounts in rows.items():
+                        row = totals[model][key]
+                        for name, value in amounts.items():
+                            if name in ATTRIBUTES:
+                                row[name] = value
+                            else:
+                                row[name] += value
+
+    with transaction.atomic():
+        for model, key_fields in rollups():
+            stale = model.objects.all() if since is None else model.objects.filter(date__gte=since)
+            stale.delete()
+            model.objects.bulk_create([
+                model(**dict(zip(key_fields, key)), **amounts) for key, amounts in totals[model].items()
+            ], batch_size=500)
+    return counted
+
+
+# ===========================
+# READING
+# ===========================
+def daily_rows(start, end, category=None):
+    """Per-day sums of orders, gross and units for start..end inclusive (all currencies, or one category)."""
+    from .models import DailyCategorySales, DailySales
+
+    rows = DailySales.objects.all() if category is None else DailyCategorySales.objects.filter(category=category)
+    return (
+        rows.filter(date__gte=start, date__lte=end).values('date')
+        .annotate(orders=Sum('orders'), gross=Sum('gross'), units=Sum('units')).order_by('date')
+    )
+
+
+def daily_totals(start, end, category=None):
+    """{date: {'orders', 'gross', 'units'}} for start..end inclusive."""
+    return {row['date']: row for row in daily_rows(start, end, category)}
+
+
+def top_products(start, end, category=None, limit=5):
+    """Best-selling products by revenue over start..end inclusive."""
+    from .models import DailyProductSales
+
+    rows = DailyProductSales.objects.filter(date__gte=start, date__lte=end)
+    if category is not None:
+        rows = rows.filter(category=category)
+    return (
+        rows.values('product__id', 'product__name')
+        .annotate(total_qty=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:limit]
+    )
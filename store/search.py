@@ -0,0 +1,127 @@
+"""
+Full-text product search.
+
+Products are indexed in an SQLite FTS5 table (``store_product_fts``) whose
+rowid is the product id. The porter tokenizer gives us tokenized, stemmed
+postings over name, description and category name, and FTS5's built-in
+bm25() provides the ranking. The index is kept up to date by the Product
+and Category signals in ``store.models``.
+
+On databases without FTS5 every function falls back to the old
+``icontains`` matching so search keeps working (just slower).
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'store_product_fts'
+
+# bm25() column weights: name, description, category
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Fields that feed the index; saves touching none of them skip reindexing.
+INDEXED_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled():
+    """True when the database has the FTS5 product index (created by migration 0005 on SQLite)."""
+    return connection.vendor == 'sqlite'
+
+
+def tokenize(text):
+    """Split free text into lowercase word tokens."""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def build_match_query(text):
+    """
+    Turn user input into a safe FTS5 MATCH expression.
+    Every token is quoted (so FTS syntax in the input is never interpreted)
+    and all tokens must match; the last one also matches as a prefix so
+    half-typed words still find results.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_products(products, text, ranked=True):
+    """
+    Restrict a Product queryset to products matching `text`.
+    With `ranked=True` the result is ordered by relevance (best first) and
+    carries a ``search_rank`` annotation (lower is better) that can be
+    filtered on, e.g. by keyset pagination; otherwise the caller's ordering
+    is kept.
+    """
+    match = build_match_query(text)
+    if not match:
+        return products.none()
+
+    if not fts_enabled():
+        products = products.filter(
+            Q(name__icontains=text) |
+            Q(description__icontains=text) |
+            Q(category__name__icontains=text)
+        )
+        return products.order_by('-created_at', '-id') if ranked else products
+
+    # Inner join with the index (see ProductSearchEntry), restricted by MATCH
+    products = products.filter(search_entry__isnull=False).filter(
+        RawSQL(f'{FTS_TABLE} MATCH %s', [match], output_field=BooleanField()),
+    )
+    if ranked:
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        products = products.annotate(
+            search_rank=RawSQL(f'bm25({FTS_TABLE}, {weights})', [], output_field=FloatField()),
+        ).order_by('search_rank', '-id')
+    return products
+
+
+# ===========================
+# INDEX MAINTENANCE
+# ===========================
+def index_products(products):
+    """Add or refresh index rows for the given products."""
+    if not fts_enabled():
+        return
+    rows = [
+        (product.pk, product.name, product.description, product.category.name if product.category_id else '')
+        for product in products
+    ]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def remove_products(product_ids):
+    """Drop index rows for deleted products."""
+    if not fts_enabled() or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+
+def rebuild_index():
+    """Rebuild the whole index from the product table in one statement."""
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) '
+            'SELECT p.id, p.name, p.description, COALESCE(c.name, \'\') '
+            'FROM store_product p LEFT JOIN store_category c ON c.id = p.category_id'
+        )
+        return cursor.rowcount
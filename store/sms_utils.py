@@ -1,6 +1,6 @@
 from django.conf import settings
 
-def send_sms(to_number, body):
+def send_sms(to_number, body, fail_silently=True):
     """Send SMS via Twilio if credentials provided. Returns True if sent."""
     sid = getattr(settings, 'TWILIO_ACCOUNT_SID', '')
     token = getattr(settings, 'TWILIO_AUTH_TOKEN', '')
@@ -15,4 +15,6 @@ def send_sms(to_number, body):
         client.messages.create(body=body, from_=from_number, to=to_number)
         return True
     except Exception:
+        if not fail_silently:
+            raise
         return False
@@ -0,0 +1,254 @@
+"""
+Search-box typeahead.
+
+Suggestions come from an in-process compressed prefix trie (radix tree)
+built from product names, category names and popular search queries.
+Every node keeps its own precomputed top-N list, so answering a prefix is
+a walk of at most len(prefix) characters with no sorting and no queries.
+
+The trie is rebuilt in a background thread when the catalog changes
+(Product/Category signals call ``mark_stale()``) or when it gets older than
+``SUGGEST_MAX_AGE`` seconds; the previous trie keeps serving meanwhile.
+"""
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import quote_plus
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import reverse
+
+SUGGESTION_LIMIT = 8
+
+WORD_START_RE = re.compile(r'\b\w', re.UNICODE)
+
+# Scores: categories first, then products by popularity, queries by frequency
+CATEGORY_BASE_SCORE = 1000.0
+FEATURED_BONUS = 50.0
+
+# Popular queries kept in memory between rebuilds. Only searches that found
+# products are counted (see record_query), and a query must be seen
+# MIN_QUERY_COUNT times before every visitor is offered it.
+MAX_TRACKED_QUERIES = 1000
+MIN_QUERY_COUNT = 5
+MAX_QUERY_LENGTH = 50
+MAX_QUERY_WORDS = 5
+
+QUERY_JUNK_RE = re.compile(r'[^\w\s-]', re.UNICODE)
+
+
+class _Node:
+    __slots__ = ('label', 'children', 'entries', 'top')
+
+    def __init__(self, label=''):
+        self.label = label
+        self.children = {}
+        self.entries = []
+        self.top = ()
+
+
+class RadixTrie:
+    """Compressed prefix trie returning the best `limit` entries for a prefix."""
+
+    def __init__(self, limit=SUGGESTION_LIMIT):
+        self.limit = limit
+        self.root = _Node()
+
+    def insert(self, key, score, entry):
+        """Store `entry` (a dict) under `key` with ranking `score`."""
+        node = self.root
+        while key:
+            child = node.children.get(key[0])
+            if child is None:
+                child = _Node(key)
+                node.children[key[0]] = child
+                node = child
+                break
+            label = child.label
+            common = 0
+            limit = min(len(label), len(key))
+            while common < limit and label[common] == key[common]:
+                common += 1
+            if common < len(label):
+                # Split the edge at the shared prefix
+                middle = _Node(label[:common])
+                child.label = label[common:]
+                middle.children[child.label[0]] = child
+                node.children[key[0]] = middle
+                child = middle
+            node = child
+            key = key[common:]
+        node.entries.append((score, entry))
+
+    def finalize(self):
+        """Precompute every node's top entries (call once after inserting)."""
+        self._finalize(self.root)
+
+    def _finalize(self, node):
+        candidates = list(node.entries)
+        for child in node.children.values():
+            candidates.extend(self._finalize(child))
+        top = []
+        seen = set()
+        for score, entry in heapq.nlargest(len(candidates), candidates, key=lambda item: item[0]):
+            identity = (entry['type'], entry['label'])
+            if identity in seen:
+                continue
+            seen.add(identity)
+            top.append((score, entry))
+            if len(top) == self.limit:
+                break
+        node.top = tuple(top)
+        return node.top
+
+    def lookup(self, prefix):
+        """Best entries whose key starts with `prefix`."""
+        node = self.root
+        key = prefix
+        while key:
+            child = node.children.get(key[0])
+            if child is None:
+                return []
+            label = child.label
+            if key.startswith(label):
+                key = key[len(label):]
+                node = child
+            elif label.startswith(key):
+                node = child
+                break
+            else:
+                return []
+        return [entry for _score, entry in node.top]
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def word_suffixes(text):
+    """Every suffix of `text` starting at a word boundary ('rose gold ring' -> 'gold ring', 'ring')."""
+    text = normalize(text)
+    return [text[match.start():] for match in WORD_START_RE.finditer(text)]
+
+
+# ===========================
+# POPULAR QUERIES
+# ===========================
+_query_counts = Counter()
+_query_lock = threading.Lock()
+
+
+def normalize_query(text):
+    """A search query as it may be suggested: punctuation dropped, or None if too long."""
+    text = normalize(QUERY_JUNK_RE.sub(' ', text or ''))
+    if not text or len(text) > MAX_QUERY_LENGTH or len(text.split()) > MAX_QUERY_WORDS:
+        return None
+    return text
+
+
+def record_query(text):
+    """
+    Count a search query so frequent ones become suggestions at the next
+    rebuild. Call it only for searches that returned products, so text that
+    matches nothing in the catalog can never be suggested to others.
+    """
+    text = normalize_query(text)
+    if text is None:
+        return
+    with _query_lock:
+        _query_counts[text] += 1
+        if len(_query_counts) > MAX_TRACKED_QUERIES:
+            keep = _query_counts.most_common(MAX_TRACKED_QUERIES // 2)
+            _query_counts.clear()
+            _query_counts.update(dict(keep))
+
+
+def popular_queries():
+    with _query_lock:
+        return [(text, count) for text, count in _query_counts.items() if count >= MIN_QUERY_COUNT]
+
+
+# ===========================
+# INDEX LIFECYCLE
+# ===========================
+_state = {'trie': None, 'built_at': 0.0, 'stale': False, 'rebuilding': False}
+_state_lock = threading.Lock()
+
+
+def build_trie():
+    """Build a fresh trie from the catalog and popular queries."""
+    from django.db.models import Count
+    from .models import Category, Product
+
+    trie = RadixTrie()
+    for category in Category.objects.annotate(product_count=Count('products')):
+        entry = {'label': category.name, 'type': 'category', 'url': reverse('category', args=[category.slug])}
+        for key in word_suffixes(category.name):
+            trie.insert(key, CATEGORY_BASE_SCORE + category.product_count, entry)
+
+    products = Product.objects.values_list('name', 'slug', 'rating_count', 'rating_avg', 'is_featured')
+    for name, slug, rating_count, rating_avg, is_featured in products.iterator():
+        score = rating_count * rating_avg + (FEATURED_BONUS if is_featured else 0)
+        entry = {'label': name, 'type': 'product', 'url': reverse('product_detail', args=[slug])}
+        for key in word_suffixes(name):
+            trie.insert(key, score, entry)
+
+    search_url = reverse('search')
+    for text, count in popular_queries():
+        entry = {'label': text, 'type': 'query', 'url': f'{search_url}?q={quote_plus(text)}'}
+        trie.insert(text, float(count), entry)
+
+    trie.finalize()
+    return trie
+
+
+def _rebuild_in_background():
+    try:
+        trie = build_trie()
+        with _state_lock:
+            _state.update(trie=trie, built_at=time.monotonic())
+    finally:
+        with _state_lock:
+            _state['rebuilding'] = False
+        close_old_connections()
+
+
+def mark_stale():
+    """Catalog changed: rebuild on the next lookup."""
+    _state['stale'] = True
+
+
+def invalidate():
+    """Drop the trie; the next lookup rebuilds it synchronously."""
+    with _state_lock:
+        _state.update(trie=None, stale=False)
+
+
+def suggest(prefix, limit=SUGGESTION_LIMIT):
+    """Top suggestions for a typed prefix."""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+
+    max_age = getattr(settings, 'SUGGEST_MAX_AGE', 300)
+    with _state_lock:
+        trie = _state['trie']
+        expired = time.monotonic() - _state['built_at'] > max_age
+        start_rebuild = (
+            trie is not None and (_state['stale'] or expired) and not _state['rebuilding']
+        )
+        if start_rebuild:
+            _state.update(stale=False, rebuilding=True)
+
+    if trie is None:
+        # First use in this process: build synchronously once
+        trie = build_trie()
+        with _state_lock:
+            _state.update(trie=trie, built_at=time.monotonic(), stale=False)
+    elif start_rebuild:
+        threading.Thread(target=_rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+
+    return trie.lookup(prefix)[:limit]
@@ -1 +1,1912 @@
-# Test file placeholder - tests can be added here when needed
+import base64
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import events as webhook_events, gateway
+from payments.fake_stripe import FakeStripeServer
+from store import archive, associations, cache_utils, coupons, facets, inventory, order_ids, outbox, pagination, sales, search, suggest
+from store.cart_utils import invalidate_cart_summary
+from store.checks import check_shared_cache
+from store.context_processors import clear_nav_categories
+from store.coupons import clear_coupon_cache
+from store.models import ArchivedOrder, ArchivedOrderItem, CartItem, Category, Coupon, DailyCategorySales, DailyProductSales, DailySales, InsufficientStock, InventoryMovement, Order, OrderIdWorkerLease, OrderItem, OutboxMessage, ProcessedWebhookEvent, Product, ProductAssociation, Review, Wishlist, sales_weight
+
+
+def setUpModule():
+    # The test process is the only one minting order numbers (leasing is covered by OrderIdLeaseTests)
+    order_ids.configure_worker(0)
+
+
+def create_products(category, count, start=0):
+    """Create `count` simple products in `category` for listing tests."""
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Gold Ring {i}',
+            slug=f'gold-ring-{i}',
+            description='Handcrafted gold ring',
+            category=category,
+            price=Decimal('100.00') + i,
+            original_price=Decimal('150.00') + i,
+            image='products/ring.jpg',
+            stock=5,
+            is_featured=True,
+            is_new=True,
+        )
+        for i in range(start, start + count)
+    ])
+    # bulk_create skips the indexing signals
+    search.rebuild_index()
+    facets.invalidate()
+    return products
+
+
+def create_order(products, status='confirmed', user=None):
+    """An order containing one of each of `products`."""
+    order = Order.objects.create(
+        user=user, order_number=f'TEST-{Order.objects.count() + 1}', first_name='Test', last_name='Buyer',
+        email='buyer@example.com', phone='123', address='1 Street', city='City', state='State',
+        postal_code='12345', country='IN', total_price=sum(p.price for p in products), payment_method='cod',
+        status=status,
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=1, price=product.price) for product in products
+    ])
+    return order
+
+
+# ===========================
+# RATING AGGREGATES
+# ===========================
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        self.ring, self.chain = create_products(category, 2)
+        self.users = [User.objects.create_user(f'reviewer-{i}') for i in range(4)]
+
+    def review(self, user, rating, approved=True, product=None):
+        return Review.objects.create(product=product or self.ring, user=user, rating=rating, comment='ok',
+                                     approved=approved)
+
+    def aggregates(self, product=None):
+        product = Product.objects.get(pk=(product or self.ring).pk)
+        return product.rating_avg, product.rating_count, [count for _star, count in product.rating_histogram()]
+
+    def test_only_approved_reviews_count(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 4)
+        self.review(self.users[2], 1, approved=False)
+        self.assertEqual(self.aggregates(), (4.5, 2, [1, 1, 0, 0, 0]))
+
+    def test_approving_editing_and_unapproving(self):
+        review = self.review(self.users[0], 2, approved=False)
+        self.assertEqual(self.aggregates(), (0, 0, [0, 0, 0, 0, 0]))
+
+        review.approved = True
+        review.save()
+        self.assertEqual(self.aggregates(), (2, 1, [0, 0, 0, 1, 0]))
+
+        review.rating = 4
+        review.save()
+        self.assertEqual(self.aggregates(), (4, 1, [0, 1, 0, 0, 0]))
+
+        review.approved = False
+        review.save()
+        self.assertEqual(self.aggregates(), (0, 0, [0, 0, 0, 0, 0]))
+
+    def test_deleting_an_approved_review(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 3).delete()
+        self.review(self.users[2], 1, approved=False).delete()
+        self.assertEqual(self.aggregates(), (5, 1, [1, 0, 0, 0, 0]))
+
+    def test_admin_bulk_approve_updates_aggregates(self):
+        # The action uses queryset.update(), which sends no signals
+        self.review(self.users[0], 5)
+        pending = [self.review(self.users[1], 3, approved=False), self.review(self.users[2], 1, approved=False),
+                   self.review(self.users[3], 4, approved=False, product=self.chain)]
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        response = self.client.post(reverse('admin:store_review_changelist'), {
+            'action': 'approve_reviews',
+            '_selected_action': [review.pk for review in pending] + [Review.objects.get(rating=5).pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.aggregates(), (3, 3, [1, 0, 1, 0, 1]))
+        self.assertEqual(self.aggregates(self.chain), (4, 1, [0, 1, 0, 0, 0]))
+
+    def test_rebuild_agrees_with_incremental_updates(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 2).delete()
+        self.review(self.users[2], 3, approved=False)
+        incremental = self.aggregates()
+        Product.objects.update(rating_avg=0, rating_count=0, rating_5=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.aggregates(), incremental)
+
+
+# ===========================
+# LISTING QUERY BUDGET
+# ===========================
+class ListingQueryBudgetTests(TestCase):
+    """Listing pages must cost the same number of queries for any catalog size."""
+
+    # Page name -> (url, fixed query budget for an anonymous visitor)
+    PAGES = {
+        'home': (reverse('home'), 2),
+        'shop': (reverse('shop'), 1),
+        'shop_popular': (reverse('shop') + '?sort=popular', 1),
+        'category': (reverse('category', args=['rings']), 2),
+        'search': (reverse('search') + '?q=gold', 1),
+        'product_search_api': (reverse('product_search_api') + '?q=gold', 1),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Rings', slug='rings')
+        create_products(cls.category, 3)
+
+    def count_queries(self, url, client=None):
+        """Steady-state query count of a render (in-process indexes warmed, page cache cold)."""
+        client = client or self.client
+        client.get(url)
+        cache_utils.bump_generation('catalog')
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_anonymous_listing_pages_have_fixed_budget(self):
+        small = {name: self.count_queries(url) for name, (url, _) in self.PAGES.items()}
+        create_products(self.category, 40, start=3)
+        for name, (url, budget) in self.PAGES.items():
+            with self.subTest(page=name):
+                self.assertEqual(small[name], budget)
+                self.assertEqual(self.count_queries(url), budget)
+
+    def test_wishlist_page_does_not_grow_with_wishlist(self):
+        user = User.objects.create_user('shopper', password='secret')
+        wishlist = Wishlist.objects.create(user=user)
+        wishlist.products.set(Product.objects.all())
+        self.client.force_login(user)
+        url = reverse('wishlist')
+
+        before = self.count_queries(url)
+        wishlist.products.add(*create_products(self.category, 20, start=3))
+        self.assertEqual(self.count_queries(url), before)
+
+
+# ===========================
+# SHOP FACETS
+# ===========================
+class FacetCountTests(TestCase):
+
+    def setUp(self):
+        self.rings = Category.objects.create(name='Rings', slug='rings')
+        self.chains = Category.objects.create(name='Chains', slug='chains')
+        # Bucket edges: 1000 opens the second bucket, 5000 the third
+        self.products = [
+            self.product('ring-low', self.rings, '999.99'),
+            self.product('ring-edge', self.rings, '1000'),
+            self.product('chain-mid', self.chains, '4999.99'),
+            self.product('chain-edge', self.chains, '5000'),
+        ]
+        facets.invalidate()
+
+    def product(self, slug, category, price):
+        return Product.objects.create(
+            name=slug, slug=slug, description='Handcrafted', category=category, price=Decimal(price),
+            original_price=Decimal(price), image='products/ring.jpg', stock=5,
+        )
+
+    def facet_counts(self, query=''):
+        return self.client.get(reverse('facets_api') + query).json()
+
+    def bucket_counts(self, query=''):
+        return [price_range['count'] for price_range in self.facet_counts(query)['price_ranges']]
+
+    def test_bucket_counts_split_at_the_edges(self):
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 0, 0])
+        self.assertEqual(self.bucket_counts('?category=rings'), [1, 1, 0, 0, 0])
+
+    def test_bucket_links_list_what_they_count(self):
+        response = self.client.get(reverse('shop'))
+        for price_range in self.facet_counts()['price_ranges']:
+            query = f"?price_min={price_range['min']}"
+            if price_range['max']:
+                query += f"&price_below={price_range['max']}"
+            self.assertContains(response, f'href="{query}"')
+            with self.subTest(bucket=price_range['label']):
+                shown = self.client.get(reverse('shop') + query).context['products']
+                self.assertEqual(len(shown), price_range['count'])
+                self.assertEqual(self.facet_counts(query)['total'], price_range['count'])
+
+    def test_inclusive_price_max_still_counts_the_edge(self):
+        query = '?price_min=1000&price_max=5000'
+        self.assertEqual(self.facet_counts(query)['total'], 3)
+        self.assertEqual(len(self.client.get(reverse('shop') + query).context['products']), 3)
+
+    def test_counts_follow_added_moved_and_deleted_products(self):
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 0, 0])  # builds the index
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.product('chain-top', self.chains, '75000')
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 0, 1])
+        self.assertEqual(self.facet_counts('?category=chains')['total'], 3)
+
+        added.price = Decimal('20000')
+        with self.captureOnCommitCallbacks(execute=True):
+            added.save()
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 1, 0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].delete()
+            added.delete()
+        self.assertEqual(self.bucket_counts(), [0, 2, 1, 0, 0])
+        self.assertEqual(self.facet_counts()['total'], Product.objects.count())
+
+    def test_rolled_back_saves_leave_the_counts_alone(self):
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 0, 0])  # builds the index
+        moved = self.products[0]
+        moved.price = Decimal('20000')
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ValueError):
+            with transaction.atomic():
+                moved.save()
+                self.product('chain-top', self.chains, '75000')
+                self.products[1].delete()
+                raise ValueError('e.g. a failed stock adjustment')
+        self.assertEqual(self.bucket_counts(), [1, 2, 1, 0, 0])
+
+
+# ===========================
+# FULL-TEXT SEARCH
+# ===========================
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.rings = Category.objects.create(name='Rings', slug='rings')
+        self.pendants = Category.objects.create(name='Pendants', slug='pendants')
+
+    def product(self, slug, name, description='Handcrafted piece', category=None):
+        return Product.objects.create(
+            name=name, slug=slug, description=description, category=category or self.pendants,
+            price=Decimal('100'), original_price=Decimal('100'), image='products/ring.jpg', stock=5,
+        )
+
+    def found(self, text, ranked=True):
+        return list(search.search_products(Product.objects.all(), text, ranked=ranked).values_list('slug', flat=True))
+
+    def test_name_matches_outrank_category_and_description_matches(self):
+        self.product('in-description', 'Plain Band', description='A sapphire set in silver')
+        self.product('in-category', 'Blue Stone', category=self.rings)
+        self.product('in-name', 'Sapphire Ring', category=self.rings)
+        self.assertEqual(self.found('sapphire'), ['in-name', 'in-description'])
+        self.assertEqual(self.found('ring'), ['in-name', 'in-category'])
+        self.assertEqual(self.found('sapph'), ['in-name', 'in-description'])  # last word matches as a prefix
+        self.assertEqual(self.found('sapphire rings'), ['in-name'])           # every word must match, stemmed
+        self.assertEqual(self.found('band OR ring'), [])                      # OR is a word here, not an operator
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_index_follows_product_and_category_changes(self):
+        product = self.product('pendant', 'Opal Pendant')
+        self.assertEqual(self.found('opal', ranked=False), ['pendant'])
+
+        product.name = 'Onyx Pendant'
+        product.save()
+        self.assertEqual(self.found('opal'), [])
+        self.assertEqual(self.found('onyx'), ['pendant'])
+
+        self.pendants.name = 'Lockets'
+        self.pendants.save()
+        self.assertEqual(self.found('lockets'), ['pendant'])
+
+        product.delete()
+        self.assertEqual(self.found('onyx'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_benchmark_reports_both_paths(self):
+        out = StringIO()
+        call_command('benchmark_search', products=50, repeat=1, query=['gold'], stdout=out)
+        header, row = out.getvalue().splitlines()[-2:]
+        self.assertEqual(header.split(), ['query', 'LIKE', 'ms', 'FTS', 'ms', 'LIKE', 'n', 'FTS', 'n', 'both'])
+        like_total, fts_total, both = map(int, row.split()[-3:])
+        self.assertEqual((like_total, fts_total), (both, both))  # one word: both paths agree
+        self.assertFalse(Product.objects.exists())
+
+
+# ===========================
+# SEARCH SUGGESTIONS
+# ===========================
+class RadixTrieTests(SimpleTestCase):
+
+    def entry(self, label, kind='product'):
+        return {'label': label, 'type': kind}
+
+    def test_lookup_splits_shared_prefixes(self):
+        trie = suggest.RadixTrie()
+        for score, key in enumerate(['ring', 'rings', 'rose gold', 'ruby']):
+            trie.insert(key, score, self.entry(key))
+        trie.finalize()
+        self.assertEqual([e['label'] for e in trie.lookup('r')], ['ruby', 'rose gold', 'rings', 'ring'])
+        self.assertEqual([e['label'] for e in trie.lookup('rin')], ['rings', 'ring'])
+        self.assertEqual([e['label'] for e in trie.lookup('ro')], ['rose gold'])
+        self.assertEqual(trie.lookup('rx'), [])
+        self.assertEqual(trie.lookup('rings and'), [])
+
+    def test_top_entries_are_limited_and_deduplicated(self):
+        trie = suggest.RadixTrie(limit=2)
+        entry = self.entry('Rose Gold Ring')
+        for key in suggest.word_suffixes(entry['label']):
+            trie.insert(key, 10, entry)
+        trie.insert('ring box', 5, self.entry('Ring Box'))
+        trie.insert('ring stand', 1, self.entry('Ring Stand'))
+        trie.finalize()
+        self.assertEqual([e['label'] for e in trie.lookup('ring')], ['Rose Gold Ring', 'Ring Box'])
+        self.assertEqual([e['label'] for e in trie.lookup('gold')], ['Rose Gold Ring'])
+
+    def test_queries_are_normalized_before_counting(self):
+        self.assertEqual(suggest.normalize_query('  Gold   RING!! '), 'gold ring')
+        self.assertEqual(suggest.normalize_query('<b>rings</b>?'), 'b rings b')
+        self.assertIsNone(suggest.normalize_query('!!! ???'))
+        self.assertIsNone(suggest.normalize_query('buy cheap gold rings at my shop now'))
+        self.assertIsNone(suggest.normalize_query('x' * (suggest.MAX_QUERY_LENGTH + 1)))
+
+
+class SuggestApiTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        Product.objects.create(
+            name='Rose Gold Ring', slug='rose-gold-ring', description='Handcrafted', category=category,
+            price=Decimal('100'), original_price=Decimal('100'), image='products/ring.jpg', stock=5,
+        )
+        suggest._query_counts.clear()
+        suggest.invalidate()
+        self.addCleanup(suggest._query_counts.clear)
+        self.addCleanup(suggest.invalidate)
+
+    def suggestions(self, prefix):
+        response = self.client.get(reverse('suggest_api'), {'q': prefix})
+        self.assertEqual(response.status_code, 200)
+        return [(s['type'], s['label'], s['url']) for s in response.json()['suggestions']]
+
+    def search(self, query, times):
+        for _ in range(times):
+            self.client.get(reverse('search'), {'q': query})
+        suggest.invalidate()
+
+    def test_categories_and_products_link_to_their_pages(self):
+        self.assertEqual(self.suggestions('r'), [
+            ('category', 'Rings', reverse('category', args=['rings'])),
+            ('product', 'Rose Gold Ring', reverse('product_detail', args=['rose-gold-ring'])),
+        ])
+        self.assertEqual(self.suggestions('gold'), [
+            ('product', 'Rose Gold Ring', reverse('product_detail', args=['rose-gold-ring'])),
+        ])
+        self.assertEqual(self.suggestions(''), [])
+
+    def test_popular_searches_with_results_are_suggested(self):
+        self.search('Rose   gold!', suggest.MIN_QUERY_COUNT - 1)
+        self.assertNotIn('query', [kind for kind, _label, _url in self.suggestions('rose')])
+
+        self.search('rose gold', 1)
+        self.assertIn(('query', 'rose gold', reverse('search') + '?q=rose+gold'), self.suggestions('rose'))
+
+    def test_searches_without_results_are_never_suggested(self):
+        self.search('visit spam example', suggest.MIN_QUERY_COUNT * 3)
+        self.assertEqual(self.suggestions('visit'), [])
+
+
+# ===========================
+# ANONYMOUS PAGE CACHE
+# ===========================
+@override_settings(CACHE_IS_SHARED=True)  # the test process is the only one using its LocMemCache
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Rings', slug='rings')
+        cls.products = create_products(cls.category, 3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_anonymous_visit_is_served_from_cache(self):
+        url = reverse('category', args=['rings'])
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertContains(second, 'Gold Ring 0')
+
+    def test_catalog_changes_invalidate_cached_pages(self):
+        url = reverse('home')
+        self.client.get(url)
+        Product.objects.filter(pk=self.products[0].pk).get().save()
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+    def test_cached_page_gets_each_visitors_csrf_token(self):
+        url = reverse('category', args=['rings'])
+        self.client.get(url)
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotContains(response, 'page_cache_csrf_token')
+        token = response.content.decode().split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        post = client.post(reverse('contact'), {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(post.status_code, 403)
+
+    def test_session_cart_bypasses_cache(self):
+        url = reverse('home')
+        self.client.get(url)
+        self.client.post(reverse('add_to_cart', args=[self.products[0].pk]), {'quantity': 2})
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertEqual(response.context['cart_count'], 2)
+
+    def test_shop_caches_only_unfiltered_page(self):
+        self.client.get(reverse('shop') + '?sort=price_low')
+        self.assertFalse(self.client.get(reverse('shop') + '?sort=price_low').has_header('X-Page-Cache'))
+        self.client.get(reverse('shop'))
+        self.assertEqual(self.client.get(reverse('shop'))['X-Page-Cache'], 'hit')
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('page_cache_stats')
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(url).json()
+        self.assertEqual((stats['hit'], stats['miss']), (1, 1))
+
+    @override_settings(CACHE_IS_SHARED=None)
+    def test_process_local_cache_disables_page_cache(self):
+        # Another worker would never see this process's invalidations
+        self.assertEqual(settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        url = reverse('home')
+        self.client.get(url)
+        self.assertFalse(self.client.get(url).has_header('X-Page-Cache'))
+        self.assertEqual([message.id for message in check_shared_cache(None)], ['store.W001'])
+        with override_settings(CACHE_IS_SHARED=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+# ===========================
+# CONDITIONAL GET
+# ===========================
+@override_settings(CACHE_IS_SHARED=True)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Rings', slug='rings')
+        cls.product = create_products(cls.category, 3)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_product_page_returns_304_without_rendering(self):
+        url = reverse('product_detail', args=[self.product.slug])
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as ctx:
+            revalidated = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)  # updated_at lookup only
+
+    def test_catalog_change_breaks_etag(self):
+        for url in (reverse('product_detail', args=[self.product.slug]), reverse('shop')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                Category.objects.get(pk=self.category.pk).save()
+                self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_logged_in_pages_carry_no_validators(self):
+        self.client.force_login(User.objects.create_user('shopper', password='secret'))
+        response = self.client.get(reverse('product_detail', args=[self.product.slug]))
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_product_search_api_revalidates(self):
+        url = reverse('product_search_api') + '?q=gold'
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    @override_settings(CACHE_IS_SHARED=None)
+    def test_process_local_cache_sends_no_validators(self):
+        # Another worker's ETag would not change when this process bumps the catalog
+        for url in (reverse('shop'), reverse('product_detail', args=[self.product.slug]),
+                    reverse('product_search_api') + '?q=gold'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 200)
+
+
+# ===========================
+# NAVIGATION MENU
+# ===========================
+class CategoryNavTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Rings', slug='rings')
+
+    def setUp(self):
+        # Rolled-back test transactions send no signals
+        clear_nav_categories()
+
+    def test_menu_renders_without_category_queries(self):
+        url = reverse('contact')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, reverse('category', args=['rings']))
+        self.assertFalse(any('store_category' in query['sql'] for query in ctx.captured_queries))
+
+    def test_category_changes_refresh_menu(self):
+        url = reverse('contact')
+        self.client.get(url)
+        Category.objects.create(name='Necklaces', slug='necklaces')
+        self.assertContains(self.client.get(url), reverse('category', args=['necklaces']))
+        Category.objects.get(slug='rings').delete()
+        self.assertNotContains(self.client.get(url), reverse('category', args=['rings']))
+
+
+# ===========================
+# FREQUENTLY BOUGHT TOGETHER
+# ===========================
+class ProductAssociationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring, cls.chain, cls.pendant, cls.bangle = create_products(category, 4)
+
+    def scores(self, product):
+        return dict(ProductAssociation.objects.filter(product=product).values_list('related_id', 'score'))
+
+    def test_refresh_counts_only_new_orders(self):
+        create_order([self.ring, self.chain])
+        create_order([self.ring, self.chain, self.pendant])
+        create_order([self.ring, self.bangle], status='cancelled')
+        associations.refresh_associations()
+        self.assertEqual(self.scores(self.ring), {self.chain.id: 2, self.pendant.id: 1})
+        self.assertEqual(self.scores(self.pendant), {self.ring.id: 1, self.chain.id: 1})
+
+        create_order([self.ring, self.pendant])
+        start, end, *_ = associations.refresh_associations()
+        self.assertEqual(end - start, 1)
+        self.assertEqual(self.scores(self.ring), {self.chain.id: 2, self.pendant.id: 2})
+
+        associations.refresh_associations(full=True)
+        self.assertEqual(self.scores(self.ring), {self.chain.id: 2, self.pendant.id: 2})
+
+    def test_keeps_top_neighbours_only(self):
+        create_order([self.ring, self.chain])
+        create_order([self.ring, self.chain, self.pendant])
+        create_order([self.ring, self.bangle, self.chain])
+        associations.refresh_associations(keep=1)
+        self.assertEqual(self.scores(self.ring), {self.chain.id: 3})
+
+    def test_product_page_shows_bought_together(self):
+        create_order([self.ring, self.pendant])
+        associations.refresh_associations()
+        response = self.client.get(reverse('product_detail', args=[self.ring.slug]))
+        self.assertTrue(response.context['bought_together'])
+        self.assertEqual([p.id for p in response.context['related_products']], [self.pendant.id])
+
+
+# ===========================
+# BESTSELLER RANKING
+# ===========================
+class SalesRankTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring, cls.chain, cls.pendant = create_products(category, 3)
+
+    def popular_ids(self):
+        response = self.client.get(reverse('shop') + '?sort=popular')
+        self.assertEqual(response.context['selected_sort'], 'popular')
+        return [product.id for product in response.context['products']]
+
+    def test_recent_sales_outrank_older_ones(self):
+        now = timezone.now()
+        Product.record_sales({self.ring.id: 3}, when=now - timedelta(days=90))
+        Product.record_sales({self.chain.id: 2}, when=now)
+        self.assertEqual(self.popular_ids(), [self.chain.id, self.ring.id, self.pendant.id])
+        # Three half-lives ago a sale counted for an eighth of one today
+        self.ring.refresh_from_db()
+        self.chain.refresh_from_db()
+        self.assertAlmostEqual(self.ring.sales_score / self.chain.sales_score, 3 / 8 / 2, places=6)
+
+    def test_rebuild_matches_incremental_updates(self):
+        order = create_order([self.pendant, self.chain])
+        Order.objects.filter(pk=order.pk).update(paid=True)
+        create_order([self.ring])  # unpaid: not counted
+        call_command('rebuild_sales_rank', stdout=StringIO())
+        self.assertEqual(self.popular_ids()[2], self.ring.id)
+        self.pendant.refresh_from_db()
+        self.assertAlmostEqual(self.pendant.sales_score, sales_weight(order.created_at))
+
+    def test_unknown_sort_falls_back_to_newest(self):
+        response = self.client.get(reverse('shop') + '?sort=description')
+        self.assertEqual(response.context['selected_sort'], 'newest')
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([product.id for product in response.context['products']], expected)
+
+
+# ===========================
+# CART SUMMARY
+# ===========================
+@override_settings(CACHE_IS_SHARED=True)
+class CartSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring, cls.chain = create_products(category, 2)
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def setUp(self):
+        invalidate_cart_summary(self.user)  # the cache outlives each test's rollback
+        self.client.force_login(self.user)
+
+    def cart_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if 'store_cartitem' in q['sql']]
+
+    def test_pages_reuse_cached_summary(self):
+        self.client.post(reverse('add_to_cart', args=[self.ring.id]), {'quantity': 2})
+        self.client.post(reverse('add_to_cart', args=[self.chain.id]))
+        response, queries = self.cart_queries(reverse('shop'))
+        self.assertEqual(len(queries), 1)  # the aggregate, once after the change
+        self.assertEqual(response.context['cart_count'], 3)
+        self.assertEqual(response.context['cart_total'], self.ring.price * 2 + self.chain.price)
+        response, queries = self.cart_queries(reverse('shop'))
+        self.assertEqual(queries, [])
+
+    def test_cart_changes_refresh_summary(self):
+        response = self.client.post(reverse('add_to_cart', args=[self.ring.id]),
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['cart_count'], 1)
+        item = self.user.cart_items.get()
+        response = self.client.post(reverse('update_cart', args=[item.id]), {'quantity': 4},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(Decimal(str(response.json()['cart_total'])), self.ring.price * 4)
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 4)
+        self.client.post(reverse('remove_from_cart', args=[item.id]))
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 0)
+
+    def test_price_change_refreshes_total(self):
+        self.client.post(reverse('add_to_cart', args=[self.ring.id]))
+        self.client.get(reverse('shop'))
+        self.ring.price = Decimal('999.00')
+        self.ring.save()
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_total'], Decimal('999.00'))
+
+    @override_settings(CACHE_IS_SHARED=None)
+    def test_process_local_cache_reads_summary_from_database(self):
+        self.client.post(reverse('add_to_cart', args=[self.ring.id]))
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 1)
+        # A change made by another worker bumps that worker's counters only
+        CartItem.objects.filter(user=self.user).update(quantity=3)
+        response, queries = self.cart_queries(reverse('shop'))
+        self.assertEqual(response.context['cart_count'], 3)
+        self.assertEqual(len(queries), 1)
+
+
+# ===========================
+# BATCHED CART API
+# ===========================
+class CartBatchApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.products = create_products(category, 10)
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def setUp(self):
+        invalidate_cart_summary(self.user)
+
+    def batch(self, operations):
+        return self.client.post(reverse('cart_batch_api'), json.dumps({'operations': operations}),
+                                content_type='application/json')
+
+    def test_applies_operations_in_order(self):
+        self.client.force_login(self.user)
+        ring, chain, pendant = self.products[:3]
+        CartItem.objects.create(user=self.user, product=pendant, quantity=1)
+        data = self.batch([
+            {'op': 'add', 'product_id': ring.id, 'quantity': 2},
+            {'op': 'add', 'product_id': ring.id},
+            {'op': 'add', 'product_id': chain.id, 'quantity': 9},  # capped at stock
+            {'op': 'update', 'product_id': pendant.id, 'quantity': 4},
+            {'op': 'remove', 'product_id': pendant.id},
+        ]).json()
+        self.assertEqual(
+            [(item['product_id'], item['quantity'], Decimal(str(item['subtotal']))) for item in data['items']],
+            [(ring.id, 3, ring.price * 3), (chain.id, 5, chain.price * 5)],
+        )
+        self.assertEqual(data['cart_count'], 8)
+        self.assertEqual(Decimal(str(data['subtotal'])), ring.price * 3 + chain.price * 5)
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 8)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        self.client.force_login(self.user)
+
+        def queries(products):
+            CartItem.objects.filter(user=self.user).delete()
+            CartItem.objects.create(user=self.user, product=products[0])
+            operations = [{'op': 'add', 'product_id': p.id} for p in products]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.batch(operations).status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(self.products[:2]), queries(self.products))
+
+    def test_guest_batch_uses_session_cart(self):
+        ring, chain = self.products[:2]
+        data = self.batch([{'op': 'add', 'product_id': ring.id}, {'op': 'add', 'product_id': chain.id, 'quantity': 2}]).json()
+        self.assertEqual(data['cart_count'], 3)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get(reverse('cart')).context['cart_count'], 3)
+
+    def test_rejects_malformed_operations(self):
+        for body in ([], [{'op': 'explode', 'product_id': 1}], [{'op': 'update', 'product_id': 1, 'quantity': 0}],
+                     [{'op': 'add', 'product_id': 'x'}]):
+            with self.subTest(body=body):
+                self.assertEqual(self.batch(body).status_code, 400)
+        response = self.client.post(reverse('cart_batch_api'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+# ===========================
+# CHECKOUT
+# ===========================
+CHECKOUT_FORM = {
+    'first_name': 'Test', 'last_name': 'Buyer', 'email': 'buyer@example.com', 'phone': '123',
+    'address': '1 Street', 'city': 'City', 'state': 'State', 'postal_code': '12345', 'country': 'IN',
+    'payment_method': 'cod',
+}
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.products = create_products(category, 3)
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def setUp(self):
+        invalidate_cart_summary(self.user)
+        self.client.force_login(self.user)
+
+    def test_checkout_reserves_stock_and_clears_cart(self):
+        ring, chain, _ = self.products
+        CartItem.objects.create(user=self.user, product=ring, quantity=2)
+        CartItem.objects.create(user=self.user, product=chain, quantity=5)
+        response = self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('payments:create_checkout_session', args=[order.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity')), [(ring.id, 2), (chain.id, 5)])
+        self.assertEqual(order.total_price, ring.price * 2 + chain.price * 5)
+        self.assertEqual(dict(Product.objects.filter(pk__in=[ring.pk, chain.pk]).values_list('id', 'stock')),
+                         {ring.id: 3, chain.id: 0})
+        self.assertFalse(CartItem.objects.exists())
+
+        order.cancel()
+        self.assertFalse(order.cancel())  # stock is restored only once
+        self.assertEqual(Product.objects.get(pk=chain.pk).stock, 5)
+
+    def test_cancelled_order_is_not_revived_by_payment(self):
+        ring = self.products[0]
+        CartItem.objects.create(user=self.user, product=ring, quantity=2)
+        self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.assertTrue(order.cancel())
+
+        # The checkout page cannot reopen it...
+        response = self.client.get(reverse('payments:create_checkout_session', args=[order.id]))
+        self.assertRedirects(response, reverse('order_confirmation', args=[order.id]), fetch_redirect_response=False)
+        # ...and a late payment does not confirm it without stock
+        webhook_events.recent_events.clear()
+        with self.assertLogs('payments.views', 'WARNING'):
+            post_payment_event(self.client, order)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.paid), ('cancelled', False))
+        self.assertFalse(order.cancel())
+        self.assertEqual(Product.objects.get(pk=ring.pk).stock, 5)
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_only_the_owner_can_pay_an_order(self):
+        order = create_order(self.products[:1], status='pending',
+                             user=User.objects.create_user('someone-else', password='secret'))
+        response = self.client.get(reverse('payments:create_checkout_session', args=[order.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_shortfall_places_nothing(self):
+        ring, chain, _ = self.products
+        Product.objects.filter(pk=chain.pk).update(stock=1)
+        CartItem.objects.create(user=self.user, product=ring, quantity=1)
+        CartItem.objects.create(user=self.user, product=chain, quantity=2)
+        response = self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=ring.pk).stock, 5)  # rolled back
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+class CouponTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring = create_products(category, 1)[0]
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.coupon = Coupon.objects.create(code=' Welcome10 ', discount_percent=Decimal('10'), usage_limit=1)
+
+    def setUp(self):
+        clear_coupon_cache()
+        invalidate_cart_summary(self.user)
+        self.client.force_login(self.user)
+
+    def test_lookup_is_case_insensitive_and_cached(self):
+        self.assertEqual(self.coupon.code_normalized, 'WELCOME10')
+        coupons.get_active_coupons()
+        with CaptureQueriesContext(connection) as ctx:
+            coupon, discount = coupons.quote_coupon('welcome10', Decimal('200.00'))
+        self.assertEqual((coupon, discount), (self.coupon, Decimal('20.00')))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.coupon.active = False
+        self.coupon.save()
+        with self.assertRaises(coupons.CouponError):
+            coupons.quote_coupon('WELCOME10', Decimal('200.00'))
+
+    def test_redemption_never_exceeds_usage_limit(self):
+        coupon, _ = coupons.quote_coupon('WELCOME10', Decimal('200.00'))
+        coupons.redeem_coupon(coupon)
+        with self.assertRaises(coupons.CouponError):
+            coupons.redeem_coupon(coupon)  # stale cached copy still says 0 uses
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).used_count, 1)
+
+    def test_checkout_applies_coupon_once(self):
+        for _ in range(2):
+            CartItem.objects.create(user=self.user, product=self.ring, quantity=1)
+            self.client.post(reverse('checkout'), dict(CHECKOUT_FORM, coupon_code='welcome10'))
+        totals = list(Order.objects.order_by('id').values_list('total_price', flat=True))
+        self.assertEqual(totals, [self.ring.price - self.ring.price / 10, self.ring.price])
+
+    def test_validate_api_previews_discount_on_cart(self):
+        CartItem.objects.create(user=self.user, product=self.ring, quantity=2)
+        data = self.client.get(reverse('coupon_validate_api'), {'code': 'welcome10'}).json()
+        self.assertTrue(data['valid'])
+        self.assertEqual(Decimal(str(data['discount_amount'])), self.ring.price * 2 / 10)
+        data = self.client.get(reverse('coupon_validate_api'), {'code': 'nope'}).json()
+        self.assertEqual(data, {'valid': False, 'error': 'Coupon code not found.'})
+
+    def test_admin_rejects_a_code_differing_only_in_case(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        data = {'code': 'welcome10', 'description': '', 'discount_percent': '5', 'active': 'on', 'used_count': 0}
+        response = self.client.post(reverse('admin:store_coupon_add'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'already uses this code')
+        self.assertEqual(Coupon.objects.count(), 1)
+
+        # The coupon itself may keep (or re-case) its code
+        response = self.client.post(reverse('admin:store_coupon_change', args=[self.coupon.pk]),
+                                    dict(data, code='WELCOME10'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Coupon.objects.get().code, 'WELCOME10')
+
+    def test_code_normalized_backfill_refuses_colliding_codes(self):
+        backfill = import_module('store.migrations.0009_coupon_code_normalized').backfill_code_normalized
+        Coupon.objects.filter(pk=self.coupon.pk).update(code_normalized='')
+        backfill(apps, None)
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).code_normalized, 'WELCOME10')
+
+        # Rows as they were before the column existed (save() would normalise them)
+        Coupon.objects.bulk_create([Coupon(code='welcome10', code_normalized='old-1'),
+                                    Coupon(code='SPRING', code_normalized='old-2')])
+        with self.assertRaisesMessage(RuntimeError, "' Welcome10 ', 'welcome10'. Rename or delete"):
+            backfill(apps, None)
+        self.assertEqual(Coupon.objects.get(code='SPRING').code_normalized, 'old-2')  # nothing written
+
+
+class InventoryLedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring, cls.chain = [
+            Product.objects.create(name=name, slug=name.lower(), description='x', category=category,
+                                   price=Decimal('100.00'), image='products/ring.jpg', stock=5)
+            for name in ('Ring', 'Chain')
+        ]
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def ledger(self, product):
+        return list(InventoryMovement.objects.filter(product=product).order_by('id').values_list('reason', 'delta'))
+
+    def test_checkout_and_cancel_are_recorded_and_balance(self):
+        self.client.force_login(self.user)
+        CartItem.objects.create(user=self.user, product=self.ring, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.chain, quantity=1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        stock_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "store_product"')]
+        self.assertEqual(len(stock_updates), 1)  # one statement for the whole order
+        order = Order.objects.get()
+        self.assertEqual(self.ledger(self.ring), [('opening', 5), ('checkout', -2)])
+        self.assertEqual(InventoryMovement.objects.filter(order=order).count(), 2)
+
+        order.cancel()
+        self.assertEqual(self.ledger(self.ring), [('opening', 5), ('checkout', -2), ('cancellation', 2)])
+        self.assertEqual(Product.objects.get(pk=self.ring.pk).stock, 5)
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def test_adjustments_apply_on_top_of_concurrent_changes(self):
+        stale = Product.objects.get(pk=self.ring.pk)
+        inventory.reserve({self.ring.id: 3})  # someone buys while the admin form is open
+        inventory.adjust(stale.pk, 4, note='Restock')
+        self.assertEqual(Product.objects.get(pk=self.ring.pk).stock, 6)
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def test_failed_reservation_never_records_a_checkout(self):
+        # The conditional UPDATE missed a product, but the re-read finds enough stock
+        # (restocked in between): the reservation must still fail as a whole
+        with mock.patch('django.db.models.query.QuerySet.update', return_value=1):
+            with self.assertRaises(InsufficientStock):
+                inventory.reserve({self.ring.id: 1, self.chain.id: 1})
+        self.assertEqual(InventoryMovement.objects.filter(reason=inventory.CHECKOUT).count(), 0)
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def admin_edit(self, product, shown_stock, **changes):
+        """POST the product change form as rendered with `shown_stock`, plus `changes`."""
+        data = {
+            'name': product.name, 'slug': product.slug, 'category': product.category_id,
+            'description': product.description, 'price': product.price, 'original_price': '',
+            'stock': shown_stock, 'initial-stock': shown_stock, 'is_new': 'on',
+        }
+        data.update(changes)
+        response = self.client.post(reverse('admin:store_product_change', args=[product.pk]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def admin_order_edit(self, order, **changes):
+        """POST the order change form as rendered for `order`, plus `changes`."""
+        data = {field: getattr(order, field) or '' for field in (
+            'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state', 'postal_code', 'country',
+            'total_price', 'payment_method', 'status', 'transaction_id',
+        )}
+        if order.paid:
+            data['paid'] = 'on'
+        data.update({
+            'items-TOTAL_FORMS': order.items.count(), 'items-INITIAL_FORMS': order.items.count(),
+            'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+        })
+        for index, item_id in enumerate(order.items.order_by('id').values_list('id', flat=True)):
+            data.update({f'items-{index}-id': item_id, f'items-{index}-order': order.pk})
+        data.update(changes)
+        return self.client.post(reverse('admin:store_order_change', args=[order.pk]), data)
+
+    def test_admin_cancellation_releases_stock(self):
+        self.client.force_login(self.user)
+        CartItem.objects.create(user=self.user, product=self.ring, quantity=2)
+        self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+
+        response = self.admin_order_edit(order, status='cancelled', city='Elsewhere')
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.city), ('cancelled', 'Elsewhere'))
+        self.assertEqual(self.ledger(self.ring), [('opening', 5), ('checkout', -2), ('cancellation', 2)])
+        self.assertEqual(Product.objects.get(pk=self.ring.pk).stock, 5)
+
+        response = self.admin_order_edit(order, status='pending')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'cannot be reopened')
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'cancelled')
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def test_admin_cancel_action_releases_stock_once(self):
+        self.client.force_login(self.user)
+        for _ in range(2):
+            CartItem.objects.create(user=self.user, product=self.ring, quantity=1)
+            self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        confirmed, shipped = Order.objects.order_by('id')
+        Order.objects.filter(pk=shipped.pk).update(status='shipped')
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        changelist = reverse('admin:store_order_changelist')
+        self.assertNotIn('form-0-status', self.client.get(changelist).content.decode())  # not list_editable
+
+        for _ in range(2):
+            self.client.post(changelist, {'action': 'cancel_orders', '_selected_action': [confirmed.pk, shipped.pk]})
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {confirmed.pk: 'cancelled', shipped.pk: 'shipped'})
+        self.assertEqual(Product.objects.get(pk=self.ring.pk).stock, 4)
+        self.assertEqual(InventoryMovement.objects.filter(reason=inventory.CANCELLATION).count(), 1)
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def test_admin_edit_keeps_reservations_made_while_the_page_was_open(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        Product.objects.filter(pk=self.ring.pk).update(rating_avg=4.5, rating_count=2, sales_score=7)
+        inventory.reserve({self.ring.id: 2})  # checkout after the page rendered stock 5
+        self.admin_edit(self.ring, shown_stock=5, description='New description')
+        ring = Product.objects.get(pk=self.ring.pk)
+        self.assertEqual((ring.stock, ring.description), (3, 'New description'))
+        self.assertEqual((ring.rating_avg, ring.rating_count, ring.sales_score), (4.5, 2, 7))
+        self.assertEqual(self.ledger(self.ring), [('opening', 5), ('checkout', -2)])
+
+        self.admin_edit(self.ring, shown_stock=3, stock=10)  # restock by 7
+        self.assertEqual(Product.objects.get(pk=self.ring.pk).stock, 10)
+        self.assertEqual(self.ledger(self.ring)[-1], ('adjustment', 7))
+        self.assertEqual(inventory.discrepancies(), [])
+
+    def test_compaction_keeps_totals_and_reconcile_reports_drift(self):
+        inventory.reserve({self.ring.id: 1, self.chain.id: 2})
+        inventory.release({self.ring.id: 1})
+        folded, written = inventory.compact(timezone.now() + timedelta(seconds=1))
+        self.assertEqual((folded, written), (5, 2))
+        self.assertEqual(self.ledger(self.ring), [('compaction', 5)])
+        self.assertEqual(inventory.discrepancies(), [])
+
+        Product.objects.filter(pk=self.chain.pk).update(stock=10)  # bypasses the ledger
+        with self.assertRaises(CommandError):
+            call_command('reconcile_inventory', stdout=StringIO())
+        call_command('reconcile_inventory', '--fix', stdout=StringIO())
+        self.assertEqual(inventory.discrepancies(), [])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Parallel buyers racing for the last units of a product."""
+
+    BUYERS = 8
+    STOCK = 3
+
+    def test_parallel_checkouts_never_oversell(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        product = create_products(category, 1)[0]
+        Product.objects.filter(pk=product.pk).update(stock=self.STOCK)
+        clients = []
+        for i in range(self.BUYERS):
+            user = User.objects.create_user(f'buyer-{i}', password='secret')
+            CartItem.objects.create(user=user, product=product, quantity=1)
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+
+        def buy(client):
+            try:
+                barrier.wait()
+                results.append(client.post(reverse('checkout'), CHECKOUT_FORM).url)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.BUYERS)
+        self.assertEqual(results.count(reverse('cart')), self.BUYERS - self.STOCK)
+        self.assertEqual(Order.objects.count(), self.STOCK)
+        self.assertEqual(OrderItem.objects.count(), self.STOCK)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 0)
+
+
+# ===========================
+# ORDER NUMBERS
+# ===========================
+def mint_order_ids(worker_id, count):
+    """Run in a child process: `count` ids from one worker."""
+    generator = order_ids.OrderIdGenerator(worker_id)
+    return [generator.next_id() for _ in range(count)]
+
+
+class OrderIdTests(SimpleTestCase):
+
+    WORKERS = 4
+    TOTAL = 1_000_000
+
+    def test_million_ids_across_processes_are_unique_and_ordered(self):
+        per_worker = self.TOTAL // self.WORKERS
+        with multiprocessing.get_context('fork').Pool(self.WORKERS) as pool:
+            batches = pool.starmap(mint_order_ids, [(worker_id, per_worker) for worker_id in range(self.WORKERS)])
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))  # strictly increasing per worker...
+        ids = [value for batch in batches for value in batch]
+        self.assertEqual(len(set(ids)), self.TOTAL)  # ...and no duplicates anywhere
+
+    def test_order_numbers_sort_by_creation_time(self):
+        generator = order_ids.OrderIdGenerator(7)
+        values = [generator.next_id() for _ in range(10_000)]  # crosses the per-ms sequence limit
+        numbers = [order_ids.format_order_number(value) for value in values]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertRegex(numbers[0], r'^ORD-\d{8}-[0-9A-HJKMNP-TV-Z]{13}$')
+        self.assertTrue(numbers[0].startswith(f'ORD-{timezone.now():%Y%m%d}-'))
+
+    def test_clock_going_backwards_keeps_ids_increasing(self):
+        generator = order_ids.OrderIdGenerator(1)
+        first = generator.next_id()
+        generator._last_ms += 60_000  # as if the clock had just jumped back a minute
+        self.assertGreater(generator.next_id(), first)
+
+
+class OrderIdLeaseTests(TransactionTestCase):
+
+    def setUp(self):
+        self.addCleanup(order_ids.configure_worker, 0)
+
+    def test_processes_lease_distinct_worker_ids(self):
+        first = order_ids.lease_worker_id('web-1', 60)
+        second = order_ids.lease_worker_id('web-2', 60)
+        self.assertNotEqual(first, second)
+        self.assertTrue(order_ids.renew_lease(first, 'web-1', 60))
+
+    def test_expired_lease_is_reused_and_its_old_holder_cannot_renew(self):
+        worker_id = order_ids.lease_worker_id('web-1', 60)
+        OrderIdWorkerLease.objects.filter(worker_id=worker_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(order_ids.lease_worker_id('web-2', 60), worker_id)
+        self.assertFalse(order_ids.renew_lease(worker_id, 'web-1', 60))
+
+    def test_no_free_worker_id_fails_loudly(self):
+        expires_at = timezone.now() + timedelta(minutes=5)
+        OrderIdWorkerLease.objects.bulk_create([
+            OrderIdWorkerLease(worker_id=worker_id, holder=f'web-{worker_id}', expires_at=expires_at)
+            for worker_id in range(order_ids.MAX_WORKER_ID + 1)
+        ])
+        with self.assertRaises(ImproperlyConfigured):
+            order_ids.lease_worker_id('web-x', 60)
+
+    def test_unconfigured_process_leases_before_minting(self):
+        order_ids._generator['instance'] = None
+        with transaction.atomic(), self.assertRaises(ImproperlyConfigured):
+            order_ids.next_order_number()  # cannot lease inside a transaction
+        self.assertTrue(order_ids.next_order_number().startswith('ORD-'))
+        lease = OrderIdWorkerLease.objects.get()
+        self.assertEqual(lease.holder, order_ids.holder_name())
+        self.assertEqual(order_ids._generator['instance'].worker_id, lease.worker_id)
+
+
+# ===========================
+# OUTBOX
+# ===========================
+def post_payment_event(client, order, event_id='evt_1'):
+    """Deliver a checkout.session.completed webhook for `order` (unsigned: no STRIPE_WEBHOOK_SECRET in tests)."""
+    event = {'id': event_id, 'type': 'checkout.session.completed',
+             'data': {'object': {'id': 'cs_1', 'metadata': {'order_id': str(order.id)}}}}
+    return client.post(reverse('payments:stripe_webhook'), json.dumps(event), content_type='application/json')
+
+
+def fail_delivery(**payload):
+    raise ConnectionError('SMTP server unavailable')
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        self.order = create_order(create_products(category, 2), status='pending')
+        webhook_events.recent_events.clear()
+
+    def post_payment(self):
+        return post_payment_event(self.client, self.order)
+
+    def test_webhook_queues_side_effects_instead_of_sending(self):
+        self.assertEqual(self.post_payment().status_code, 200)
+        self.assertEqual(self.post_payment().status_code, 200)  # Stripe retry
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(list(OutboxMessage.objects.values_list('kind', flat=True)),
+                         ['order_confirmation', 'order_confirmed_sms'])
+
+        self.assertEqual(outbox.drain(), (2, 0))  # SMS is skipped without Twilio credentials
+        self.assertEqual([message.to for message in mail.outbox], [['buyer@example.com']])
+        self.assertFalse(OutboxMessage.objects.exclude(status=outbox.DONE).exists())
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    @override_settings(DEFAULT_FROM_EMAIL='shop@example.com')
+    def test_contact_query_is_queued_and_sent_by_the_worker(self):
+        response = self.client.post(reverse('contact'), {
+            'name': 'Ann', 'email': 'ann@example.com', 'query_type': 'other',
+            'subject': 'Sizing', 'message': 'Do you resize rings?',
+        })
+        self.assertRedirects(response, reverse('contact_thank_you'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        call_command('run_outbox_worker', '--once', '--threads', '1', stdout=StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['ann@example.com', 'shop@example.com'])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE_SECONDS=10)
+    def test_failures_back_off_then_dead_letter(self):
+        with mock.patch.dict(outbox.HANDLERS, {'order_confirmation': fail_delivery}), \
+                self.assertLogs('store.outbox', 'WARNING'):
+            message = outbox.enqueue('order_confirmation', order_id=self.order.id)
+            delays = []
+            for _attempt in range(3):
+                started = timezone.now()
+                self.assertEqual(outbox.drain(), (0, 1))
+                message.refresh_from_db()
+                delays.append(round((message.available_at - started).total_seconds()))
+                self.assertEqual(outbox.drain(), (0, 0))  # not due yet
+                OutboxMessage.objects.filter(pk=message.pk).update(available_at=started)
+        self.assertEqual(delays[:2], [10, 20])
+        self.assertEqual((message.status, message.attempts), (outbox.DEAD, 3))
+        self.assertIn('SMTP server unavailable', message.last_error)
+
+        self.assertEqual(outbox.requeue(OutboxMessage.objects.all()), 1)
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claimed_messages_are_not_claimed_twice(self):
+        outbox.enqueue('order_confirmation', order_id=self.order.id)
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+        self.assertEqual(outbox.claim_batch(10), [])  # leased to the first worker
+
+
+class OutboxWorkerThreadTests(TransactionTestCase):
+
+    MESSAGES = 20
+
+    def test_thread_pool_delivers_each_message_once(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        order = create_order(create_products(category, 1))
+        for _ in range(self.MESSAGES):
+            outbox.enqueue('order_confirmation', order_id=order.id)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(outbox.drain(batch_size=8, executor=executor), (self.MESSAGES, 0))
+        self.assertEqual(len(mail.outbox), self.MESSAGES)
+        self.assertEqual(OutboxMessage.objects.filter(status=outbox.DONE, attempts=1).count(), self.MESSAGES)
+
+
+# ===========================
+# WEBHOOK DEDUPLICATION
+# ===========================
+class WebhookEventTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        self.order = create_order(create_products(category, 2), status='pending')
+        webhook_events.recent_events.clear()
+
+    def test_retry_is_acknowledged_from_memory_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(post_payment_event(self.client, self.order).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(post_payment_event(self.client, self.order).status_code, 200)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_retry_seen_by_another_process_never_touches_the_order(self):
+        post_payment_event(self.client, self.order)
+        webhook_events.recent_events.clear()  # as if the retry reached a different worker
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(post_payment_event(self.client, self.order).status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'store_order' in q['sql']])
+        self.assertEqual(ProcessedWebhookEvent.objects.get().event_id, 'evt_1')
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_failed_handling_is_retried(self):
+        with mock.patch.object(Product, 'record_sales', side_effect=RuntimeError('database hiccup')):
+            with self.assertRaises(RuntimeError):
+                post_payment_event(self.client, self.order)
+        self.assertFalse(ProcessedWebhookEvent.objects.exists())
+        self.assertFalse(Order.objects.get(pk=self.order.pk).paid)
+
+        post_payment_event(self.client, self.order)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).paid)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_event_without_id_is_rejected(self):
+        event = {'type': 'checkout.session.completed', 'data': {'object': {'metadata': {'order_id': str(self.order.id)}}}}
+        response = self.client.post(reverse('payments:stripe_webhook'), json.dumps(event),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).paid)
+
+
+class ConcurrentWebhookTests(TransactionTestCase):
+    """The same event delivered by many threads at once."""
+
+    DELIVERIES = 8
+
+    def test_parallel_replays_apply_side_effects_once(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        products = create_products(category, 2)
+        order = create_order(products, status='pending')
+        webhook_events.recent_events.clear()
+
+        barrier = threading.Barrier(self.DELIVERIES)
+        statuses = []
+
+        def deliver():
+            try:
+                barrier.wait()
+                statuses.append(post_payment_event(Client(), order).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=deliver) for _ in range(self.DELIVERIES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * self.DELIVERIES)
+        self.assertEqual(ProcessedWebhookEvent.objects.count(), 1)
+        self.assertEqual(sorted(OutboxMessage.objects.values_list('kind', flat=True)),
+                         ['order_confirmation', 'order_confirmed_sms'])
+        self.assertTrue(Order.objects.get(pk=order.pk).paid)
+        self.assertAlmostEqual(Product.objects.get(pk=products[0].pk).sales_score, sales_weight(), places=3)
+
+
+# ===========================
+# PAYMENT GATEWAY
+# ===========================
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_consecutive_failures_and_half_opens_after_timeout(self):
+        now = [0.0]
+        breaker = gateway.CircuitBreaker(threshold=3, reset_timeout=30, clock=lambda: now[0])
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        breaker.before_call()
+        breaker.record_success()  # a success resets the count
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(gateway.GatewayUnavailable):
+            breaker.before_call()
+
+        now[0] = 30
+        breaker.before_call()  # the single trial call
+        with self.assertRaises(gateway.GatewayUnavailable):
+            breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        now[0] = 60
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_fake', STRIPE_MAX_RETRIES=0, STRIPE_BREAKER_THRESHOLD=2)
+class PaymentGatewayTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        user = User.objects.create_user('shopper', password='secret')
+        self.order = create_order(create_products(category, 3), status='pending', user=user)
+        self.client.force_login(user)
+        self.addCleanup(gateway.reset_client)
+
+    def start_fake_stripe(self, **options):
+        server = FakeStripeServer(**options)
+        server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        settings_override = override_settings(STRIPE_API_BASE=server.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        gateway.reset_client()
+        return server
+
+    def test_line_items_load_products_in_one_query(self):
+        with self.assertNumQueries(1):
+            items = gateway.checkout_line_items(self.order)
+        self.assertEqual([item['price_data']['product_data']['name'] for item in items],
+                         ['Gold Ring 0', 'Gold Ring 1', 'Gold Ring 2'])
+        self.assertEqual(items[0]['price_data']['unit_amount'], 10000)
+
+    def test_checkout_redirects_to_the_stripe_session(self):
+        server = self.start_fake_stripe()
+        url = reverse('payments:create_checkout_session', args=[self.order.id])
+        first = self.client.get(url)
+        second = self.client.get(url)  # same order: same idempotency key, same session
+        self.assertEqual(first.status_code, 302)
+        self.assertTrue(first.url.startswith('https://checkout.stripe.test/c/pay/cs_test_fake'))
+        self.assertEqual(first.url, second.url)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_method, 'stripe')
+
+    def test_changed_parameters_get_a_new_session(self):
+        self.start_fake_stripe()
+        first = gateway.create_checkout_session(self.order, 'http://testserver/success/', 'http://testserver/cart/')
+        moved = gateway.create_checkout_session(self.order, 'https://shop.example/success/', 'https://shop.example/cart/')
+        self.assertNotEqual(moved.id, first.id)  # not an idempotency error
+
+        OrderItem.objects.filter(order=self.order).update(price=Decimal('80.00'))
+        repriced = gateway.create_checkout_session(self.order, 'http://testserver/success/', 'http://testserver/cart/')
+        self.assertNotIn(repriced.id, (first.id, moved.id))
+        self.assertEqual(repriced.amount_total, 24000)
+
+    def test_expired_session_is_replaced(self):
+        server = self.start_fake_stripe()
+        first = gateway.create_checkout_session(self.order, 'http://testserver/success/', 'http://testserver/cart/')
+        for _, session in server.idempotent.values():
+            session['expires_at'] = int(time.time()) - 1
+        renewed = gateway.create_checkout_session(self.order, 'http://testserver/success/', 'http://testserver/cart/')
+        retried = gateway.create_checkout_session(self.order, 'http://testserver/success/', 'http://testserver/cart/')
+        self.assertNotEqual(renewed.id, first.id)
+        self.assertEqual(retried.id, renewed.id)
+
+    def test_outage_opens_the_breaker_and_fails_fast(self):
+        server = self.start_fake_stripe(failure_rate=1.0)
+        url = reverse('payments:create_checkout_session', args=[self.order.id])
+        for _ in range(3):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(server.requests, 2)  # the third checkout never reached Stripe
+        self.assertEqual(gateway.breaker.state, 'open')
+
+    def test_benchmark_runs_against_the_local_fake(self):
+        out = StringIO()
+        call_command('benchmark_checkout', '--requests', '10', '--threads', '1', '--latency-ms', '0', stdout=out)
+        self.assertIn('10 checkout session(s) created', out.getvalue())
+        self.assertFalse(Order.objects.filter(order_number__startswith='BENCH-').exists())
+
+
+# ===========================
+# ORDER SUMMARIES
+# ===========================
+class OrderSummaryTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        self.products = create_products(category, 5)
+        self.user = User.objects.create_user('shopper', password='secret')
+        self.client.force_login(self.user)
+
+    def test_checkout_stores_the_summary(self):
+        CartItem.objects.create(user=self.user, product=self.products[0], quantity=2)
+        CartItem.objects.create(user=self.user, product=self.products[1], quantity=1)
+        self.client.post(reverse('checkout'), CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(order.items_digest, 'Gold Ring 0 × 2, Gold Ring 1')
+        self.assertEqual(order.thumbnail.name, 'products/ring.jpg')
+
+    def test_digest_names_the_first_items_only(self):
+        order = create_order(self.products, user=self.user)
+        order.refresh_summary()
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual((order.item_count, order.items_digest),
+                         (5, 'Gold Ring 0, Gold Ring 1, Gold Ring 2, +2 more'))
+
+    def test_my_orders_does_not_load_items(self):
+        def render_orders():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('user_orders'))
+            self.assertEqual(response.status_code, 200)
+            return [q['sql'] for q in ctx.captured_queries]
+
+        for _ in range(2):
+            create_order(self.products, user=self.user).refresh_summary()
+        render_orders()  # warm the per-process caches (nav categories, cart summary)
+        few = render_orders()
+        for _ in range(8):
+            create_order(self.products, user=self.user).refresh_summary()
+        many = render_orders()
+        self.assertEqual(len(few), len(many))
+        self.assertFalse([sql for sql in many if 'store_orderitem' in sql])
+        self.assertEqual(len([sql for sql in many if 'FROM "store_order"' in sql]), 1)
+
+    def test_items_are_fetched_on_demand_by_the_owner_only(self):
+        order = create_order(self.products[:2], user=self.user)
+        response = self.client.get(reverse('order_items', args=[order.id]))
+        self.assertContains(response, 'Gold Ring 1')
+
+        self.client.force_login(User.objects.create_user('someone-else', password='secret'))
+        self.assertEqual(self.client.get(reverse('order_items', args=[order.id])).status_code, 404)
+
+
+# ===========================
+# ORDER ARCHIVE
+# ===========================
+class OrderArchiveTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Rings', slug='rings')
+        self.products = create_products(category, 2)
+        self.user = User.objects.create_user('shopper', password='secret')
+        self.client.force_login(self.user)
+
+    def create_old_order(self, status='delivered', days=400):
+        order = create_order(self.products, status=status, user=self.user)
+        order.refresh_summary()
+        old = timezone.now() - timedelta(days=days)
+        Order.objects.filter(pk=order.pk).update(created_at=old, updated_at=old)
+        return order
+
+    def test_moves_only_old_final_orders(self):
+        delivered = self.create_old_order('delivered')
+        cancelled = self.create_old_order('cancelled')
+        shipped = self.create_old_order('shipped')
+        recent = self.create_old_order('delivered', days=10)
+        items = sorted(delivered.items.values_list('id', 'product_id', 'price'))
+
+        self.assertEqual(archive.archive_orders(), 2)
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), {delivered.id, cancelled.id})
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {shipped.id, recent.id})
+        self.assertEqual(OrderItem.objects.filter(order_id__in=[delivered.id, cancelled.id]).count(), 0)
+
+        copy = ArchivedOrder.objects.get(pk=delivered.id)
+        self.assertEqual((copy.order_number, copy.item_count, copy.user), (delivered.order_number, 2, self.user))
+        self.assertEqual(sorted(copy.items.values_list('id', 'product_id', 'price')), items)
+
+    def test_archives_in_batches(self):
+        orders = [self.create_old_order() for _ in range(5)]
+        with mock.patch.object(archive, 'archive_batch', wraps=archive.archive_batch) as batch:
+            self.assertEqual(archive.archive_orders(batch_size=2), 5)
+        self.assertEqual([c.args[1] for c in batch.call_args_list], [2, 2, 2])
+        self.assertEqual(ArchivedOrderItem.objects.count(), 2 * len(orders))
+        self.assertEqual(archive.archive_orders(batch_size=2), 0)
+
+    def test_ledger_keeps_the_order_number(self):
+        order = self.create_old_order('cancelled')
+        inventory.release({self.products[0].id: 1}, order=order)
+        archive.archive_orders()
+        movement = InventoryMovement.objects.get(reason=inventory.CANCELLATION)
+        self.assertIsNone(movement.order_id)
+        self.assertEqual(movement.note, f'Order #{order.order_number}')
+
+    def test_archived_orders_are_still_readable(self):
+        order = self.create_old_order()
+        archive.archive_orders()
+        response = self.client.get(reverse('order_confirmation', args=[order.id]))
+        self.assertContains(response, order.order_number)
+        self.assertContains(response, 'Gold Ring 1')
+        self.assertContains(self.client.get(reverse('order_items', args=[order.id])), 'Gold Ring 0')
+        self.assertContains(self.client.get(reverse('user_orders')), order.order_number)
+
+        self.client.force_login(User.objects.create_user('someone-else', password='secret'))
+        self.assertEqual(self.client.get(reverse('order_items', args=[order.id])).status_code, 404)
+
+    def test_my_orders_pages_across_live_and_archived_orders(self):
+        for days in range(400, 375, -1):
+            self.create_old_order(days=days)
+        archive.archive_orders(before=timezone.now() - timedelta(days=388))
+        self.assertEqual((ArchivedOrder.objects.count(), Order.objects.count()), (13, 12))
+
+        expected = list(Order.objects.values_list('order_number', flat=True)) + \
+            list(ArchivedOrder.objects.values_list('order_number', flat=True))
+        seen, url = [], reverse('user_orders')
+        while url:
+            page = self.client.get(url).context['orders']
+            seen += [order.order_number for order in page]
+            url = page.next_url and reverse('user_orders') + page.next_url
+        self.assertEqual(seen, expected)
+
+        # and back again
+        previous = self.client.get(reverse('user_orders') + page.previous_url).context['orders']
+        self.assertEqual([order.order_number for order in previous], expected[10:20])
+
+
+# ===========================
+# DAILY SALES ROLLUP
+# ===========================
+class DailySalesTests(TestCase):
+
+    def setUp(self):
+        self.rings = Category.objects.create(name='Rings', slug='rings')
+        self.chains = Category.objects.create(name='Chains', slug='chains')
+        self.ring, self.other_ring = create_products(self.rings, 2)
+        self.chain = Product.objects.create(name='Gold Chain', slug='gold-chain', description='Chain',
+                                            category=self.chains, price=Decimal('300.00'), image='products/chain.jpg')
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        webhook_events.recent_events.clear()
+
+    def paid_order(self, products, quantity=1, event_id='evt_1'):
+        order = create_order(products, status='pending')
+        OrderItem.objects.filter(order=order).update(quantity=quantity)
+        Order.objects.filter(pk=order.pk).update(total_price=order.total_price * quantity)
+        post_payment_event(self.client, order, event_id=event_id)
+        return Order.objects.get(pk=order.pk)
+
+    def rollup(self):
+        return {
+            'daily': list(DailySales.objects.values_list('date', 'currency', 'orders', 'gross', 'units')),
+            'categories': sorted(DailyCategorySales.objects.values_list('category_id', 'orders', 'gross', 'units')),
+            'products': sorted(DailyProductSales.objects.values_list('product_id', 'category_id', 'units', 'revenue')),
+        }
+
+    def test_payment_adds_the_order_once(self):
+        order = self.paid_order([self.ring, self.chain], quantity=2)
+        post_payment_event(self.client, order, event_id='evt_1')  # retried webhook
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), {
+            'daily': [(today, 'USD', 1, order.total_price, 4)],
+            'categories': [(self.rings.id, 1, Decimal('200.00'), 2), (self.chains.id, 1, Decimal('600.00'), 2)],
+            'products': [(self.ring.id, self.rings.id, 2, Decimal('200.00')),
+                         (self.chain.id, self.chains.id, 2, Decimal('600.00'))],
+        })
+
+    def test_cancelling_a_paid_order_takes_it_out(self):
+        kept = self.paid_order([self.ring])
+        cancelled = self.paid_order([self.ring, self.chain], event_id='evt_2')
+        self.assertTrue(cancelled.cancel())
+        row = DailySales.objects.get()
+        self.assertEqual((row.orders, row.gross, row.units), (1, kept.total_price, 1))
+        self.assertEqual(DailyProductSales.objects.get(product=self.chain).units, 0)
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.paid_order([self.ring, self.chain], quantity=3)
+        self.paid_order([self.other_ring], event_id='evt_2')
+        self.paid_order([self.chain], event_id='evt_3').cancel()
+        create_order([self.ring])  # never paid
+        incremental = self.rollup()
+
+        self.assertEqual(sales.rebuild(), 2)
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_admin_order_edits_move_the_rollups(self):
+        edited = self.paid_order([self.ring, self.chain], quantity=3)
+        unpaid = self.paid_order([self.other_ring], event_id='evt_2')
+        cancelled = self.paid_order([self.chain], event_id='evt_3')
+        paid = create_order([self.ring])
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+
+        def change(order, **changes):
+            data = {field: getattr(order, field) or '' for field in (
+                'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state', 'postal_code',
+                'country', 'total_price', 'payment_method', 'status', 'transaction_id',
+            )}
+            data.update({'paid': 'on', 'items-TOTAL_FORMS': 0, 'items-INITIAL_FORMS': 0}, **changes)
+            response = self.client.post(reverse('admin:store_order_change', args=[order.pk]), data)
+            self.assertEqual(response.status_code, 302)
+
+        def changelist_paid(order, paid):
+            data = {'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1, 'form-0-id': order.pk, '_save': 'Save'}
+            if paid:
+                data['form-0-paid'] = 'on'
+            response = self.client.post(reverse('admin:store_order_changelist'), data)
+            self.assertEqual(response.status_code, 302)
+
+        change(edited, total_price='1234.00', status='processing')
+        change(cancelled, status='cancelled')
+        changelist_paid(unpaid, False)
+        changelist_paid(paid, True)
+        self.assertEqual(list(Order.objects.filter(paid=True).exclude(status='cancelled').order_by('id')),
+                         [edited, paid])
+        self.assertEqual(DailySales.objects.get().gross, Decimal('1234.00') + paid.total_price)
+
+        # Rows emptied by the edits are left at zero; a rebuild does not create them
+        for model in (DailySales, DailyCategorySales):
+            model.objects.filter(orders=0).delete()
+        DailyProductSales.objects.filter(units=0).delete()
+        incremental = self.rollup()
+        sales.rebuild()
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_dashboard_reads_rollups_whatever_the_range(self):
+        self.paid_order([self.ring, self.chain], quantity=2)
+        self.client.force_login(self.staff)
+
+        def dashboard(**params):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('analytics'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q for q in ctx.captured_queries if 'store_order' in q['sql']])
+            return response, len(ctx.captured_queries)
+
+        dashboard()  # warm the per-process caches
+        month, month_queries = dashboard()
+        year, year_queries = dashboard(days=365)
+        self.assertEqual(month_queries, year_queries)
+        self.assertEqual(len(json.loads(year.context['daily_values'])), 365)
+        self.assertEqual(month.context['total_sales'], Decimal('800.00'))
+        self.assertEqual([p['revenue'] for p in month.context['top_products']], [Decimal('600.00'), Decimal('200.00')])
+
+        rings, _ = dashboard(category='rings')
+        self.assertEqual((rings.context['total_sales'], rings.context['orders_count']), (Decimal('200.00'), 1))
+        self.assertEqual([p['product__name'] for p in rings.context['top_products']], ['Gold Ring 0'])
+
+
+# ===========================
+# GUEST CART
+# ===========================
+class GuestCartTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        cls.ring, cls.chain, cls.pendant = create_products(category, 3)
+        cls.user = User.objects.create_user('shopper', password='secret')
+
+    def setUp(self):
+        invalidate_cart_summary(self.user)
+
+    def test_guest_cart_never_writes_to_database(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('add_to_cart', args=[self.ring.id]), {'quantity': 2})
+            self.client.post(reverse('add_to_cart', args=[self.chain.id]))
+            self.client.post(reverse('update_cart', args=[self.ring.id]), {'quantity': 3})
+            self.client.post(reverse('remove_from_cart', args=[self.chain.id]))
+        self.assertTrue(all(q['sql'].startswith('SELECT') for q in ctx.captured_queries))
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([(item.product, item.quantity) for item in response.context['cart_items']], [(self.ring, 3)])
+        self.assertEqual(response.context['cart_count'], 3)
+        self.assertEqual(self.client.post(reverse('remove_from_cart', args=[self.pendant.id])).status_code, 404)
+
+    def test_login_merges_guest_cart(self):
+        CartItem.objects.create(user=self.user, product=self.ring, quantity=4)
+        self.client.post(reverse('add_to_cart', args=[self.ring.id]), {'quantity': 3})
+        self.client.post(reverse('add_to_cart', args=[self.chain.id]), {'quantity': 2})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.login(username='shopper', password='secret')
+        cart_writes = [q for q in ctx.captured_queries if 'store_cartitem' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(cart_writes), 2)  # one bulk update, one bulk insert
+        quantities = dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.ring.id: 5, self.chain.id: 2})  # capped at stock
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 7)
+
+
+# ===========================
+# KEYSET PAGINATION
+# ===========================
+class KeysetPaginationTests(TestCase):
+    """Walking cursors forwards and backwards visits every product exactly once, in order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Rings', slug='rings')
+        create_products(category, 30)
+        # Ties on every sort key so the id tie-breaker matters
+        Product.objects.filter(id__lte=Product.objects.order_by('id')[15].id).update(
+            price=Decimal('500.00'), rating_avg=4.0, rating_count=2, sales_score=3.0,
+        )
+
+    def walk(self, url):
+        """Product ids page by page following next cursors, then back via previous cursors."""
+        forward, pages = [], []
+        response = self.client.get(url)
+        while True:
+            page = response.context['products']
+            pages.append([product.id for product in page])
+            forward.extend(pages[-1])
+            if not page.has_next:
+                break
+            response = self.client.get(url.split('?')[0] + page.next_url)
+        backward = [pages[-1]]
+        while page.has_previous:
+            response = self.client.get(url.split('?')[0] + page.previous_url)
+            page = response.context['products']
+            backward.insert(0, [product.id for product in page])
+        return forward, pages, backward
+
+    def test_every_sort_option_pages_through_whole_listing(self):
+        orderings = {
+            'newest': ('-created_at', '-id'),
+            'price_low': ('price', 'id'),
+            'price_high': ('-price', '-id'),
+            'rating': ('-rating_avg', '-rating_count', '-id'),
+            'popular': ('-sales_score', '-id'),
+        }
+        for sort, ordering in orderings.items():
+            with self.subTest(sort=sort):
+                expected = list(Product.objects.order_by(*ordering).values_list('id', flat=True))
+                forward, pages, backward = self.walk(reverse('shop') + f'?sort={sort}')
+                self.assertEqual(forward, expected)
+                self.assertEqual(backward, pages)
+
+    def test_search_pages_by_relevance(self):
+        expected = list(search.search_products(Product.objects.all(), 'gold').values_list('id', flat=True))
+        forward, pages, backward = self.walk(reverse('search') + '?q=gold')
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, pages)
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        url = reverse('category', args=['rings'])
+        first = self.client.get(url).context['products']
+        cache_utils.bump_generation('catalog')
+        with CaptureQueriesContext(connection) as first_ctx:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as deep_ctx:
+            self.client.get(url + first.next_url)
+        self.assertEqual(len(deep_ctx.captured_queries), len(first_ctx.captured_queries))
+        self.assertFalse(any('COUNT' in query['sql'] for query in deep_ctx.captured_queries))
+
+    def test_json_variant_returns_cards_and_next_cursor(self):
+        response = self.client.get(reverse('shop') + '?format=json')
+        data = response.json()
+        self.assertEqual(data['html'].count('class="product-card"'), 12)
+        self.assertTrue(data['has_next'])
+        self.assertIn('cursor=', data['next_url'])
+        self.assertNotIn('format=json', data['next_url'])
+        self.assertIsNone(data['count'])
+        self.assertEqual(self.client.get(reverse('shop') + '?format=json&count=1').json()['count'], 30)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        first = self.client.get(reverse('search') + '?q=gold').context['products']
+        rank = first[-1].search_rank
+        for label, url, values in [
+            ('search rank', reverse('search') + '?q=gold', ['abc', 1]),
+            ('search rank', reverse('search') + '?q=gold', [None, 1]),
+            ('search rank', reverse('search') + '?q=gold', [[rank], 1]),
+            ('search rank', reverse('search') + '?q=gold', [rank, 'x']),
+            ('search rank', reverse('search') + '?q=gold', [rank]),
+            ('price', reverse('shop') + '?sort=price_low', ['NaN', 1]),
+            ('price', reverse('shop') + '?sort=price_low', [{'a': 1}, 1]),
+            ('created_at', reverse('shop'), ['yesterday', 1]),
+        ]:
+            with self.subTest(key=label, values=values):
+                cursor = pagination.encode_cursor(values, pagination.NEXT)
+                response = self.client.get(f'{url}&cursor={cursor}' if '?' in url else f'{url}?cursor={cursor}')
+                self.assertEqual(response.status_code, 200)
+                page = response.context['products']
+                self.assertFalse(page.has_previous)
+                if label == 'search rank':
+                    self.assertEqual([p.id for p in page], [p.id for p in first])
+        for cursor in ('not-base64!', 'e30', base64.urlsafe_b64encode(b'[1, 2]').decode()):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(reverse('shop'), {'cursor': cursor}).status_code, 200)
+
+
+# ===========================
+# QUERY PLAN AUDIT
+# ===========================
+class ExplainHotPathsTests(TestCase):
+
+    def audit(self):
+        out = StringIO()
+        try:
+            call_command('explain_hot_paths', seed=300, stdout=out)
+        except CommandError as error:
+            return out.getvalue(), str(error)
+        return out.getvalue(), None
+
+    def test_every_hot_path_uses_an_index(self):
+        report, error = self.audit()
+        self.assertIsNone(error, report)
+        self.assertIn('✅ shop: first page (price_low)', report)
+        self.assertFalse(Product.objects.exists())  # the seed is rolled back
+
+    def test_missing_index_is_reported(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX product_price_idx')  # undone with the test transaction
+        report, error = self.audit()
+        self.assertEqual(error, '4 hot path(s) need an index.')
+        for sort in ('price_low', 'price_high'):
+            for page in ('first', 'next'):
+                self.assertIn(f'⚠️  shop: {page} page ({sort})', report)
+        self.assertIn('✅ shop: first page (newest)', report)
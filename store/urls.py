@@ -23,8 +23,10 @@ urlpatterns = [
     path('order-confirmation/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
     path('order-cancel/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('orders/', views.user_orders, name='user_orders'),
+    path('orders/<int:order_id>/items/', views.order_items, name='order_items'),
     # Analytics Dashboard
     path('dashboard/', views.analytics_dashboard, name='analytics'),
+    path('dashboard/page-cache/', views.page_cache_stats_api, name='page_cache_stats'),
     
     # Wishlist
     path('wishlist/', views.wishlist_view, name='wishlist'),
@@ -37,4 +39,8 @@ urlpatterns = [
     # AI Chat API
     path('api/chat/', chat_views.chat_api, name='chat_api'),
     path('api/products/', chat_views.product_search_api, name='product_search_api'),
+    path('api/suggest/', chat_views.suggest_api, name='suggest_api'),
+    path('api/facets/', views.facets_api, name='facets_api'),
+    path('api/cart/batch/', views.cart_batch_api, name='cart_batch_api'),
+    path('api/coupon/validate/', views.coupon_validate_api, name='coupon_validate_api'),
 ]
@@ -1,46 +1,60 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q, Avg, Sum
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.paginator import Paginator
+from django.views.decorators.http import require_POST
+from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 import json
-import random
-import string
 
 from .models import (
     Category, Product, Review, CartItem, 
-    Order, OrderItem, Wishlist, UserProfile, ContactQuery, Coupon
+    Order, OrderItem, Wishlist, UserProfile, ContactQuery, Coupon, InsufficientStock
 )
+from .search import search_products
+from .pagination import paginate, paginate_merged
+from .associations import frequently_bought_with
+from . import archive, facets, inventory, outbox, sales, suggest
+from .cache_utils import (
+    cache_anonymous_page, page_cache_stats, anonymous_condition,
+    catalog_etag, catalog_last_modified, get_generation, generation_changed_at,
+)
+from .cart_utils import (
+    get_cart_summary, invalidate_cart_summary, get_session_cart, save_session_cart, session_cart_items,
+    parse_cart_operations, apply_cart_operations,
+)
+from .order_ids import next_order_number
+from .coupons import CouponError, quote_coupon, redeem_coupon
 from .forms import ReviewForm, CheckoutForm, ContactQueryForm
-from .email_utils import send_order_confirmation_email, send_contact_receipt_email, notify_admin_new_contact
-from .sms_utils import send_sms
 
 
 # ===========================
 # HOME VIEW
 # ===========================
+@cache_anonymous_page()
 def home(request):
     """Home page - Shows featured products and new arrivals."""
     
     # Get featured products (maximum 8)
-    featured_products = Product.objects.filter(is_featured=True)[:8]
+    featured_products = Product.objects.for_cards().filter(is_featured=True)[:8]
     
     # Get newest products (maximum 8)
-    new_products = Product.objects.filter(is_new=True).order_by('-created_at')[:8]
+    new_products = Product.objects.for_cards().filter(is_new=True).order_by('-created_at')[:8]
     
-    # Get all categories (maximum 5 for display)
-    categories = Category.objects.all()[:5]
+    # Category showcase (maximum 5) with product counts from the facet index
+    showcase_categories = facets.get_index().counts()['categories'][:5]
     
     # Prepare data to send to template
     context = {
         'featured_products': featured_products,
         'new_products': new_products,
-        'categories': categories,
+        'showcase_categories': showcase_categories,
+        'wishlist_ids': get_wishlist_ids(request),
         'page_title': 'Home - Luxury Jewelry Store',
     }
     return render(request, 'store/home.html', context)
@@ -49,12 +63,13 @@ def home(request):
 # ===========================
 # SHOP/PRODUCTS LIST VIEW
 # ===========================
+@anonymous_condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+@cache_anonymous_page(with_query_string=False)
 def shop(request):
     """Products page - Shows all products with filters and search."""
     
     # Start with all products
-    products = Product.objects.all()
-    categories = Category.objects.all()
+    products = Product.objects.for_cards()
     
     # Apply category filter if user selected one
     products = apply_category_filter(request, products)
@@ -71,16 +86,29 @@ def shop(request):
     # Split products into pages (12 per page)
     products_page = paginate_products(request, products)
     
+    # Infinite scroll asks for just the next batch of cards
+    if wants_json(request):
+        return product_cards_response(request, products_page, 'store/includes/shop_product_cards.html', {
+            'wishlist_ids': get_wishlist_ids(request),
+        })
+    
     # Get selected category for display
     selected_category = request.GET.get('category')
     
+    # Sidebar facet counts (from the in-memory bitset index)
+    facet_counts = get_facet_counts(request)
+    
     # Prepare data to send to template
     context = {
         'products': products_page,
-        'categories': categories,
+        'facets': facet_counts,
         'search_query': search_query,
         'selected_category': selected_category,
         'selected_sort': selected_sort,
+        'price_min': request.GET.get('price_min', ''),
+        'price_max': request.GET.get('price_max', ''),
+        'price_below': request.GET.get('price_below', ''),
+        'wishlist_ids': get_wishlist_ids(request),
         'page_title': 'Shop - Jewelry Store',
     }
     return render(request, 'store/shop.html', context)
@@ -96,73 +124,157 @@ def apply_category_filter(request, products):
     return products
 
 
+# Helper function to read a price from the query string
+def parse_price(value):
+    """Return the price as a Decimal, or None if missing or invalid."""
+    try:
+        return Decimal(value) if value else None
+    except (InvalidOperation, TypeError):
+        return None
+
+
 # Helper function to filter by price
 def apply_price_filter(request, products):
-    """Filter products by price range if set."""
-    price_min = request.GET.get('price_min')
-    price_max = request.GET.get('price_max')
-    
-    if price_min:
-        products = products.filter(price__gte=float(price_min))
-    if price_max:
-        products = products.filter(price__lte=float(price_max))
+    """Filter products by price range if set (price_below is exclusive, for the bucket links)."""
+    price_min = parse_price(request.GET.get('price_min'))
+    price_max = parse_price(request.GET.get('price_max'))
+    price_below = parse_price(request.GET.get('price_below'))
+    
+    if price_min is not None:
+        products = products.filter(price__gte=price_min)
+    if price_max is not None:
+        products = products.filter(price__lte=price_max)
+    if price_below is not None:
+        products = products.filter(price__lt=price_below)
     
     return products
 
 
+# Helper function for sidebar facet counts
+def get_facet_counts(request):
+    """Count products per category and price range for the active shop filters."""
+    index = facets.get_index()
+    within = None
+    search_query = request.GET.get('search')
+    if search_query:
+        matches = search_products(Product.objects.all(), search_query, ranked=False)
+        within = index.bits_for_ids(matches.values_list('id', flat=True))
+    return index.counts(
+        category_id=index.category_id_for_slug(request.GET.get('category')),
+        price_min=parse_price(request.GET.get('price_min')),
+        price_max=parse_price(request.GET.get('price_max')),
+        price_below=parse_price(request.GET.get('price_below')),
+        within=within,
+    )
+
+
+def facets_api(request):
+    """JSON facet counts for the shop filters (same parameters as the shop page)."""
+    counts = get_facet_counts(request)
+    for price_range in counts['price_ranges']:
+        price_range['min'] = str(price_range['min'])
+        price_range['max'] = str(price_range['max']) if price_range['max'] is not None else None
+    return JsonResponse(counts)
+
+
 # Helper function to search products
 def apply_search_filter(request, products):
     """Search products by name or description."""
     search_query = request.GET.get('search')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query, ranked=False)
     return products, search_query
 
 
+# Sort options offered on the shop page -> ORM ordering (id breaks ties)
+SORT_OPTIONS = {
+    'newest': ('-created_at', '-id'),
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'rating': ('-rating_avg', '-rating_count', '-id'),
+    'popular': ('-sales_score', '-id'),
+}
+DEFAULT_SORT = 'newest'
+
+
 # Helper function to sort products
 def apply_sorting(request, products):
-    """Sort products based on user selection."""
-    sort_by = request.GET.get('sort', '-created_at')
-    
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'rating':
-        products = products.annotate(avg_rating=Avg('reviews__rating')).order_by('-avg_rating')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
-    else:
-        products = products.order_by(sort_by)
-    
-    return products, sort_by
+    """Sort products based on user selection (unknown values use the default)."""
+    sort_by = request.GET.get('sort', DEFAULT_SORT)
+    if sort_by == '-created_at':
+        sort_by = 'newest'  # value used by older links
+    if sort_by not in SORT_OPTIONS:
+        sort_by = DEFAULT_SORT
+    return products.order_by(*SORT_OPTIONS[sort_by]), sort_by
 
 
 # Helper function for pagination
 def paginate_products(request, products):
-    """Split products into pages (12 products per page)."""
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
-    return products_page
+    """Split products into pages (12 products per page) using ?cursor=."""
+    return paginate(request, products, 12)
+
+
+# Helpers for infinite scroll
+def wants_json(request):
+    """True when a listing is requested as JSON (?format=json)."""
+    return request.GET.get('format') == 'json'
+
+
+def product_cards_response(request, products_page, cards_template, context=None):
+    """Rendered product cards of one page plus the cursor for the next one."""
+    context = dict(context or {}, products=products_page)
+    return JsonResponse({
+        'html': render_to_string(cards_template, context, request=request),
+        'has_next': products_page.has_next,
+        'next_cursor': products_page.next_cursor,
+        'next_url': products_page.next_url,
+        'count': products_page.count,
+    })
 
 
 # ===========================
 # PRODUCT DETAIL VIEW
 # ===========================
+def product_updated_at(request, slug):
+    """The product's updated_at, looked up once per request."""
+    if not hasattr(request, '_product_updated_at'):
+        request._product_updated_at = (
+            Product.objects.filter(slug=slug).values_list('updated_at', flat=True).first()
+        )
+    return request._product_updated_at
+
+
+def product_etag(request, slug):
+    """Changes when the product or anything else in the catalog (reviews, related items) changes."""
+    updated_at = product_updated_at(request, slug)
+    if updated_at is None:
+        return None
+    return f'product-{int(updated_at.timestamp() * 1000)}-catalog-{get_generation("catalog")}'
+
+
+def product_last_modified(request, slug):
+    updated_at = product_updated_at(request, slug)
+    catalog_changed = generation_changed_at('catalog')
+    if updated_at is None or catalog_changed is None:
+        return updated_at
+    return max(updated_at, catalog_changed)
+
+
+@anonymous_condition(etag_func=product_etag, last_modified_func=product_last_modified)
 def product_detail(request, slug):
     """Product detail page with reviews and related products."""
     product = get_object_or_404(Product, slug=slug)
     reviews = product.reviews.filter(approved=True)
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    avg_rating = product.rating_avg
     
-    # Related products from same category
-    related_products = Product.objects.filter(
-        category=product.category
-    ).exclude(id=product.id)[:4]
+    # Frequently bought together (precomputed by `manage.py build_associations`),
+    # falling back to products from the same category
+    related_products = list(frequently_bought_with(product, limit=4))
+    bought_together = bool(related_products)
+    if not related_products:
+        related_products = Product.objects.for_cards().filter(
+            category=product.category
+        ).exclude(id=product.id)[:4]
     
     # Check if user has wishlist item
     in_wishlist = False
@@ -182,16 +294,10 @@ def product_detail(request, slug):
             review.product = product
             review.user = request.user
             review.approved = False
-            review.save()
-            # Notify moderator
-            try:
-                from .email_utils import notify_moderator_review
-                from django.conf import settings as _settings
-                admin_email = getattr(_settings, 'DEFAULT_FROM_EMAIL', None)
-                if admin_email:
-                    notify_moderator_review(review, admin_email)
-            except Exception:
-                pass
+            with transaction.atomic():
+                review.save()
+                # Notify moderator (sent by the outbox worker)
+                outbox.enqueue('review_moderation', review_id=review.pk)
             messages.info(request, 'Thank you — your review has been submitted for moderation.')
             return redirect('product_detail', slug=slug)
     
@@ -200,6 +306,7 @@ def product_detail(request, slug):
         'reviews': reviews,
         'avg_rating': avg_rating,
         'related_products': related_products,
+        'bought_together': bought_together,
         'review_form': review_form,
         'in_wishlist': in_wishlist,
         'page_title': f'{product.name} - Jewelry Store',
@@ -210,9 +317,8 @@ def product_detail(request, slug):
 # ===========================
 # ADD TO CART
 # ===========================
-@login_required(login_url='login')
 def add_to_cart(request, product_id):
-    """Add product to cart."""
+    """Add product to cart (the session cart for guests)."""
     product = get_object_or_404(Product, id=product_id)
     
     try:
@@ -224,26 +330,38 @@ def add_to_cart(request, product_id):
     except (ValueError, TypeError):
         quantity = 1
     
-    # Get or create cart item
-    cart_item, created = CartItem.objects.get_or_create(
-        user=request.user,
-        product=product,
-        defaults={'quantity': quantity}
-    )
-    
-    if not created:
-        cart_item.quantity += quantity
-        if cart_item.quantity > product.stock:
-            cart_item.quantity = product.stock
-        cart_item.save()
+    if request.user.is_authenticated:
+        # Get or create cart item
+        cart_item, created = CartItem.objects.get_or_create(
+            user=request.user,
+            product=product,
+            defaults={'quantity': quantity}
+        )
+        
+        if not created:
+            cart_item.quantity += quantity
+            if cart_item.quantity > product.stock:
+                cart_item.quantity = product.stock
+            cart_item.save()
+        invalidate_cart_summary(request.user)
+    else:
+        guest_cart = get_session_cart(request)
+        in_cart = min(guest_cart.get(product.id, 0) + quantity, product.stock)
+        if in_cart > 0:
+            guest_cart[product.id] = in_cart
+            save_session_cart(request, guest_cart)
     
     messages.success(request, f'{product.name} added to cart!')
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if request.user.is_authenticated:
+            cart_count = get_cart_summary(request.user)['count']
+        else:
+            cart_count = sum(get_session_cart(request).values())
         return JsonResponse({
             'success': True,
             'message': f'{product.name} added to cart',
-            'cart_count': sum([item.quantity for item in CartItem.objects.filter(user=request.user)])
+            'cart_count': cart_count
         })
     
     return redirect('cart')
@@ -252,15 +370,18 @@ def add_to_cart(request, product_id):
 # ===========================
 # VIEW CART
 # ===========================
+CART_TAX_RATE = Decimal('0.1')  # 10% tax shown on the cart page
+
+
 def cart(request):
     """View shopping cart."""
     if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(user=request.user)
+        cart_items = CartItem.objects.filter(user=request.user).select_related('product__category')
     else:
-        cart_items = []
+        cart_items = session_cart_items(request)
     
     cart_total = sum([item.get_subtotal() for item in cart_items], Decimal(0))
-    tax_amount = cart_total * Decimal('0.1')  # 10% tax
+    tax_amount = cart_total * CART_TAX_RATE
     
     context = {
         'cart_items': cart_items,
@@ -275,21 +396,37 @@ def cart(request):
 # ===========================
 # UPDATE CART ITEM
 # ===========================
-@login_required(login_url='login')
 def update_cart(request, item_id):
-    """Update cart item quantity."""
-    cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
-    quantity = int(request.POST.get('quantity', 1))
+    """Update cart item quantity (guest cart lines are keyed by product id)."""
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except (ValueError, TypeError):
+        quantity = 0
     
-    if quantity > 0:
-        cart_item.quantity = quantity
-        cart_item.save()
+    if request.user.is_authenticated:
+        cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
+        if quantity > 0:
+            cart_item.quantity = quantity
+            cart_item.save()
+            invalidate_cart_summary(request.user)
+        subtotal = cart_item.get_subtotal()
+        cart_total = get_cart_summary(request.user)['total']
+    else:
+        guest_cart = get_session_cart(request)
+        if item_id not in guest_cart:
+            raise Http404('Not in cart')
+        if quantity > 0:
+            guest_cart[item_id] = quantity
+            save_session_cart(request, guest_cart)
+        items = {item.id: item for item in session_cart_items(request)}
+        subtotal = items[item_id].get_subtotal() if item_id in items else 0
+        cart_total = sum([item.get_subtotal() for item in items.values()], Decimal(0))
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
-            'subtotal': float(cart_item.get_subtotal()),
-            'cart_total': float(sum([item.get_subtotal() for item in CartItem.objects.filter(user=request.user)]))
+            'subtotal': float(subtotal),
+            'cart_total': float(cart_total)
         })
     
     return redirect('cart')
@@ -298,28 +435,159 @@ def update_cart(request, item_id):
 # ===========================
 # REMOVE FROM CART
 # ===========================
-@login_required(login_url='login')
 def remove_from_cart(request, item_id):
-    """Remove item from cart."""
-    cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
-    cart_item.delete()
+    """Remove item from cart (guest cart lines are keyed by product id)."""
+    if request.user.is_authenticated:
+        cart_item = get_object_or_404(CartItem, id=item_id, user=request.user)
+        cart_item.delete()
+        invalidate_cart_summary(request.user)
+        cart_total = get_cart_summary(request.user)['total']
+    else:
+        guest_cart = get_session_cart(request)
+        if guest_cart.pop(item_id, None) is None:
+            raise Http404('Not in cart')
+        save_session_cart(request, guest_cart)
+        cart_total = sum([item.get_subtotal() for item in session_cart_items(request)], Decimal(0))
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
-            'cart_total': float(sum([item.get_subtotal() for item in CartItem.objects.filter(user=request.user)]))
+            'cart_total': float(cart_total)
         })
     
     return redirect('cart')
 
 
+# ===========================
+# BATCHED CART API
+# ===========================
+@require_POST
+def cart_batch_api(request):
+    """
+    Apply a list of cart operations in one request:
+    {"operations": [{"op": "add" | "update" | "remove", "product_id": 1, "quantity": 2}, ...]}
+    Returns every cart line with its subtotal and the new totals.
+    """
+    try:
+        operations = parse_cart_operations(json.loads(request.body).get('operations'))
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    lines, cart_count, subtotal = apply_cart_operations(request, operations)
+    tax_amount = subtotal * CART_TAX_RATE
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {'product_id': line['product_id'], 'quantity': line['quantity'], 'subtotal': float(line['subtotal'])}
+            for line in lines
+        ],
+        'cart_count': cart_count,
+        'subtotal': float(subtotal),
+        'tax_amount': float(tax_amount),
+        'cart_total': float(subtotal + tax_amount),
+    })
+
+
+# ===========================
+# PLACE ORDER
+# ===========================
+def place_order(request, form):
+    """
+    Turn the user's cart into an order in one transaction: reserve stock
+    with one conditional UPDATE (store.inventory), bulk insert the order
+    items and clear the cart with a single DELETE. Returns None if the cart emptied
+    meanwhile (e.g. checked out in another tab); raises InsufficientStock.
+    """
+    with transaction.atomic():
+        # Lock the cart lines so the same cart cannot be ordered twice
+        cart_items = list(
+            CartItem.objects.select_for_update(of=('self',))
+            .filter(user=request.user)
+            .select_related('product')
+            .order_by('product_id')
+        )
+        if not cart_items:
+            return None
+        quantities = {item.product_id: item.quantity for item in cart_items}
+        cart_total = sum([item.get_subtotal() for item in cart_items], Decimal(0))
+
+        # Create order (set payment_method later when creating checkout session)
+        order = form.save(commit=False)
+        order.user = request.user
+        order.order_number = generate_order_number()
+        # Apply coupon if provided
+        coupon_code = form.cleaned_data.get('coupon_code')
+        discount_amount = 0
+        if coupon_code:
+            try:
+                coupon, discount = quote_coupon(coupon_code, cart_total)
+                redeem_coupon(coupon)
+                discount_amount = discount
+            except CouponError as e:
+                messages.warning(request, str(e))
+
+        order.total_price = (cart_total - discount_amount)
+        order.payment_method = 'stripe'
+        # store selected currency on order
+        order.currency = request.session.get('currency', getattr(settings, 'BASE_CURRENCY', 'USD'))
+        order.set_summary((item.product, item.quantity) for item in cart_items)
+        order.save()
+        inventory.reserve(quantities, order=order)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
+            for item in cart_items
+        ])
+
+        # Clear cart
+        CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        # Alert the admin about products this order left low on stock
+        threshold = int(getattr(settings, 'LOW_STOCK_THRESHOLD', 5))
+        low_stock = list(
+            Product.objects.filter(pk__in=list(quantities), stock__lte=threshold).values_list('id', flat=True)
+        )
+        if low_stock:
+            outbox.enqueue('low_stock_alert', product_ids=low_stock)
+    invalidate_cart_summary(request.user)
+    return order
+
+
+# ===========================
+# COUPON PREVIEW API
+# ===========================
+def coupon_validate_api(request):
+    """Preview the discount `?code=` gives on the visitor's current cart."""
+    code = request.GET.get('code', '').strip()
+    if not code:
+        return JsonResponse({'valid': False, 'error': 'Enter a coupon code.'}, status=400)
+    
+    if request.user.is_authenticated:
+        amount = get_cart_summary(request.user)['total']
+    else:
+        amount = sum([item.get_subtotal() for item in session_cart_items(request)], Decimal(0))
+    try:
+        coupon, discount = quote_coupon(code, amount)
+    except CouponError as e:
+        return JsonResponse({'valid': False, 'error': str(e)})
+    return JsonResponse({
+        'valid': True,
+        'code': coupon.code,
+        'discount_percent': float(coupon.discount_percent),
+        'discount_amount': float(discount),
+        'subtotal': float(amount),
+        'total_after_discount': float(amount - discount),
+    })
+
+
 # ===========================
 # CHECKOUT VIEW
 # ===========================
 @login_required(login_url='login')
 def checkout(request):
     """Checkout page."""
-    cart_items = CartItem.objects.filter(user=request.user)
+    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
     
     if not cart_items.exists():
         return redirect('shop')
@@ -346,45 +614,19 @@ def checkout(request):
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            # Create order (set payment_method later when creating checkout session)
-            order = form.save(commit=False)
-            order.user = request.user
-            order.order_number = generate_order_number()
-            # Apply coupon if provided
-            coupon_code = form.cleaned_data.get('coupon_code')
-            discount_amount = 0
-            if coupon_code:
-                try:
-                    coupon = Coupon.objects.get(code__iexact=coupon_code)
-                    if coupon.is_valid() and (not coupon.min_order_amount or cart_total >= coupon.min_order_amount):
-                        discount_amount = (cart_total * (coupon.discount_percent / Decimal('100'))).quantize(Decimal('0.01'))
-                        # increment usage count
-                        coupon.used_count = coupon.used_count + 1
-                        coupon.save()
-                    else:
-                        messages.warning(request, 'Coupon is invalid or has expired.')
-                except Coupon.DoesNotExist:
-                    messages.warning(request, 'Coupon code not found.')
-
-            order.total_price = (cart_total - discount_amount)
-            order.payment_method = 'stripe'
-            # store selected currency on order
-            from django.conf import settings as _settings
-            selected_currency = request.session.get('currency', getattr(_settings, 'BASE_CURRENCY', 'USD'))
-            order.currency = selected_currency
-            order.save()
-
-            # Create order items
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.price
-                )
-
-            # Clear cart
-            cart_items.delete()
+            try:
+                order = place_order(request, form)
+            except InsufficientStock as e:
+                if e.product is None:
+                    messages.error(request, 'A product in your cart is no longer available.')
+                else:
+                    messages.error(
+                        request,
+                        f'Sorry, only {e.available} of {e.product.name} left in stock. Please update your cart.'
+                    )
+                return redirect('cart')
+            if order is None:
+                return redirect('shop')
 
             # Redirect to payments create-checkout-session
             return redirect('payments:create_checkout_session', order_id=order.id)
@@ -404,8 +646,10 @@ def checkout(request):
 # ORDER CONFIRMATION
 # ===========================
 def order_confirmation(request, order_id):
-    """Order confirmation page."""
-    order = get_object_or_404(Order, id=order_id)
+    """Order confirmation page (archived orders included)."""
+    order = archive.get_order(order_id)
+    if order is None:
+        raise Http404
 
     # Check if user has permission to view this order
     if order.user != request.user and not request.user.is_staff:
@@ -427,12 +671,8 @@ def order_confirmation(request, order_id):
 # ===========================
 @login_required(login_url='login')
 def user_orders(request):
-    """View user's orders."""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    
-    paginator = Paginator(orders, 10)
-    page_number = request.GET.get('page')
-    orders_page = paginator.get_page(page_number)
+    """View user's orders, live and archived (rendered from the stored summaries: one query per table per page)."""
+    orders_page = paginate_merged(request, archive.user_orders_querysets(request.user), 10)
     
     context = {
         'orders': orders_page,
@@ -441,44 +681,70 @@ def user_orders(request):
     return render(request, 'store/user_orders.html', context)
 
 
+@login_required(login_url='login')
+def order_items(request, order_id):
+    """Item breakdown of one order, loaded when the user expands it on "My Orders"."""
+    order = archive.get_order(order_id)
+    if order is None or (order.user_id != request.user.id and not request.user.is_staff):
+        raise Http404
+    items = order.items.select_related('product').order_by('id')
+    return render(request, 'store/includes/order_items.html', {'items': items})
+
+
 # ===========================
 # ANALYTICS DASHBOARD
 # ===========================
 @staff_member_required
-def analytics_dashboard(request):
-    """Simple analytics dashboard for staff: last 30 days sales, orders, top products."""
-    today = timezone.now().date()
-    start_date = today - timedelta(days=29)
+def page_cache_stats_api(request):
+    """Hit/miss counters of the anonymous page cache."""
+    return JsonResponse(page_cache_stats())
+
+
+# Dashboard ranges in days (?days=)
+ANALYTICS_RANGES = (7, 30, 90, 365)
 
-    # Orders in the last 30 days
-    recent_orders = Order.objects.filter(created_at__date__gte=start_date)
-    total_sales = recent_orders.aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
-    orders_count = recent_orders.count()
 
-    # Daily sales series
+@staff_member_required
+def analytics_dashboard(request):
+    """
+    Sales analytics for staff over ?days= (default 30), optionally for one
+    ?category= slug. Top products cover the same range as the totals. Reads
+    the daily rollups (store.sales): one row per day, whatever the range.
+    """
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in ANALYTICS_RANGES:
+        days = 30
+    category = None
+    if request.GET.get('category'):
+        category = Category.objects.filter(slug=request.GET['category']).first()
+
+    today = timezone.localdate()
+    start_date = today - timedelta(days=days - 1)
+    totals = sales.daily_totals(start_date, today, category=category)
+    total_sales = sum((row['gross'] for row in totals.values()), Decimal('0.00'))
+    orders_count = sum(row['orders'] for row in totals.values())
+
+    # Daily sales series (days without sales have no row)
     daily_labels = []
     daily_values = []
-    for i in range(30):
+    for i in range(days):
         day = start_date + timedelta(days=i)
-        day_total = Order.objects.filter(created_at__date=day).aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
         daily_labels.append(day.strftime('%Y-%m-%d'))
-        daily_values.append(float(day_total))
-
-    # Top products by revenue
-    top_products_qs = (
-        OrderItem.objects
-        .values('product__id', 'product__name')
-        .annotate(total_qty=Sum('quantity'), revenue=Sum('price'))
-        .order_by('-revenue')[:5]
-    )
-    top_products = list(top_products_qs)
+        daily_values.append(float(totals[day]['gross']) if day in totals else 0.0)
 
     context = {
         'total_sales': total_sales,
         'orders_count': orders_count,
         'daily_labels': json.dumps(daily_labels),
         'daily_values': json.dumps(daily_values),
-        'top_products': top_products,
+        'top_products': sales.top_products(start_date, today, category=category),
+        'days': days,
+        'ranges': ANALYTICS_RANGES,
+        'category': category,
+        'categories': Category.objects.order_by('name'),
         'page_title': 'Analytics - Admin',
     }
     return render(request, 'store/analytics.html', context)
@@ -517,10 +783,7 @@ def toggle_wishlist(request, product_id):
 @login_required(login_url='login')
 def wishlist_view(request):
     """View user's wishlist."""
-    try:
-        wishlist_items = request.user.wishlist.products.all()
-    except Wishlist.DoesNotExist:
-        wishlist_items = []
+    wishlist_items = Product.objects.for_cards().filter(wishlists__user=request.user)
     
     context = {
         'wishlist_items': wishlist_items,
@@ -532,25 +795,35 @@ def wishlist_view(request):
 # ===========================
 # HELPER FUNCTIONS
 # ===========================
+def get_wishlist_ids(request):
+    """Ids of the products in the user's wishlist (one query, empty for guests)."""
+    if not request.user.is_authenticated:
+        return set()
+    return set(
+        Wishlist.products.through.objects
+        .filter(wishlist__user=request.user)
+        .values_list('product_id', flat=True)
+    )
+
+
 def generate_order_number():
-    """Generate unique order number."""
-    date_str = timezone.now().strftime('%Y%m%d')
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f'ORD-{date_str}-{random_str}'
+    """Generate unique, time-ordered order number (see store.order_ids)."""
+    return next_order_number()
 
 
 # ===========================
 # CATEGORY VIEW
 # ===========================
+@cache_anonymous_page()
 def category_view(request, slug):
     """View products in a category."""
     category = get_object_or_404(Category, slug=slug)
-    products = category.products.all()
+    products = Product.objects.for_cards().filter(category=category).order_by('-created_at', '-id')
     
     # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
+    products_page = paginate_products(request, products)
+    if wants_json(request):
+        return product_cards_response(request, products_page, 'store/includes/product_cards.html')
     
     context = {
         'category': category,
@@ -566,18 +839,18 @@ def category_view(request, slug):
 def search(request):
     """Search products."""
     query = request.GET.get('q', '')
-    products = []
+    products = Product.objects.none()
     
     if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        # Ranked by relevance using the full-text index
+        products = search_products(Product.objects.for_cards(), query)
     
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
+    products_page = paginate_products(request, products)
+    if query and products_page and 'cursor' not in request.GET:
+        # Only searches that found something may become suggestions
+        suggest.record_query(query)
+    if wants_json(request):
+        return product_cards_response(request, products_page, 'store/includes/product_cards.html')
     
     context = {
         'query': query,
@@ -599,16 +872,11 @@ def contact_query(request):
             # If user is authenticated, link to their email
             if request.user.is_authenticated:
                 contact.email = request.user.email
-            contact.save()
-            # Send receipt to user and notify admin
-            try:
-                send_contact_receipt_email(contact)
-                from django.conf import settings as _settings
-                admin_email = getattr(_settings, 'DEFAULT_FROM_EMAIL', None)
-                if admin_email:
-                    notify_admin_new_contact(contact, admin_email)
-            except Exception:
-                pass
+            with transaction.atomic():
+                contact.save()
+                # Receipt to the user and a notice to the admin (sent by the outbox worker)
+                outbox.enqueue('contact_receipt', contact_id=contact.pk)
+                outbox.enqueue('contact_admin_notice', contact_id=contact.pk)
             messages.success(request, 'Thank you! Your query has been submitted. We will respond shortly.')
             return redirect('contact_thank_you')
     else:
@@ -625,6 +893,7 @@ def contact_query(request):
     return render(request, 'store/contact.html', context)
 
 
+@cache_anonymous_page()
 def contact_thank_you(request):
     """Thank you page after contact form submission."""
     return render(request, 'store/contact_thank_you.html', {
@@ -652,16 +921,13 @@ def cancel_order(request, order_id):
     
     # Handle POST request (actual cancellation)
     if request.method == 'POST':
-        if order.cancel():
+        with transaction.atomic():
+            cancelled = order.cancel()
+            if cancelled:
+                # Cancellation email (sent by the outbox worker)
+                outbox.enqueue('order_cancellation', order_id=order.pk)
+        if cancelled:
             messages.success(request, f'Order #{order.order_number} has been cancelled successfully.')
-            
-            # Send cancellation email
-            try:
-                from .email_utils import send_order_cancellation_email
-                send_order_cancellation_email(order)
-            except Exception:
-                pass
-            
             return redirect('user_orders')
         else:
             messages.error(request, 'Failed to cancel order. Please try again.')
@@ -4,16 +4,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.views.decorators.http import require_http_methods
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.db import transaction
 
 from .forms import (
     UserRegistrationForm, UserLoginForm, 
     UserProfileForm, UserExtendedProfileForm,
     CustomPasswordChangeForm
 )
+from store import outbox
 from store.models import UserProfile
 
 
@@ -30,14 +28,14 @@ def register(request):
         
         # Check if all form fields are valid
         if form.is_valid():
-            # Create the new user account
-            user = form.save()
-            
-            # Send welcome email to new user
-            send_welcome_email_to_user(user, request)
+            # Create the new user account and queue the welcome email
+            # (sent by the outbox worker, so a slow mail server never blocks sign-up)
+            with transaction.atomic():
+                user = form.save()
+                outbox.enqueue('welcome_email', user_id=user.pk)
             
             # Show success message and redirect to login page
-            messages.success(request, f'Account created successfully for {user.email}! Welcome email sent. Please check your email and log in.')
+            messages.success(request, f'Account created successfully for {user.email}! A welcome email is on its way. Please log in.')
             return redirect('login')
         else:
             # If form has errors, show them to user
@@ -54,52 +52,6 @@ def register(request):
     return render(request, 'users/register.html', context)
 
 
-# Helper function to send welcome email
-def send_welcome_email_to_user(user, request):
-    """Send welcome email to newly registered user."""
-    try:
-        # Debug print to check if function is called
-        print(f"Attempting to send welcome email to: {user.email}")
-        print(f"Email backend: {settings.EMAIL_BACKEND}")
-        print(f"Email host: {settings.EMAIL_HOST}")
-        print(f"Email host user: {settings.EMAIL_HOST_USER}")
-        
-        # Email subject
-        email_subject = 'Welcome to KIRAA!'
-        
-        # Create HTML email content from template
-        html_email_content = render_to_string('emails/welcome_email.html', {
-            'user': user,
-        })
-        
-        # Create plain text version (no HTML)
-        plain_email_content = strip_tags(html_email_content)
-        
-        # Send the email
-        result = send_mail(
-            email_subject,
-            plain_email_content,
-            settings.DEFAULT_FROM_EMAIL,  # From email
-            [user.email],  # To email
-            html_message=html_email_content,
-            fail_silently=False,
-        )
-        
-        print(f"Email send result: {result}")
-        
-        if result:
-            print("Welcome email sent successfully!")
-            messages.success(request, 'Welcome email sent successfully!')
-        else:
-            print("Email send failed - result was 0")
-            messages.warning(request, 'Welcome email could not be sent.')
-            
-    except Exception as email_error:
-        # If email fails, still show success message but add warning
-        print(f"Email error: {str(email_error)}")
-        messages.warning(request, f'Welcome email could not be sent: {str(email_error)}')
-
-
 # Helper function to show form errors
 def show_form_errors(request, form):
     """Display form validation errors to user."""